@@ -1,12 +1,23 @@
+import asyncio
+import functools
 from aiohttp import web
+from app import config
 from app import context
+from app import cooperative
+from app import cost_map
 from app import srotage
 import typing as tp
 from app import models
-from app.utils import a_star_pathfinder
-import pickle
+from app import executor
+from app import maps
+from app import plan_codec
+from app import planning
+from app.utils import render
+from app.utils import space_time
 import abc
-from app.utils import direction_finder
+import hashlib
+import json
+import math
 
 
 class BaseHandler(abc.ABC):
@@ -19,12 +30,14 @@ class BaseHandler(abc.ABC):
 
     @staticmethod
     async def __post_check(request: web.Request):
+        if not request.can_read_body:
+            return
         data = await request.json()
 
         if not ("application/json" in request.headers["Content-Type"]):
             return web.Response(text="Data must be in JSON format")
 
-        if not all(x.isdigit() for x in data.values()):
+        if not all(x.isdigit() for x in data.values() if isinstance(x, str)):
             return web.Response(text="All coordinates must be integers")
 
     @abc.abstractmethod
@@ -50,71 +63,665 @@ class SetGeodataHandler(BaseHandler):
     async def handle(
         self, request: web.Request, ctx: context.AppContext
     ) -> web.Response:
-        request_data = await request.json()
+        stages = ctx.metrics.stages
+        with stages.time(stage="parse"):
+            request_data = await request.json()
+            entry = ctx.maps.get()
+            try:
+                start, target = await self.from_request(request_data)
+            except (KeyError, TypeError, ValueError) as e:
+                return web.Response(status=400, text=f"Bad points: {e}")
+
+        algorithm = request_data.get("algorithm", config.PLANNER_ALGORITHM)
+        if algorithm not in planning.ALGORITHMS:
+            return web.Response(status=400, text=f"Unknown algorithm {algorithm}")
+
+        with stages.time(stage="plan"):
+            movements_list = None
+            if (
+                "sector_target" in request_data
+                and algorithm == ctx.route_table.algorithm
+            ):
+                movements_list = ctx.route_table.lookup(
+                    entry, start, request_data["sector_target"]
+                )
+            if movements_list is not None:
+                ctx.metrics.plans.inc(algorithm=algorithm, source="table")
+            else:
+                try:
+                    movements_list = await self.plan(
+                        ctx, entry, start, target, algorithm
+                    )
+                except models.Unreachable as e:
+                    return web.Response(status=422, text=str(e))
+                except executor.PlannerBusy as e:
+                    return web.Response(status=503, text=str(e))
+                except executor.PlannerTimeout as e:
+                    return web.Response(status=504, text=str(e))
 
-        angles, distances = await self.calculate(request_data)
-        movements_list = await self.to_response(angles, distances)
-        srotage.task_push(ctx, await self.serialise(movements_list))
+        add_congestion(entry, movements_list)
+        with stages.time(stage="serialise"):
+            plan = await self.serialise(movements_list, entry.version)
+            rendered = plan_codec.to_json(movements_list)
+        with stages.time(stage="store"):
+            await srotage.task_push(ctx, self.robot(request_data), plan, rendered)
 
         return web.Response(text="Waypoints calculated")
 
-    async def calculate(
-        self, request_data: dict
-    ) -> tp.Tuple[tp.List[float], tp.List[float]]:
-        algorythm = a_star_pathfinder.AStar()
-        algorythm.maze = models.Maze.maze_thin  # TODO: сделать обработку исключений
-        algorythm.points = await self.from_request(request_data)
-        algorythm.a_star_search()
+    @staticmethod
+    def robot(request_data) -> str:
+        return str(request_data.get("robot_id", config.DEFAULT_ROBOT))
 
-        path = algorythm.get_path()
-        smoothed = await algorythm.smooth_path(path)
-        angles = await algorythm.get_angles(smoothed)
+    async def plan(
+        self,
+        ctx: context.AppContext,
+        entry: maps.MapEntry,
+        start: models.GridLocation,
+        target: models.GridLocation,
+        algorithm: str,
+    ) -> tp.Dict[str, tp.List[tp.Dict[str, float]]]:
+        key = ctx.route_cache.key(entry, start, target, {"algorithm": algorithm})
+        movements_list = await ctx.route_cache.get(key)
+        if movements_list is not None:
+            ctx.metrics.plans.inc(algorithm=algorithm, source="cache")
+            return movements_list
 
-        distances = [
-            await direction_finder.get_distance(smoothed[_], smoothed[_ + 1])
-            for _ in range(len(smoothed) - 1)
-        ]
+        # identical requests arriving together share one computation
+        movements_list, shared = await ctx.plan_flights.run(
+            key,
+            functools.partial(self.compute, ctx, entry, start, target, algorithm, key),
+        )
+        if shared:
+            ctx.metrics.plans.inc(algorithm=algorithm, source="coalesced")
+        return movements_list
 
-        await algorythm.visualise(smoothed, models.Maze.maze_thin)
-        await algorythm.visualise(path, models.Maze.maze_thin)
+    async def compute(
+        self,
+        ctx: context.AppContext,
+        entry: maps.MapEntry,
+        start: models.GridLocation,
+        target: models.GridLocation,
+        algorithm: str,
+        key: tp.Hashable,
+    ) -> tp.Dict[str, tp.List[tp.Dict[str, float]]]:
+        measured: tp.Dict[str, tp.Any] = {}
+        angles, distances, points = await self.calculate(
+            ctx, entry, start, target, algorithm, measured
+        )
+        ctx.metrics.record_plan(algorithm, measured)
+        ctx.metrics.plans.inc(algorithm=algorithm, source="search")
+        movements_list = await self.to_response(angles, distances, points)
+        await ctx.route_cache.put(key, movements_list)
+        return movements_list
 
-        return angles, distances
+    async def calculate(
+        self,
+        ctx: context.AppContext,
+        entry: maps.MapEntry,
+        start: models.GridLocation,
+        target: models.GridLocation,
+        algorithm: str = planning.DEFAULT_ALGORITHM,
+        measured: tp.Optional[tp.Dict[str, tp.Any]] = None,
+    ) -> planning.Route:
+        # TODO: сделать обработку исключений
+        if algorithm == "flow":
+            return await ctx.flow_fields.calculate(entry, start, target, measured)
+        route, stats = await ctx.planner.run(
+            planning.calculate_measured, entry, start, target, algorithm
+        )
+        if measured is not None:
+            measured.update(stats)
+        return route
 
     @staticmethod
     async def from_request(json):
-        sector_target = json["sector_target"]
+        if "sector_target" not in json:
+            points = models.DataPoints.from_request(json)
+            return (
+                (points.start.point_x, points.start.point_y),
+                (points.target.point_x, points.target.point_y),
+            )
 
-        waypoints = {
-            "0": (4, 8),
-            "1": (0, 0),
-            "2": (3, 35),
-            "3": (4, 52),
-            "4": (21, 4),
-            "5": (23, 16),
-            "6": (0, 0),
-            "7": (22, 51),
-        }
+        sector_target = json["sector_target"]
+        if sector_target not in models.SECTOR_WAYPOINTS:
+            raise ValueError(f"Unknown sector {sector_target!r}")
 
-        return (4, 16), waypoints[sector_target]
+        return models.SECTOR_START, models.SECTOR_WAYPOINTS[sector_target]
 
     @staticmethod
-    async def serialise(path: tp.Dict[str, tp.List[tp.Dict[str, float]]]) -> bytes:
-        return pickle.dumps(path)
+    async def serialise(
+        path: tp.Dict[str, tp.List[tp.Dict[str, float]]],
+        map_version: tp.Optional[str] = None,
+    ) -> bytes:
+        return plan_codec.encode(path, map_version)
 
     @staticmethod
     async def to_response(
-        angles: tp.List[float], distances: tp.List[float]
+        angles: tp.List[float],
+        distances: tp.List[float],
+        points: tp.Optional[tp.List[models.GridLocation]] = None,
     ) -> tp.Dict[str, tp.List[tp.Dict[str, float]]]:
-        row: tp.Dict[str, tp.List[tp.Dict[str, float]]] = {"way": []}
-        for i in range(len(angles)):
-            row["way"].append({"type": "rotate", "value": angles[i]})
-            row["way"].append({"type": "run", "value": distances[i]})
+        return planning.to_movements(angles, distances, points)
+
+
+class SetGeodataBatchHandler(BaseHandler):
+    async def handle(
+        self, request: web.Request, ctx: context.AppContext
+    ) -> web.Response:
+        request_data = await request.json()
+        entry = ctx.maps.get()
+
+        try:
+            start, stops = await self.from_request(request_data)
+        except (KeyError, TypeError, ValueError) as e:
+            return web.Response(status=400, text=f"Bad stops: {e}")
+        if not stops or len(stops) > config.BATCH_MAX_STOPS:
+            return web.Response(
+                status=400, text=f"Between 1 and {config.BATCH_MAX_STOPS} stops needed"
+            )
+
+        key = ("tour", entry.version, entry.costs.version, start, tuple(stops))
+        try:
+            (order, movements_list), shared = await ctx.plan_flights.run(
+                key,
+                functools.partial(
+                    ctx.planner.run, planning.plan_tour, entry, start, stops
+                ),
+            )
+        except models.Unreachable as e:
+            return web.Response(status=422, text=str(e))
+        except executor.PlannerBusy as e:
+            return web.Response(status=503, text=str(e))
+        except executor.PlannerTimeout as e:
+            return web.Response(status=504, text=str(e))
+        source = "coalesced" if shared else "search"
+        ctx.metrics.plans.inc(algorithm="tour", source=source)
+        add_congestion(entry, movements_list)
+
+        with ctx.metrics.stages.time(stage="serialise"):
+            plan = await SetGeodataHandler.serialise(movements_list, entry.version)
+            rendered = plan_codec.to_json(movements_list)
+        with ctx.metrics.stages.time(stage="store"):
+            await srotage.task_push(
+                ctx, SetGeodataHandler.robot(request_data), plan, rendered
+            )
+
+        return web.json_response({"order": order, "way": movements_list["way"]})
+
+    @staticmethod
+    async def from_request(
+        json,
+    ) -> tp.Tuple[models.GridLocation, tp.List[models.GridLocation]]:
+        # stops are sector ids or [x, y] pairs, the start defaults to the
+        # sector start like in SetGeodataHandler
+        start = models.SECTOR_START
+        if "point_start_x" in json:
+            start = (int(json["point_start_x"]), int(json["point_start_y"]))
+
+        stops = []
+        for stop in json["stops"]:
+            if isinstance(stop, str):
+                stops.append(models.SECTOR_WAYPOINTS[stop])
+            else:
+                (x, y) = stop
+                stops.append((int(x), int(y)))
+
+        return start, stops
+
+
+class CooperativePlanHandler(BaseHandler):
+    """POST plans like /set_geodata, but around the plans other robots
+    hold and with waits where the way is taken; the robot starts at
+    start_at (unix seconds). DELETE gives the robot's reservations up."""
+
+    async def handle(
+        self, request: web.Request, ctx: context.AppContext
+    ) -> web.Response:
+        if request.method == "DELETE":
+            robot = request.query.get("robot_id", config.DEFAULT_ROBOT)
+            try:
+                entry = ctx.maps.get(request.query.get("map", maps.DEFAULT_MAP))
+            except maps.UnknownMap as e:
+                return web.Response(status=400, text=str(e))
+            if not ctx.cooperative.release(entry, robot):
+                return web.Response(status=404, text="No reservations for the robot")
+            return web.Response(text="Reservations released")
+
+        request_data = await request.json()
+        robot = SetGeodataHandler.robot(request_data)
+        measured: tp.Dict[str, tp.Any] = {}
+        try:
+            entry = ctx.maps.get(request_data.get("map", maps.DEFAULT_MAP))
+            start, target = await SetGeodataHandler.from_request(request_data)
+        except (maps.UnknownMap, KeyError, TypeError, ValueError) as e:
+            return web.Response(status=400, text=f"Bad points: {e}")
+        try:
+            first_slot, movements_list = await ctx.cooperative.plan(
+                entry, robot, start, target, measured
+            )
+        except models.Unreachable as e:
+            return web.Response(status=422, text=str(e))
+        except (space_time.Blocked, cooperative.ReservationsChanged) as e:
+            # no way around the other robots in the horizon
+            return web.Response(status=409, text=str(e))
+        except executor.PlannerBusy as e:
+            return web.Response(status=503, text=str(e))
+        except executor.PlannerTimeout as e:
+            return web.Response(status=504, text=str(e))
+        ctx.metrics.record_plan("cooperative", measured)
+        ctx.metrics.plans.inc(algorithm="cooperative", source="search")
+
+        add_congestion(entry, movements_list)
+        await srotage.task_push(
+            ctx,
+            robot,
+            await SetGeodataHandler.serialise(movements_list, entry.version),
+            plan_codec.to_json(movements_list),
+        )
+        return web.json_response(
+            {
+                "way": movements_list["way"],
+                "start_at": first_slot * ctx.cooperative.slot_seconds,
+            }
+        )
+
+
+class WarmFlowFieldsHandler(BaseHandler):
+    async def handle(
+        self, request: web.Request, ctx: context.AppContext
+    ) -> web.Response:
+        entry = ctx.maps.get()
+        try:
+            warmed = await ctx.flow_fields.warm(entry)
+        except executor.PlannerBusy as e:
+            return web.Response(status=503, text=str(e))
+
+        return web.json_response({"sectors": warmed, "stats": ctx.flow_fields.stats})
+
+
+class ReplanStartHandler(BaseHandler):
+    """Plans like /set_geodata but keeps the search, so cell updates sent
+    to /cells repair the robot's plan instead of planning it again."""
+
+    async def handle(
+        self, request: web.Request, ctx: context.AppContext
+    ) -> web.Response:
+        request_data = await request.json()
+        robot = SetGeodataHandler.robot(request_data)
+        try:
+            entry = ctx.maps.get(request_data.get("map", maps.DEFAULT_MAP))
+            start, target = await SetGeodataHandler.from_request(request_data)
+        except (maps.UnknownMap, KeyError, TypeError, ValueError) as e:
+            return web.Response(status=400, text=f"Bad points: {e}")
+        try:
+            route, measured = await ctx.replanner.start(entry, robot, start, target)
+        except models.Unreachable as e:
+            return web.Response(status=422, text=str(e))
+        except executor.PlannerBusy as e:
+            return web.Response(status=503, text=str(e))
+        except executor.PlannerTimeout as e:
+            return web.Response(status=504, text=str(e))
+
+        movements_list = await push_replanned(ctx, entry, robot, route, measured)
+        ctx.metrics.plans.inc(algorithm="dstar_lite", source="search")
+        return web.json_response({"way": movements_list["way"]})
+
+
+class ReplanStopHandler(BaseHandler):
+    async def handle(
+        self, request: web.Request, ctx: context.AppContext
+    ) -> web.Response:
+        robot = request.query.get("robot_id", config.DEFAULT_ROBOT)
+        if not ctx.replanner.stop(robot):
+            return web.Response(status=404, text="No replanning for the robot")
+        return web.Response(text="Replanning stopped")
+
+
+class CellUpdatesHandler(BaseHandler):
+    """Blocks and clears cells of a map and moves replanning robots; every
+    robot whose plan changed gets the new one pushed."""
+
+    async def handle(
+        self, request: web.Request, ctx: context.AppContext
+    ) -> web.Response:
+        request_data = await request.json()
+        try:
+            entry = ctx.maps.get(request_data.get("map", maps.DEFAULT_MAP))
+            cells, positions = self.from_request(request_data)
+            updates = await ctx.replanner.update(entry, cells, positions)
+        except (maps.UnknownMap, KeyError, TypeError, ValueError) as e:
+            return web.Response(status=400, text=f"Bad cells: {e}")
+        except executor.PlannerBusy as e:
+            return web.Response(status=503, text=str(e))
+        except executor.PlannerTimeout as e:
+            return web.Response(status=504, text=str(e))
+
+        replanned: tp.Dict[str, tp.Any] = {}
+        for robot, (route, measured) in updates.items():
+            if route is None:
+                replanned[robot] = None
+                continue
+            movements_list = await push_replanned(ctx, entry, robot, route, measured)
+            ctx.metrics.plans.inc(algorithm="dstar_lite", source="repair")
+            replanned[robot] = {"way": movements_list["way"]}
+
+        return web.json_response({"cells": len(cells), "replanned": replanned})
+
+    @staticmethod
+    def from_request(
+        json,
+    ) -> tp.Tuple[
+        tp.Dict[models.GridLocation, bool], tp.Dict[str, models.GridLocation]
+    ]:
+        cells = {}
+        for x, y, blocked in json.get("cells", []):
+            cells[(int(x), int(y))] = bool(blocked)
+        positions = {
+            str(robot): (int(x), int(y))
+            for robot, (x, y) in json.get("positions", {}).items()
+        }
+        return cells, positions
+
 
-        return row
+async def push_replanned(
+    ctx: context.AppContext,
+    entry: maps.MapEntry,
+    robot: str,
+    route: planning.Route,
+    measured: tp.Dict[str, tp.Any],
+) -> tp.Dict[str, tp.List[tp.Dict[str, float]]]:
+    ctx.metrics.record_plan("dstar_lite", measured)
+    movements_list = await SetGeodataHandler.to_response(*route)
+    add_congestion(entry, movements_list)
+    await srotage.task_push(
+        ctx,
+        robot,
+        await SetGeodataHandler.serialise(movements_list, entry.version),
+        plan_codec.to_json(movements_list),
+    )
+    return movements_list
+
+
+class CostsHandler(BaseHandler):
+    """GET shows the cost raster of a map, POST fills regions of it with a
+    cost or resets it: {"regions": [{"x": [x0, x1], "y": [y0, y1],
+    "cost": 2.5}], "reset": false}."""
+
+    async def handle(
+        self, request: web.Request, ctx: context.AppContext
+    ) -> web.Response:
+        request_data = await request.json() if request.method == "POST" else {}
+        try:
+            entry = ctx.maps.get(
+                request_data.get("map", request.query.get("map", maps.DEFAULT_MAP))
+            )
+            regions = [
+                self.parse_region(region) for region in request_data.get("regions", [])
+            ]
+            if request_data.get("reset"):
+                entry.costs.reset()
+            if regions:
+                entry.costs.fill(regions)
+        except Exception as e:
+            return web.Response(status=400, text=str(e))
+
+        if request.method == "POST":
+            # the sector routes are planned again with the new costs
+            ctx.route_table.refresh(entry)
+        return web.json_response(entry.costs.stats)
+
+    @staticmethod
+    def parse_region(region: tp.Any) -> tp.Tuple[cost_map.Region, float]:
+        if not isinstance(region, dict):
+            raise Exception(f"A region must be an object, got {region!r}")
+        bounds = []
+        for axis in ("x", "y"):
+            pair = region.get(axis)
+            if (
+                not isinstance(pair, list)
+                or len(pair) != 2
+                or not all(isinstance(v, int) and not isinstance(v, bool) for v in pair)
+            ):
+                raise Exception(
+                    f"Region {axis} must be a pair of integers [{axis}0, {axis}1], "
+                    f"got {pair!r}"
+                )
+            bounds.extend(pair)
+        cost = region.get("cost")
+        if not isinstance(cost, (int, float)) or isinstance(cost, bool):
+            raise Exception(f"Region cost must be a number, got {cost!r}")
+        x0, x1, y0, y1 = bounds
+        return (x0, x1, y0, y1), float(cost)
+
+
+def add_congestion(
+    entry: maps.MapEntry, movements_list: tp.Dict[str, tp.List[tp.Any]]
+) -> None:
+    if config.CONGESTION_HEAT > 0:
+        entry.costs.add_heat(movements_list.get("points", ()), config.CONGESTION_HEAT)
 
 
 class GetWaypointsHandler(BaseHandler):
+    """Pops the robot's next plan. A plan's task id is its ETag: when the
+    If-None-Match plan is the robot's current one and nothing new is
+    queued the answer is a bodiless 304. Bodies go out as stored, the
+    gzip one when the client takes it."""
+
+    async def handle(
+        self, request: web.Request, ctx: context.AppContext
+    ) -> web.Response:
+        robot = request.query.get("robot_id", config.DEFAULT_ROBOT)
+        compressed = self.accepts_gzip(request.headers.get("Accept-Encoding", ""))
+        tags = request.headers.get("If-None-Match")
+        if tags is not None:
+            # a conditional poll of an empty queue pops nothing
+            current, queued = await ctx.tasks.state(robot)
+            if not queued:
+                if current is not None and self.matches(tags, current):
+                    headers = {"ETag": self.etag(current)}
+                    return web.Response(status=304, headers=headers)
+                return self.empty()
+
+        fetched = await srotage.get_waypoints_tagged(ctx, robot, compressed)
+        if fetched is None:
+            return self.empty()
+
+        task_id, body = fetched
+        headers = {"ETag": self.etag(task_id), "Vary": "Accept-Encoding"}
+        if compressed:
+            headers["Content-Encoding"] = "gzip"
+        return web.Response(body=body, content_type="application/json", headers=headers)
+
+    @staticmethod
+    def empty() -> web.Response:
+        return web.Response(
+            body=plan_codec.to_json(None), content_type="application/json"
+        )
+
+    @staticmethod
+    def etag(task_id: int) -> str:
+        # weak, so the plain and the gzip body share it
+        return f'W/"{task_id}"'
+
+    @staticmethod
+    def matches(header: str, task_id: int) -> bool:
+        tags = [tag.strip() for tag in header.split(",")]
+        return "*" in tags or any(
+            tag.removeprefix("W/") == f'"{task_id}"' for tag in tags
+        )
+
+    @staticmethod
+    def accepts_gzip(header: str) -> bool:
+        for coding in header.split(","):
+            name, _, params = coding.strip().partition(";")
+            if name.strip().lower() not in ("gzip", "*"):
+                continue
+            if not params:
+                return True
+            try:
+                return float(params.strip().removeprefix("q=")) > 0
+            except ValueError:
+                return False
+        return False
+
+
+class WaitWaypointsHandler(BaseHandler):
+    """Long poll: answers as soon as a plan is queued for the robot, or
+    with null once the timeout passes."""
+
+    async def handle(
+        self, request: web.Request, ctx: context.AppContext
+    ) -> web.Response:
+        robot = request.query.get("robot_id", config.DEFAULT_ROBOT)
+        try:
+            timeout = float(request.query.get("timeout", config.LONG_POLL_TIMEOUT))
+        except ValueError:
+            timeout = math.nan
+        if not timeout >= 0:
+            return web.Response(
+                status=400, text="timeout must be a non-negative number of seconds"
+            )
+        timeout = min(timeout, config.LONG_POLL_TIMEOUT)
+
+        # subscribe first so a plan pushed between the two reads is not missed
+        with ctx.broadcaster.subscribe(robot) as subscription:
+            raw = await ctx.tasks.fetch(robot)
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while raw is None and await subscription.wait(deadline - loop.time()):
+                raw = await ctx.tasks.fetch(robot)
+
+        return web.Response(
+            body=raw or plan_codec.to_json(None), content_type="application/json"
+        )
+
+
+class WaypointsSocketHandler(BaseHandler):
+    """Sends every plan queued for the robot over a WebSocket as it comes."""
+
+    async def handle(
+        self, request: web.Request, ctx: context.AppContext
+    ) -> web.WebSocketResponse:
+        robot = request.query.get("robot_id", config.DEFAULT_ROBOT)
+        ws = web.WebSocketResponse(heartbeat=config.WS_HEARTBEAT)
+        await ws.prepare(request)
+
+        with ctx.broadcaster.subscribe(robot) as subscription:
+            await self.drain(ctx, ws, robot)
+            receive = asyncio.ensure_future(ws.receive())
+            notified = asyncio.ensure_future(subscription.wait())
+            try:
+                while not ws.closed:
+                    await asyncio.wait(
+                        {receive, notified}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if receive.done():
+                        if receive.result().type in (
+                            web.WSMsgType.CLOSE,
+                            web.WSMsgType.CLOSING,
+                            web.WSMsgType.CLOSED,
+                            web.WSMsgType.ERROR,
+                        ):
+                            break
+                        receive = asyncio.ensure_future(ws.receive())
+                    if notified.done():
+                        await self.drain(ctx, ws, robot)
+                        notified = asyncio.ensure_future(subscription.wait())
+            finally:
+                receive.cancel()
+                notified.cancel()
+
+        return ws
+
+    @staticmethod
+    async def drain(
+        ctx: context.AppContext, ws: web.WebSocketResponse, robot: str
+    ) -> None:
+        while not ws.closed:
+            fetched = await ctx.tasks.fetch_tagged(robot)
+            if fetched is None:
+                break
+            task_id, raw = fetched
+            # a plan the socket did not take goes back for the next fetch
+            try:
+                if ws.closed:
+                    raise ConnectionResetError("WebSocket closed")
+                await ws.send_str(raw.decode())
+            except ConnectionResetError:
+                await ctx.tasks.requeue(robot, task_id)
+                break
+            except BaseException:
+                await ctx.tasks.requeue(robot, task_id)
+                raise
+
+
+class GetWaypointsBatchHandler(BaseHandler):
     async def handle(
         self, request: web.Request, ctx: context.AppContext
     ) -> web.Response:
-        return web.json_response(srotage.get_waypoints(ctx))
+        request_data = await request.json()
+        robots = list(dict.fromkeys(str(robot) for robot in request_data["robots"]))
+        plans = await srotage.get_waypoints_json_many(ctx, robots)
+
+        # the stored JSON is spliced in as is, nothing is decoded
+        body = b", ".join(
+            json.dumps(robot).encode() + b": " + plan
+            for robot, plan in zip(robots, plans)
+        )
+        return web.Response(body=b"{" + body + b"}", content_type="application/json")
+
+
+class RenderPlanHandler(BaseHandler):
+    """Debug view of a stored plan drawn over its map, as text or as a
+    binary PGM greymap. Renders are cached per plan."""
+
+    FORMATS = {
+        "ascii": (render.to_ascii, "text/plain"),
+        "pgm": (render.to_pgm, "image/x-portable-graymap"),
+    }
+
+    async def handle(
+        self, request: web.Request, ctx: context.AppContext
+    ) -> web.Response:
+        fmt = request.query.get("format", "ascii")
+        if fmt not in self.FORMATS:
+            return web.Response(status=400, text=f"Unknown format {fmt}")
+
+        if "task_id" in request.query:
+            if not request.query["task_id"].isdigit():
+                return web.Response(status=400, text="task_id must be an integer")
+            raw = await ctx.tasks.get(int(request.query["task_id"]))
+        else:
+            robot = request.query.get("robot_id", config.DEFAULT_ROBOT)
+            raw = await ctx.tasks.current(robot)
+        if raw is None:
+            return web.Response(status=404, text="No such plan")
+
+        draw, content_type = self.FORMATS[fmt]
+        key = (hashlib.sha1(raw).digest(), fmt)
+        body = ctx.renders.get(key)
+        if body is None:
+            version, points = plan_codec.decode_points(raw)
+            if version is None:
+                return web.Response(
+                    status=422, text="The plan was stored without its turn points"
+                )
+            entry = next((e for e in ctx.maps if e.version == version), None)
+            if entry is None:
+                return web.Response(status=410, text="The plan's map is gone")
+            body = draw(entry.maze, points)
+            if isinstance(body, str):
+                body = body.encode()
+            ctx.renders.put(key, body)
+
+        return web.Response(body=body, content_type=content_type)
+
+
+class MetricsHandler(BaseHandler):
+    async def handle(
+        self, request: web.Request, ctx: context.AppContext
+    ) -> web.Response:
+        return web.Response(
+            text=ctx.metrics.render(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
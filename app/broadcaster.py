@@ -0,0 +1,132 @@
+import asyncio
+import contextlib
+import logging
+import typing as tp
+from redis import asyncio as aioredis
+
+CHANNEL = "plans"
+# seconds before the listener subscribes again after losing Redis, doubled
+# on every failure in a row up to the maximum
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 30.0
+
+
+class Subscription:
+    def __init__(self, robot: str) -> None:
+        self.robot = robot
+        self.__event = asyncio.Event()
+
+    def notify(self) -> None:
+        self.__event.set()
+
+    async def wait(self, timeout: tp.Optional[float] = None) -> bool:
+        """True once a plan was announced since the last wait, False on timeout."""
+        try:
+            await asyncio.wait_for(self.__event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.__event.clear()
+        return True
+
+
+class Broadcaster:
+    """Tells the robots' open connections in this process that a new plan
+    was queued for them. Only the robot id is sent, subscribers pop the
+    plan from the task queue themselves."""
+
+    def __init__(self) -> None:
+        self.__subscriptions: tp.Dict[str, tp.Set[Subscription]] = {}
+
+    @contextlib.contextmanager
+    def subscribe(self, robot: str) -> tp.Iterator[Subscription]:
+        subscription = Subscription(robot)
+        self.__subscriptions.setdefault(robot, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscriptions = self.__subscriptions[robot]
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.__subscriptions[robot]
+
+    @property
+    def subscribers(self) -> int:
+        return sum(map(len, self.__subscriptions.values()))
+
+    def deliver(self, robot: str) -> None:
+        for subscription in self.__subscriptions.get(robot, ()):
+            subscription.notify()
+
+    def deliver_all(self) -> None:
+        for subscriptions in self.__subscriptions.values():
+            for subscription in subscriptions:
+                subscription.notify()
+
+    async def publish(self, robot: str) -> None:
+        self.deliver(robot)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class RedisBroadcaster(Broadcaster):
+    """Broadcaster fanned out over Redis pub/sub, so a plan stored by one
+    server process reaches robots connected to any of them."""
+
+    def __init__(self, db: aioredis.Redis) -> None:
+        super().__init__()
+        self.__db = db
+        self.__listener: tp.Optional[asyncio.Task] = None
+
+    async def publish(self, robot: str) -> None:
+        # delivered locally by the listener like everyone else's
+        await self.__db.publish(CHANNEL, robot)
+
+    async def start(self) -> None:
+        pubsub = self.__db.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(CHANNEL)
+        self.__listener = asyncio.create_task(self.__listen(pubsub))
+
+    async def stop(self) -> None:
+        if self.__listener is not None:
+            self.__listener.cancel()
+            self.__listener = None
+
+    async def __listen(self, pubsub: tp.Optional[aioredis.client.PubSub]) -> None:
+        # runs until cancelled, a lost connection is subscribed again
+        delay = RETRY_DELAY
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = self.__db.pubsub(ignore_subscribe_messages=True)
+                    await pubsub.subscribe(CHANNEL)
+                    # plans published meanwhile were missed, everyone looks
+                    self.deliver_all()
+                    logging.info("Plan broadcast listener subscribed again")
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.deliver(message["data"].decode())
+                        delay = RETRY_DELAY
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(
+                    f"Plan broadcast listener lost Redis, retrying in {delay}s: {e!r}"
+                )
+            finally:
+                if pubsub is not None:
+                    await self.__close(pubsub)
+                pubsub = None
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    @staticmethod
+    async def __close(pubsub: aioredis.client.PubSub) -> None:
+        try:
+            await pubsub.close()
+        except Exception as e:
+            logging.warning(f"Closing the plan broadcast subscription failed: {e!r}")
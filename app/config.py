@@ -1,3 +1,4 @@
+import os
 from environs import Env
 
 env = Env()
@@ -10,3 +11,36 @@ DBNAME = env.str("DBNAME")
 DB_PORT = env.str("DB_PORT")
 SERVER_PORT = env.str("SERVER_PORT")
 CLEAR_DB = True
+REDIS_BACKEND = env.str("REDIS_BACKEND", "redis")
+REDIS_POOL_SIZE = env.int("REDIS_POOL_SIZE", 32)
+TASK_TTL = env.int("TASK_TTL", 3600)
+DEFAULT_ROBOT = env.str("DEFAULT_ROBOT", "default")
+BROADCAST_BACKEND = env.str("BROADCAST_BACKEND", "local")
+LONG_POLL_TIMEOUT = env.float("LONG_POLL_TIMEOUT", 25.0)
+WS_HEARTBEAT = env.float("WS_HEARTBEAT", 20.0)
+GZIP_LEVEL = env.int("GZIP_LEVEL", 6)
+
+MAPS_DIR = env.str("MAPS_DIR", "")
+MAPS_RELOAD_INTERVAL = env.float("MAPS_RELOAD_INTERVAL", 5.0)
+
+ROUTE_CACHE_SIZE = env.int("ROUTE_CACHE_SIZE", 1024)
+ROUTE_CACHE_TTL = env.float("ROUTE_CACHE_TTL", 600.0)
+ROUTE_CACHE_REDIS_TTL = env.int("ROUTE_CACHE_REDIS_TTL", 3600)
+
+PLANNER_WORKERS = env.int("PLANNER_WORKERS", os.cpu_count() or 1)
+PLANNER_MAX_PENDING = env.int("PLANNER_MAX_PENDING", 64)
+PLANNER_TIMEOUT = env.float("PLANNER_TIMEOUT", 30.0)
+PLANNER_ALGORITHM = env.str("PLANNER_ALGORITHM", "astar")
+PLANNER_PRELOAD = env.list("PLANNER_PRELOAD", ["visibility", "hpa"])
+BATCH_MAX_STOPS = env.int("BATCH_MAX_STOPS", 16)
+FLOW_FIELD_CACHE_SIZE = env.int("FLOW_FIELD_CACHE_SIZE", 64)
+RENDER_CACHE_SIZE = env.int("RENDER_CACHE_SIZE", 128)
+REPLAN_MAX_SESSIONS = env.int("REPLAN_MAX_SESSIONS", 256)
+
+CONGESTION_HEAT = env.float("CONGESTION_HEAT", 0.0)
+CONGESTION_HALF_LIFE = env.float("CONGESTION_HALF_LIFE", 30.0)
+COST_TICK_INTERVAL = env.float("COST_TICK_INTERVAL", 2.0)
+
+RESERVATION_SLOT_SECONDS = env.float("RESERVATION_SLOT_SECONDS", 1.0)
+RESERVATION_HORIZON = env.int("RESERVATION_HORIZON", 256)
+RESERVATION_PARK = env.int("RESERVATION_PARK", 8)
@@ -1,24 +1,171 @@
-import redis
+import asyncio
+import functools
+import math
 import typing as tp
 import logging
+from redis import asyncio as aioredis
+from app import broadcaster
 from app import config
+from app import cooperative
+from app import executor
+from app import flow_fields
+from app import maps
+from app import memory_redis
+from app import metrics
+from app import planning
+from app import replanning
+from app import route_cache
+from app import route_table
+from app import singleflight
+from app import task_queue
 
 
 class AppContext:
     def __init__(self, secrets):
-        self.db: tp.Optional[redis.Redis] = redis.Redis(
-            host=config.IP, port=config.DB_PORT, db=1
-        )
+        self.db: tp.Optional[aioredis.Redis] = self.__connect_db()
         logging.info("Redis started successfully")
         self.secrets = secrets
+        self.tasks = task_queue.TaskQueue(self.db, ttl=config.TASK_TTL)
+        self.broadcaster = self.__make_broadcaster(self.db)
+        self.maps = maps.default_registry()
+        self.map_directory: tp.Optional[maps.MapDirectory] = None
+        if config.MAPS_DIR:
+            self.map_directory = maps.MapDirectory(self.maps, config.MAPS_DIR)
+            self.map_directory.scan()
+        self.__map_watcher: tp.Optional[asyncio.Task] = None
+        self.__cost_ticker: tp.Optional[asyncio.Task] = None
+        self.planner = executor.PlannerExecutor(
+            self.maps,
+            workers=config.PLANNER_WORKERS,
+            max_pending=config.PLANNER_MAX_PENDING,
+            timeout=config.PLANNER_TIMEOUT,
+            preload=functools.partial(
+                planning.preload, algorithms=tuple(config.PLANNER_PRELOAD)
+            ),
+        )
+        self.route_table = route_table.RouteTable(
+            self.maps, self.planner, algorithm=config.PLANNER_ALGORITHM
+        )
+        self.flow_fields = flow_fields.FlowFieldCache(
+            self.maps, self.planner, maxsize=config.FLOW_FIELD_CACHE_SIZE
+        )
+        self.route_cache = route_cache.RouteCache(
+            self.db,
+            self.maps,
+            maxsize=config.ROUTE_CACHE_SIZE,
+            ttl=config.ROUTE_CACHE_TTL,
+            redis_ttl=config.ROUTE_CACHE_REDIS_TTL,
+        )
+        self.cooperative = cooperative.CooperativePlanner(
+            self.maps,
+            self.planner,
+            slot_seconds=config.RESERVATION_SLOT_SECONDS,
+            horizon=config.RESERVATION_HORIZON,
+            park=config.RESERVATION_PARK,
+        )
+        self.replanner = replanning.Replanner(
+            self.maps, self.planner, config.REPLAN_MAX_SESSIONS, ttl=config.TASK_TTL
+        )
+        self.plan_flights = singleflight.SingleFlight()
+        # rendered debug views of stored plans, by plan digest and format
+        self.renders = route_cache.LRUCache(config.RENDER_CACHE_SIZE, math.inf)
+        self.metrics = metrics.ServiceMetrics()
+        self.__add_gauges()
+
+    @staticmethod
+    def __connect_db() -> tp.Union[aioredis.Redis, memory_redis.MemoryRedis]:
+        if config.REDIS_BACKEND == "memory":
+            return memory_redis.MemoryRedis()
+
+        pool = aioredis.ConnectionPool(
+            host=config.IP,
+            port=config.DB_PORT,
+            db=1,
+            max_connections=config.REDIS_POOL_SIZE,
+        )
+        return aioredis.Redis(connection_pool=pool)
+
+    def __add_gauges(self) -> None:
+        gauges = [
+            ("pds_planner_pending", "Plans waiting for or running in the pool.",
+             lambda: self.planner.pending),
+            ("pds_push_subscribers", "Open WebSocket and long-poll connections.",
+             lambda: self.broadcaster.subscribers),
+            ("pds_flow_fields_cached", "Flow fields held in memory.",
+             lambda: self.flow_fields.stats["size"]),
+            ("pds_replan_sessions", "Robots with an incremental planner kept.",
+             lambda: len(self.replanner)),
+            ("pds_plans_in_flight", "Distinct plans being computed right now.",
+             lambda: len(self.plan_flights)),
+            ("pds_reserved_slots", "(cell, slot) pairs held by cooperative plans.",
+             lambda: self.cooperative.reserved),
+            ("pds_route_cache_entries", "Routes held in the local cache.",
+             lambda: self.route_cache.stats["size"]),
+        ]
+        for name, help, read in gauges:
+            self.metrics.add(metrics.Gauge(name, help, read))
+
+        # counters the route cache keeps: label values and the stat of each
+        counters = [
+            ("pds_route_cache_hits_total", "Route cache hits, by tier.", ("tier",),
+             [(("local",), "local_hits"), (("redis",), "redis_hits")]),
+            ("pds_route_cache_misses_total", "Route lookups found in no tier.", (),
+             [((), "misses")]),
+            ("pds_route_cache_evictions_total", "Routes pushed out of the LRU.", (),
+             [((), "evictions")]),
+            ("pds_route_cache_expirations_total", "Routes dropped at their TTL.", (),
+             [((), "expirations")]),
+            ("pds_route_cache_invalidations_total", "Map changes that dropped routes.",
+             (), [((), "invalidations")]),
+        ]
+        for name, help, labels, stats in counters:
+            read = functools.partial(self.__read_route_cache, stats)
+            self.metrics.add(metrics.ReadCounter(name, help, read, labels))
+
+    def __read_route_cache(
+        self, stats: tp.List[tp.Tuple[metrics.Labels, str]]
+    ) -> tp.Dict[metrics.Labels, float]:
+        current = self.route_cache.stats
+        return {labels: current[stat] for labels, stat in stats}
+
+    @staticmethod
+    def __make_broadcaster(db) -> broadcaster.Broadcaster:
+        if config.BROADCAST_BACKEND == "redis" and isinstance(db, aioredis.Redis):
+            return broadcaster.RedisBroadcaster(db)
+        return broadcaster.Broadcaster()
+
+    async def __tick_costs(self) -> None:
+        # congestion heat halves every CONGESTION_HALF_LIFE seconds
+        decay = 0.5 ** (config.COST_TICK_INTERVAL / config.CONGESTION_HALF_LIFE)
+        while True:
+            await asyncio.sleep(config.COST_TICK_INTERVAL)
+            for entry in self.maps:
+                entry.costs.tick(decay)
 
     async def on_startup(self, app=None):
+        self.planner.start()
+        await self.broadcaster.start()
+        if self.map_directory is not None:
+            self.__map_watcher = asyncio.create_task(
+                self.map_directory.watch(config.MAPS_RELOAD_INTERVAL)
+            )
+        if config.CONGESTION_HEAT > 0:
+            self.__cost_ticker = asyncio.create_task(self.__tick_costs())
+        await self.route_table.build()
         logging.info("Server started")
 
     async def on_shutdown(self, app=None):
+        if self.__map_watcher is not None:
+            self.__map_watcher.cancel()
+        if self.__cost_ticker is not None:
+            self.__cost_ticker.cancel()
+        self.route_table.stop()
+        self.route_cache.stop()
+        await self.broadcaster.stop()
+        self.planner.shutdown()
         if self.db:
             if config.CLEAR_DB:
-                self.db.flushdb()
+                await self.db.flushdb()
                 logging.info("DB cleared")
-            self.db.close()
+            await self.db.close()
             logging.info("DB Closed")
@@ -0,0 +1,135 @@
+import time
+import typing as tp
+from app import executor
+from app import maps
+from app import models
+from app import planning
+from app.utils import space_time
+
+# a commit that lost the race to other commits this often gives up
+COMMIT_ATTEMPTS = 3
+# weight of the latest search in the running estimate of search time
+SEARCH_TIME_WEIGHT = 0.2
+
+
+class ReservationsChanged(Exception):
+    """Commits of other robots beat every attempt to commit a plan."""
+
+
+class CooperativePlanner:
+    """Plans robots one at a time around the plans of the others.
+
+    Every map has a reservation table of the (cell, slot) pairs committed
+    plans hold; a slot is slot_seconds long and robots move one cell per
+    slot. A robot is planned against the others' reservations only, so
+    replanning it never touches another robot's plan. The search runs in
+    the planner pool; its plan is committed only if no reservation taken
+    in the meantime conflicts with it, otherwise it is planned again.
+
+    A plan starts at the first slot after the search is expected to be
+    done, by a running estimate of the search time. One that still ends
+    up starting in the past is moved to the next slot, if it fits there.
+    """
+
+    def __init__(
+        self,
+        registry: maps.MapRegistry,
+        planner: executor.PlannerExecutor,
+        slot_seconds: float,
+        horizon: int,
+        park: int,
+        clock: tp.Callable[[], float] = time.time,
+    ) -> None:
+        self.__planner = planner
+        self.slot_seconds = slot_seconds
+        self.__horizon = horizon
+        self.__park = park
+        self.__clock = clock
+        self.__tables: tp.Dict[str, tp.Tuple[str, space_time.ReservationTable]] = {}
+        self.search_seconds = 0.0
+        registry.subscribe(self.__on_map_changed)
+
+    def slot(self) -> int:
+        return int(self.__clock() // self.slot_seconds)
+
+    @property
+    def reserved(self) -> int:
+        return sum(len(table) for _, table in self.__tables.values())
+
+    def table(self, entry: maps.MapEntry) -> space_time.ReservationTable:
+        version, table = self.__tables.get(entry.name, (None, None))
+        if version != entry.version:
+            table = space_time.ReservationTable(entry.maze.shape)
+            self.__tables[entry.name] = (entry.version, table)
+        return table
+
+    async def plan(
+        self,
+        entry: maps.MapEntry,
+        robot: str,
+        start: models.GridLocation,
+        target: models.GridLocation,
+        measured: tp.Optional[tp.Dict[str, tp.Any]] = None,
+    ) -> tp.Tuple[int, planning.Movements]:
+        """Plans and commits; returns the slot the plan starts at."""
+        for point in (start, target):
+            if not entry.grid.in_bounds(point) or entry.grid.is_wall(point):
+                raise models.Unreachable(f"Point {tuple(point)} is unreachable")
+
+        table = self.table(entry)
+        for _ in range(COMMIT_ATTEMPTS):
+            started = self.__clock()
+            table.expire(self.slot())
+            first_slot = self.first_slot(started)
+            version = table.version
+            path, movements, stats = await self.__planner.run(
+                planning.calculate_timed,
+                entry,
+                start,
+                target,
+                first_slot,
+                table.reserved(robot),
+                self.__horizon,
+                self.__park,
+            )
+            self.__measured(self.__clock() - started)
+            if measured is not None:
+                measured.update(stats)
+
+            # nothing awaits from here on, so the check and the commit are atomic
+            if self.slot() >= first_slot:
+                # the search outlasted the estimate: start the plan later
+                first_slot = self.slot() + 1
+            elif table.version == version:
+                table.commit(robot, table.keys(self.parked(path), first_slot))
+                return first_slot, movements
+            if space_time.valid(
+                path, first_slot, table.reserved(robot), table.shape, self.__park
+            ):
+                table.commit(robot, table.keys(self.parked(path), first_slot))
+                return first_slot, movements
+
+        raise ReservationsChanged(
+            "Reservations kept changing while planning, try again"
+        )
+
+    def first_slot(self, now: float) -> int:
+        """The slot after the one a search started now should end in."""
+        return int((now + self.search_seconds) // self.slot_seconds) + 1
+
+    def parked(
+        self, path: tp.List[models.GridLocation]
+    ) -> tp.List[models.GridLocation]:
+        return path + [path[-1]] * self.__park
+
+    def __measured(self, seconds: float) -> None:
+        self.search_seconds += SEARCH_TIME_WEIGHT * (seconds - self.search_seconds)
+
+    def release(self, entry: maps.MapEntry, robot: str) -> bool:
+        return self.table(entry).release(robot)
+
+    def __on_map_changed(
+        self, old: tp.Optional[maps.MapEntry], new: maps.MapEntry
+    ) -> None:
+        # plans on the old map are void, their robots get planned again
+        self.__tables.pop(new.name, None)
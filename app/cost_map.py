@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import tempfile
+import typing as tp
+import weakref
+import numpy as np
+from app import models
+from app.utils import line_of_sight
+
+# the raster lives in a file so the planner pool maps the same pages
+DIRECTORY = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+WEIGHT = np.dtype("<f4")
+# heat below this is dropped, so an idle map gets back to its base costs
+MIN_HEAT = 1e-3
+
+Region = tp.Tuple[int, int, int, int]
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class CostMap:
+    """Per-cell traversal costs of a map as a dense float32 raster.
+
+    weights[x, y] is what entering the cell costs per step: the base cost
+    set by region fills plus the congestion heat recent plans left on it,
+    which decays over time. GridWithWeights reads the raster directly.
+
+    The owner (the process that created it) updates the raster in place;
+    a pickled CostMap maps the same file read-only, so planner workers see
+    every update without a restart. A search running during an update may
+    read some cells before and some after it. version is a digest of the
+    weights, for the caches whose results depend on them.
+    """
+
+    def __init__(
+        self, shape: tp.Tuple[int, int], path: tp.Optional[str] = None
+    ) -> None:
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.owner = path is None
+        if self.owner:
+            fd, path = tempfile.mkstemp(prefix="pds-costs-", dir=DIRECTORY)
+            os.close(fd)
+            weakref.finalize(self, _unlink, path)
+        self.path = path
+        raster = np.memmap(
+            path, dtype=WEIGHT, mode="w+" if self.owner else "r", shape=self.shape
+        )
+        # a plain view of the mapping: item() on a memmap is notably slower,
+        # and the searches call it for every edge
+        self.weights: np.ndarray = raster.view(np.ndarray)
+
+        self.__base: tp.Optional[np.ndarray] = None
+        self.__heat: tp.Optional[np.ndarray] = None
+        self.version = ""
+        if self.owner:
+            self.__base = np.ones(self.shape, dtype=WEIGHT)
+            self.__heat = np.zeros(self.shape, dtype=WEIGHT)
+            self.__publish()
+
+    def __reduce__(self):
+        return CostMap, (self.shape, self.path)
+
+    def __check_owner(self) -> None:
+        if not self.owner:
+            raise Exception("Costs can only be changed where the map is served")
+
+    def fill(self, regions: tp.Sequence[tp.Tuple[Region, float]]) -> None:
+        """Sets the base cost of the cells x0 <= x < x1, y0 <= y < y1 of
+        every region; later regions win where they overlap."""
+        self.__check_owner()
+        for (x0, x1, y0, y1), cost in regions:
+            if not (0 <= x0 <= x1 <= self.shape[0] and 0 <= y0 <= y1 <= self.shape[1]):
+                raise Exception(f"Region {(x0, x1, y0, y1)} is outside of the map")
+            if not cost >= 1:
+                # octile distances would overestimate and A* lose optimality
+                raise Exception(f"Cell costs must be at least 1, got {cost}")
+            self.__base[x0:x1, y0:y1] = cost
+        self.__publish()
+
+    def reset(self) -> None:
+        self.__check_owner()
+        self.__base.fill(1)
+        self.__heat.fill(0)
+        self.__publish()
+
+    def inherit(self, old: CostMap) -> None:
+        """Keeps the costs of the map version this one replaces."""
+        self.__check_owner()
+        self.__base[...] = old.__base
+        self.__heat[...] = old.__heat
+        self.__publish()
+
+    def add_heat(self, points: tp.Sequence[models.GridLocation], amount: float) -> None:
+        """Heats the cells along a plan's turn points. Takes effect on the
+        next tick, so the version changes at most once per tick."""
+        self.__check_owner()
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        if len(points) > 1:
+            xs, ys = line_of_sight.cells_many(points[:-1], points[1:])
+        else:
+            xs, ys = points[:, 0], points[:, 1]
+        self.__heat[xs, ys] += amount
+
+    def tick(self, decay: float) -> bool:
+        """Multiplies the heat by decay and publishes; returns whether the
+        weights changed."""
+        self.__check_owner()
+        if not self.__heat.any():
+            return False
+        self.__heat *= decay
+        self.__heat[self.__heat < MIN_HEAT] = 0
+        return self.__publish()
+
+    def __publish(self) -> bool:
+        weights = self.__base + self.__heat
+        version = hashlib.sha1(struct.pack("<II", *self.shape))
+        version.update(weights.tobytes())
+        if version.hexdigest() == self.version:
+            return False
+        self.weights[...] = weights
+        self.version = version.hexdigest()
+        return True
+
+    @property
+    def stats(self) -> tp.Dict[str, tp.Any]:
+        stats: tp.Dict[str, tp.Any] = {
+            "version": self.version,
+            "min": float(self.weights.min()),
+            "max": float(self.weights.max()),
+            "mean": float(self.weights.mean()),
+        }
+        if self.owner:
+            stats["heated_cells"] = int(np.count_nonzero(self.__heat))
+        return stats
@@ -0,0 +1,257 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import typing as tp
+import numpy as np
+from app import cost_map
+from app import maps
+from app import models
+
+T = tp.TypeVar("T")
+
+# a map change touching more of the cells than this restarts the pool
+MAX_UPDATE_SHARE = 0.25
+
+_worker_maps: tp.Dict[str, maps.MapEntry] = {}
+_worker_preload: tp.Optional[tp.Callable[[maps.MapEntry], None]] = None
+
+
+class MapUpdate(tp.NamedTuple):
+    """How a worker gets from the map it was started with, or any version
+    since, to the current one: every cell changed since the pool started
+    with its current value. costs is the shape and file of the cost raster,
+    mapped again only by the workers that apply the update."""
+
+    version: str
+    cells: np.ndarray
+    values: np.ndarray
+    starts: tp.Tuple[models.GridLocation, ...]
+    sectors: tp.Dict[str, models.GridLocation]
+    costs: tp.Tuple[tp.Tuple[int, int], str]
+
+
+class PlannerBusy(Exception):
+    pass
+
+
+class PlannerTimeout(Exception):
+    pass
+
+
+def _init_worker(
+    entries: tp.List[maps.MapEntry],
+    preload: tp.Optional[tp.Callable[[maps.MapEntry], None]],
+) -> None:
+    global _worker_maps, _worker_preload
+    _worker_maps = {entry.name: entry for entry in entries}
+    _worker_preload = preload
+    if preload is not None:
+        for entry in entries:
+            preload(entry)
+
+
+def _apply_update(old: maps.MapEntry, update: MapUpdate) -> maps.MapEntry:
+    maze = np.array(old.maze)
+    maze[update.cells[:, 0], update.cells[:, 1]] = update.values
+    entry = maps.MapEntry(
+        old.name,
+        maze,
+        update.starts,
+        update.sectors,
+        costs=cost_map.CostMap(*update.costs),
+    )
+    if entry.version != update.version:
+        raise Exception(
+            f"Map {old.name} update to {update.version[:12]} does not apply"
+        )
+    # derived structures with an update follow the changed cells
+    entry.inherit(old)
+    if _worker_preload is not None:
+        _worker_preload(entry)
+    return entry
+
+
+def _run_in_worker(
+    func: tp.Callable[..., T],
+    map_name: str,
+    version: str,
+    update: tp.Optional[MapUpdate],
+    args: tp.Tuple,
+) -> T:
+    entry = _worker_maps.get(map_name)
+    if entry is not None and update is not None:
+        if (entry.version, entry.costs.path) != (update.version, update.costs[1]):
+            entry = _worker_maps[map_name] = _apply_update(entry, update)
+    if entry is None or entry.version != version:
+        raise Exception(f"Map {map_name} version {version[:12]} is not loaded")
+    return func(entry, *args)
+
+
+def _log_preload(entry: maps.MapEntry, job: concurrent.futures.Future) -> None:
+    if not job.cancelled() and job.exception() is not None:
+        logging.error(f"Preloading {entry!r} failed: {job.exception()!r}")
+
+
+class PlannerExecutor:
+    """Process pool for CPU-bound planning with the registered maps preloaded.
+
+    Tasks only carry the map name, its version and the call arguments; the
+    map arrays are shipped once per worker through the pool initializer.
+    A map changed since then goes along with its tasks as a MapUpdate, the
+    cells changed since the pool started, which a worker applies to its
+    copy the first time it sees one; structures derived from the map follow
+    the change the way they do in the serving process.
+    """
+
+    def __init__(
+        self,
+        registry: maps.MapRegistry,
+        workers: int,
+        max_pending: int,
+        timeout: float,
+        preload: tp.Optional[tp.Callable[[maps.MapEntry], None]] = None,
+    ) -> None:
+        self.__registry = registry
+        self.__preload = preload
+        self.__workers = workers
+        self.__max_pending = max_pending
+        self.__timeout = timeout
+        self.__pool: tp.Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self.__threads: tp.Optional[concurrent.futures.ThreadPoolExecutor] = None
+        # per map: the maze the pool started with, the cells changed since
+        # and the update tasks carry
+        self.__started: tp.Dict[str, np.ndarray] = {}
+        self.__touched: tp.Dict[str, np.ndarray] = {}
+        self.__updates: tp.Dict[str, MapUpdate] = {}
+        # jobs submitted and not finished yet, timed out ones included
+        self.pending = 0
+        registry.subscribe(self.__on_map_changed)
+
+    def start(self) -> None:
+        if self.__workers <= 0:
+            if self.__preload is not None:
+                for entry in self.__registry:
+                    self.__preload(entry)
+            self.__threads = concurrent.futures.ThreadPoolExecutor()
+            logging.info("Planner runs in a thread pool")
+            return
+
+        entries = list(self.__registry)
+        self.__started = {entry.name: np.array(entry.maze) for entry in entries}
+        self.__touched.clear()
+        self.__updates.clear()
+        self.__pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.__workers,
+            initializer=_init_worker,
+            initargs=(entries, self.__preload),
+        )
+        logging.info(f"Planner pool started with {self.__workers} workers")
+
+    def shutdown(self) -> None:
+        if self.__pool is not None:
+            self.__pool.shutdown(wait=False, cancel_futures=True)
+            self.__pool = None
+            logging.info("Planner pool stopped")
+        if self.__threads is not None:
+            self.__threads.shutdown(wait=False, cancel_futures=True)
+            self.__threads = None
+
+    async def run(
+        self, func: tp.Callable[..., T], entry: maps.MapEntry, *args: tp.Any
+    ) -> T:
+        self.__admit()
+        if self.__pool is None:
+            job = self.__local().submit(func, entry, *args)
+        else:
+            update = self.__updates.get(entry.name)
+            if update is not None and update.costs[1] != entry.costs.path:
+                update = None  # an entry replaced since, the worker says so
+            job = self.__pool.submit(
+                _run_in_worker, func, entry.name, entry.version, update, args
+            )
+        return await self.__wait(job)
+
+    async def run_here(self, func: tp.Callable[..., T], *args: tp.Any) -> T:
+        """run() for work on state that lives in this process and must not
+        be copied to a worker, like a kept D* Lite search: it runs on
+        threads here, under the same queue limit and timeout. A job that
+        timed out still runs on, its state is the caller's to give up."""
+        self.__admit()
+        return await self.__wait(self.__local().submit(func, *args))
+
+    def __admit(self) -> None:
+        if self.pending >= self.__max_pending:
+            raise PlannerBusy(f"Planner queue is full ({self.pending} pending)")
+
+    def __local(self) -> concurrent.futures.ThreadPoolExecutor:
+        if self.__threads is None:
+            self.__threads = concurrent.futures.ThreadPoolExecutor()
+        return self.__threads
+
+    async def __wait(self, job: concurrent.futures.Future) -> T:
+        # a job that timed out keeps its worker busy until it finishes, so
+        # it is counted until then rather than until the caller gives up
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        job.add_done_callback(functools.partial(self.__finished, loop))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(job), self.__timeout)
+        except asyncio.TimeoutError:
+            raise PlannerTimeout(f"Planning took longer than {self.__timeout}s")
+
+    def __finished(
+        self, loop: asyncio.AbstractEventLoop, job: concurrent.futures.Future
+    ) -> None:
+        # called from the pool's thread
+        try:
+            loop.call_soon_threadsafe(self.__release)
+        except RuntimeError:
+            pass  # the loop is closed
+
+    def __release(self) -> None:
+        self.pending -= 1
+
+    def __on_map_changed(
+        self, old: tp.Optional[maps.MapEntry], new: maps.MapEntry
+    ) -> None:
+        if self.__pool is None:
+            if self.__preload is not None and self.__threads is not None:
+                job = self.__threads.submit(self.__preload, new)
+                job.add_done_callback(functools.partial(_log_preload, new))
+            return
+
+        if self.__track(new):
+            return
+
+        # workers hold a snapshot of the maps, so a new pool gets the new one
+        # while tasks already running on the old pool are left to finish
+        old_pool = self.__pool
+        self.start()
+        old_pool.shutdown(wait=False)
+
+    def __track(self, entry: maps.MapEntry) -> bool:
+        """Prepares the update workers apply for a changed map; False when
+        the pool has to start over instead."""
+        started = self.__started.get(entry.name)
+        if started is None or started.shape != entry.maze.shape:
+            return False
+        touched = self.__touched.get(entry.name)
+        if touched is None:
+            touched = np.zeros(started.shape, dtype=bool)
+        # cells changed and changed back stay in, a worker may hold either
+        touched = touched | (started != np.asarray(entry.maze))
+        if np.count_nonzero(touched) > MAX_UPDATE_SHARE * touched.size:
+            return False
+
+        self.__touched[entry.name] = touched
+        cells = np.argwhere(touched)
+        self.__updates[entry.name] = MapUpdate(
+            entry.version,
+            cells,
+            np.asarray(entry.maze)[cells[:, 0], cells[:, 1]],
+            entry.starts,
+            entry.sectors,
+            (entry.costs.shape, entry.costs.path),
+        )
+        return True
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import math
+import time
+import typing as tp
+from app import executor
+from app import maps
+from app import models
+from app import planning
+from app.route_cache import LRUCache
+from app.utils import distance_field
+
+FieldKey = tp.Tuple[str, str, models.GridLocation]
+
+
+class FlowFieldCache:
+    """Reverse distance fields per (map version, cost version, target) for
+    fleets that share a target: one search in the pool, then every start
+    is a walk along the parents."""
+
+    def __init__(
+        self,
+        registry: maps.MapRegistry,
+        planner: executor.PlannerExecutor,
+        maxsize: int,
+    ) -> None:
+        self.__planner = planner
+        self.__fields = LRUCache(maxsize, math.inf)
+        self.__building: tp.Dict[FieldKey, asyncio.Future] = {}
+        registry.subscribe(self.__on_map_changed)
+
+    @staticmethod
+    def key(entry: maps.MapEntry, target: models.GridLocation) -> FieldKey:
+        return entry.version, entry.costs.version, (int(target[0]), int(target[1]))
+
+    async def get(
+        self, entry: maps.MapEntry, target: models.GridLocation
+    ) -> distance_field.DistanceField:
+        key = self.key(entry, target)
+        field = self.__fields.get(key)
+        if field is not None:
+            return field
+
+        # robots asking for the same target at once wait for a single build
+        if key not in self.__building:
+            self.__building[key] = asyncio.ensure_future(self.__build(key, entry))
+        return await asyncio.shield(self.__building[key])
+
+    async def __build(
+        self, key: FieldKey, entry: maps.MapEntry
+    ) -> distance_field.DistanceField:
+        try:
+            field = await self.__planner.run(planning.build_flow_field, entry, key[2])
+            self.__fields.put(key, field)
+            return field
+        finally:
+            del self.__building[key]
+
+    async def calculate(
+        self,
+        entry: maps.MapEntry,
+        start: models.GridLocation,
+        target: models.GridLocation,
+        measured: tp.Optional[tp.Dict[str, tp.Any]] = None,
+    ) -> planning.Route:
+        field = await self.get(entry, target)
+        # the walk is as long as the path, so it runs here on the cached
+        # field and only the cells travel to the pool
+        t0 = time.perf_counter()
+        walked = None
+        if entry.grid.in_bounds(start):
+            walked = field.path_from((int(start[0]), int(start[1])))
+        if walked is None:
+            raise models.Unreachable("Start is unreachable")
+        walk = time.perf_counter() - t0
+
+        route, stats = await self.__planner.run(
+            planning.calculate_walked, entry, walked
+        )
+        stats["stages"]["search"] += walk
+        if measured is not None:
+            measured.update(stats)
+        return route
+
+    async def warm(self, entry: maps.MapEntry) -> tp.Dict[str, bool]:
+        async def warm_one(target: models.GridLocation) -> bool:
+            try:
+                await self.get(entry, target)
+            except Exception as e:
+                logging.warning(f"Flow field to {target} of map {entry.name} skipped: {e}")
+                return False
+            return True
+
+        sectors = list(entry.sectors.items())
+        done = await asyncio.gather(*(warm_one(target) for _, target in sectors))
+        return {sector: ok for (sector, _), ok in zip(sectors, done)}
+
+    @property
+    def stats(self) -> tp.Dict[str, int]:
+        return {
+            "size": len(self.__fields),
+            "hits": self.__fields.hits,
+            "misses": self.__fields.misses,
+            "evictions": self.__fields.evictions,
+            "building": len(self.__building),
+        }
+
+    def __on_map_changed(
+        self, old: tp.Optional[maps.MapEntry], new: maps.MapEntry
+    ) -> None:
+        if old is not None:
+            self.__fields.drop(lambda key: key[0] == old.version)
@@ -0,0 +1,93 @@
+import json
+import os
+import pathlib
+import struct
+import tempfile
+import typing as tp
+import numpy as np
+from app import models
+
+# packed maps: magic, width, height, then one bit per cell (1 = wall)
+PACKED_MAGIC = b"PDSMAP\x01\x00"
+PACKED_HEADER = struct.Struct("<8sII")
+PACKED_SUFFIX = ".bits"
+NUMPY_SUFFIX = ".npy"
+META_SUFFIX = ".json"
+MAP_SUFFIXES = (NUMPY_SUFFIX, PACKED_SUFFIX)
+
+
+def load(path: tp.Union[str, pathlib.Path]) -> np.ndarray:
+    """Read-only maze of a map file.
+
+    .npy files stay memory-mapped, so they must be replaced rather than
+    written over while loaded, see save(). .bits files are unpacked into
+    memory, one byte per cell.
+    """
+    path = pathlib.Path(path)
+    if path.suffix == NUMPY_SUFFIX:
+        maze = np.load(path, mmap_mode="r")
+    elif path.suffix == PACKED_SUFFIX:
+        raw = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, width, height = PACKED_HEADER.unpack(
+            raw[: PACKED_HEADER.size].tobytes()
+        )
+        if magic != PACKED_MAGIC:
+            raise Exception(f"{path} is not a packed map")
+        bits = np.unpackbits(raw[PACKED_HEADER.size :], count=width * height)
+        maze = bits.reshape(width, height)
+        maze.setflags(write=False)
+    else:
+        raise Exception(f"Unknown map format {path.suffix}")
+
+    if maze.ndim != 2:
+        raise Exception(f"{path} holds a {maze.ndim}-dimensional array")
+    return maze
+
+
+def save(path: tp.Union[str, pathlib.Path], maze: np.ndarray) -> None:
+    """Writes a map file next to the target and moves it into place, so
+    readers mapping the old file keep seeing the old maze."""
+    path = pathlib.Path(path)
+    if path.suffix not in MAP_SUFFIXES:
+        raise Exception(f"Unknown map format {path.suffix}")
+
+    walls = np.asarray(maze) == 1
+    fd, temporary = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            if path.suffix == NUMPY_SUFFIX:
+                np.save(file, walls.astype(np.uint8))
+            else:
+                file.write(PACKED_HEADER.pack(PACKED_MAGIC, *walls.shape))
+                file.write(np.packbits(walls, axis=None).tobytes())
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def load_meta(
+    path: tp.Union[str, pathlib.Path]
+) -> tp.Tuple[tp.List[models.GridLocation], tp.Optional[tp.Dict[str, models.GridLocation]]]:
+    """Starts and sectors from the .json next to a map file, if there is one."""
+    path = pathlib.Path(path).with_suffix(META_SUFFIX)
+    if not path.exists():
+        return [], None
+
+    meta = json.loads(path.read_text())
+    starts = [(int(x), int(y)) for x, y in meta.get("starts", [])]
+    sectors = meta.get("sectors")
+    if sectors is not None:
+        sectors = {str(k): (int(x), int(y)) for k, (x, y) in sectors.items()}
+    return starts, sectors
+
+
+def save_meta(
+    path: tp.Union[str, pathlib.Path],
+    starts: tp.Sequence[models.GridLocation],
+    sectors: tp.Optional[tp.Dict[str, models.GridLocation]],
+) -> None:
+    meta: tp.Dict[str, tp.Any] = {"starts": [list(start) for start in starts]}
+    if sectors is not None:
+        meta["sectors"] = {k: list(v) for k, v in sectors.items()}
+    pathlib.Path(path).with_suffix(META_SUFFIX).write_text(json.dumps(meta))
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import pathlib
+import typing as tp
+import numpy as np
+from app import cost_map
+from app import map_files
+from app import models
+
+T = tp.TypeVar("T")
+MapListener = tp.Callable[[tp.Optional["MapEntry"], "MapEntry"], None]
+
+DEFAULT_MAP = "maze_thin"
+
+
+def map_version(maze: np.ndarray) -> str:
+    maze = np.ascontiguousarray(maze)
+    digest = hashlib.sha1(str(maze.shape).encode())
+    digest.update(maze.astype(np.uint8, copy=False).tobytes())
+    return digest.hexdigest()
+
+
+class UnknownMap(Exception):
+    pass
+
+
+class MapEntry:
+    def __init__(
+        self,
+        name: str,
+        maze: np.ndarray,
+        starts: tp.Sequence[models.GridLocation] = (),
+        sectors: tp.Optional[tp.Dict[str, models.GridLocation]] = None,
+        path: tp.Optional[str] = None,
+        costs: tp.Optional[cost_map.CostMap] = None,
+    ) -> None:
+        # requests share the entry, so the maze must never change under them
+        if maze.flags.writeable:
+            maze = maze.copy()
+            maze.setflags(write=False)
+        self.name = name
+        self.maze = maze
+        self.path = path
+        self.version = map_version(maze)
+        self.costs = costs if costs is not None else cost_map.CostMap(maze.shape)
+        self.grid = models.GridWithWeights(
+            maze.shape[0], maze.shape[1], maze, self.costs.weights
+        )
+        self.starts: tp.Tuple[models.GridLocation, ...] = tuple(starts)
+        self.sectors: tp.Dict[str, models.GridLocation] = dict(sectors or {})
+        self.__derived: tp.Dict[str, tp.Any] = {}
+        # keys asked for with an update, the ones worth handing on
+        self.__updatable: tp.Set[str] = set()
+        self.__previous: tp.Optional[
+            tp.Tuple[tp.Dict[str, tp.Any], tp.List[models.GridLocation]]
+        ] = None
+
+    def derived(
+        self,
+        key: str,
+        factory: tp.Callable[[models.GridWithWeights], T],
+        update: tp.Optional[
+            tp.Callable[[T, models.GridWithWeights, tp.List[models.GridLocation]], T]
+        ] = None,
+    ) -> T:
+        # per-map structures (jump tables, graphs) built once per version;
+        # those with an update are patched from the previous version instead
+        if update is not None:
+            self.__updatable.add(key)
+        if key not in self.__derived:
+            previous, changed = self.__previous or ({}, [])
+            if update is not None and key in previous:
+                self.__derived[key] = update(previous[key], self.grid, changed)
+            else:
+                self.__derived[key] = factory(self.grid)
+            # the previous version's structures go once all are carried over
+            previous.pop(key, None)
+            if not previous:
+                self.__previous = None
+        return self.__derived[key]
+
+    def same_meta(
+        self,
+        starts: tp.Sequence[models.GridLocation],
+        sectors: tp.Optional[tp.Dict[str, models.GridLocation]],
+    ) -> bool:
+        return self.starts == tuple(starts) and self.sectors == dict(sectors or {})
+
+    def inherit(self, old: MapEntry) -> None:
+        if old.maze.shape != self.maze.shape:
+            return
+        if self.costs.owner and old.costs.owner:
+            self.costs.inherit(old.costs)
+        if map_version(old.maze) != old.version:
+            # a mapped file written over in place, not replaced: the old
+            # maze is gone, so is the diff, derived structures start over
+            logging.warning(f"Map {old.name} changed under its loaded version")
+            return
+        changed = np.argwhere(np.asarray(old.maze) != np.asarray(self.maze))
+        previous = {
+            key: value for key, value in old.__derived.items() if key in old.__updatable
+        }
+        if previous:
+            self.__previous = (previous, list(map(tuple, changed.tolist())))
+        old.__previous = None
+
+    @classmethod
+    def from_file(
+        cls,
+        name: str,
+        path: str,
+        starts: tp.Sequence[models.GridLocation] = (),
+        sectors: tp.Optional[tp.Dict[str, models.GridLocation]] = None,
+        costs: tp.Optional[cost_map.CostMap] = None,
+    ) -> MapEntry:
+        return cls(name, map_files.load(path), starts, sectors, path, costs)
+
+    def __reduce__(self):
+        # derived structures are rebuilt on the receiving side, and file
+        # backed maps and the costs are mapped again there instead of being
+        # copied over
+        if self.path is not None:
+            return MapEntry.from_file, (
+                self.name, self.path, self.starts, self.sectors, self.costs
+            )
+        return MapEntry, (
+            self.name, self.maze, self.starts, self.sectors, None, self.costs
+        )
+
+    def __repr__(self) -> str:
+        return f"MapEntry({self.name!r}, version={self.version[:12]})"
+
+
+class MapRegistry:
+    def __init__(self) -> None:
+        self.__entries: tp.Dict[str, MapEntry] = {}
+        self.__listeners: tp.List[MapListener] = []
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.__entries
+
+    def __iter__(self) -> tp.Iterator[MapEntry]:
+        return iter(list(self.__entries.values()))
+
+    def get(self, name: str = DEFAULT_MAP) -> MapEntry:
+        if name not in self.__entries:
+            raise UnknownMap(f"Map {name} is not registered")
+        return self.__entries[name]
+
+    def subscribe(self, listener: MapListener) -> None:
+        self.__listeners.append(listener)
+
+    def register(
+        self,
+        name: str,
+        maze: np.ndarray,
+        starts: tp.Sequence[models.GridLocation] = (),
+        sectors: tp.Optional[tp.Dict[str, models.GridLocation]] = None,
+        path: tp.Optional[str] = None,
+    ) -> MapEntry:
+        old = self.__entries.get(name)
+        if old is not None:
+            starts = starts or old.starts
+            sectors = sectors if sectors is not None else old.sectors
+            if old.version == map_version(maze) and old.same_meta(starts, sectors):
+                return old
+
+        return self.add(MapEntry(name, maze, starts, sectors, path))
+
+    def add(self, entry: MapEntry) -> MapEntry:
+        name = entry.name
+        old = self.__entries.get(name)
+        if old is not None and old.version == entry.version:
+            if old.same_meta(entry.starts, entry.sectors):
+                return old
+        if old is not None:
+            entry.inherit(old)
+
+        self.__entries[name] = entry
+        logging.info(f"Map {name} registered, version {entry.version[:12]}")
+        for listener in self.__listeners:
+            listener(old, entry)
+
+        return entry
+
+
+class MapDirectory:
+    """Keeps the registry in sync with the map files of a directory.
+
+    Every .npy or .bits file is registered under its stem, with starts and
+    sectors from a .json next to it. Files are polled by mtime and size,
+    and a changed file is loaded again and registered as a new version.
+    Loaded .npy files are mapped, so change them by replacing the file, as
+    map_files.save does, not by writing into it.
+    """
+
+    def __init__(self, registry: MapRegistry, directory: str) -> None:
+        self.__registry = registry
+        self.__directory = pathlib.Path(directory)
+        self.__seen: tp.Dict[pathlib.Path, tp.Tuple] = {}
+
+    @staticmethod
+    def __stamp(path: pathlib.Path) -> tp.Tuple:
+        stamps = []
+        for file in (path, path.with_suffix(map_files.META_SUFFIX)):
+            try:
+                stat = os.stat(file)
+            except FileNotFoundError:
+                stamps.append(None)
+                continue
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(stamps)
+
+    def __load_changed(self) -> tp.List[MapEntry]:
+        entries = []
+        for path in sorted(self.__directory.iterdir()):
+            if path.suffix not in map_files.MAP_SUFFIXES:
+                continue
+
+            stamp = self.__stamp(path)
+            if self.__seen.get(path) == stamp:
+                continue
+            self.__seen[path] = stamp
+
+            try:
+                starts, sectors = map_files.load_meta(path)
+                if path.stem in self.__registry:
+                    old = self.__registry.get(path.stem)
+                    starts = starts or old.starts
+                    sectors = sectors if sectors is not None else old.sectors
+                entries.append(MapEntry.from_file(path.stem, str(path), starts, sectors))
+            except Exception as e:
+                logging.warning(f"Map file {path} skipped: {e}")
+
+        return entries
+
+    def scan(self) -> tp.List[MapEntry]:
+        return [self.__registry.add(entry) for entry in self.__load_changed()]
+
+    async def watch(self, interval: float) -> None:
+        # files are read and hashed off the loop, listeners run on it
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                entries = await loop.run_in_executor(None, self.__load_changed)
+            except Exception as e:
+                logging.warning(f"Map directory {self.__directory} scan failed: {e}")
+                continue
+            for entry in entries:
+                self.__registry.add(entry)
+
+
+def default_registry() -> MapRegistry:
+    registry = MapRegistry()
+    registry.register(
+        "maze_thin",
+        models.Maze.maze_thin,
+        starts=[models.SECTOR_START],
+        sectors=models.SECTOR_WAYPOINTS,
+    )
+    registry.register("maze_main", models.Maze.maze_main)
+
+    return registry
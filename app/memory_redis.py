@@ -0,0 +1,141 @@
+import collections
+import fnmatch
+import time
+import typing as tp
+
+Value = tp.Union[bytes, str, int, float]
+
+
+def _encode(value: Value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+class MemoryRedis:
+    """In-process stand-in for the subset of redis.asyncio.Redis we use."""
+
+    def __init__(self) -> None:
+        self.__data: tp.Dict[str, tp.Any] = {}
+        self.__expires: tp.Dict[str, float] = {}
+
+    def __alive(self, key: str) -> bool:
+        expires_at = self.__expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.__data.pop(key, None)
+            del self.__expires[key]
+        return key in self.__data
+
+    @staticmethod
+    def _key(key: tp.Union[str, bytes]) -> str:
+        return key.decode() if isinstance(key, bytes) else key
+
+    async def get(self, key: str) -> tp.Optional[bytes]:
+        key = self._key(key)
+        return self.__data[key] if self.__alive(key) else None
+
+    async def mget(self, *keys: str) -> tp.List[tp.Optional[bytes]]:
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key: str, value: Value, ex: tp.Optional[int] = None) -> bool:
+        key = self._key(key)
+        self.__data[key] = _encode(value)
+        self.__expires.pop(key, None)
+        if ex is not None:
+            self.__expires[key] = time.monotonic() + ex
+        return True
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        value = int(await self.get(key) or 0) + amount
+        self.__data[self._key(key)] = _encode(value)
+        return value
+
+    async def rpush(self, key: str, *values: Value) -> int:
+        key = self._key(key)
+        if not self.__alive(key):
+            self.__data[key] = collections.deque()
+        self.__data[key].extend(map(_encode, values))
+        return len(self.__data[key])
+
+    async def lpush(self, key: str, *values: Value) -> int:
+        key = self._key(key)
+        if not self.__alive(key):
+            self.__data[key] = collections.deque()
+        self.__data[key].extendleft(map(_encode, values))
+        return len(self.__data[key])
+
+    async def lpop(self, key: str) -> tp.Optional[bytes]:
+        key = self._key(key)
+        if not self.__alive(key):
+            return None
+        value = self.__data[key].popleft()
+        if not self.__data[key]:
+            # like Redis, an emptied list no longer exists
+            await self.delete(key)
+        return value
+
+    async def llen(self, key: str) -> int:
+        key = self._key(key)
+        return len(self.__data[key]) if self.__alive(key) else 0
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        key = self._key(key)
+        if not self.__alive(key):
+            return False
+        self.__expires[key] = time.monotonic() + seconds
+        return True
+
+    async def exists(self, *keys: str) -> int:
+        return sum(self.__alive(self._key(key)) for key in keys)
+
+    async def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in map(self._key, keys):
+            deleted += self.__alive(key)
+            self.__data.pop(key, None)
+            self.__expires.pop(key, None)
+        return deleted
+
+    async def scan_iter(self, match: str = "*") -> tp.AsyncIterator[bytes]:
+        for key in list(self.__data):
+            if self.__alive(key) and fnmatch.fnmatchcase(key, match):
+                yield key.encode()
+
+    async def flushdb(self) -> bool:
+        self.__data.clear()
+        self.__expires.clear()
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    def pipeline(self, transaction: bool = True) -> "MemoryPipeline":
+        return MemoryPipeline(self)
+
+
+class MemoryPipeline:
+    def __init__(self, db: MemoryRedis) -> None:
+        self.__db = db
+        self.__commands: tp.List[tp.Tuple[str, tp.Tuple, tp.Dict]] = []
+
+    def __getattr__(self, name: str) -> tp.Callable[..., "MemoryPipeline"]:
+        getattr(self.__db, name)
+
+        def queue(*args, **kwargs) -> "MemoryPipeline":
+            self.__commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def __aenter__(self) -> "MemoryPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.__commands.clear()
+
+    async def execute(self) -> tp.List[tp.Any]:
+        commands, self.__commands = self.__commands, []
+        return [
+            await getattr(self.__db, name)(*args, **kwargs)
+            for name, args, kwargs in commands
+        ]
@@ -0,0 +1,232 @@
+import abc
+import bisect
+import contextlib
+import math
+import time
+import typing as tp
+
+Labels = tp.Tuple[str, ...]
+
+# seconds, from a cached lookup up to a long search on a big map
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Labels = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def _key(self, labels: tp.Dict[str, str]) -> Labels:
+        if labels.keys() != set(self.labels):
+            raise Exception(f"{self.name} takes labels {self.labels}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    @abc.abstractmethod
+    def samples(self) -> tp.Iterator[str]:
+        pass
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Labels = ()) -> None:
+        super().__init__(name, help, labels)
+        self.__values: tp.Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self.__values[key] = self.__values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self.__values.get(self._key(labels), 0)
+
+    def samples(self) -> tp.Iterator[str]:
+        for key, value in sorted(self.__values.items()):
+            labels = _format_labels(self.labels, key)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """Read when scraped, for state other objects already keep."""
+
+    kind = "gauge"
+
+    def __init__(
+        self, name: str, help: str, read: tp.Callable[[], float]
+    ) -> None:
+        super().__init__(name, help)
+        self.__read = read
+
+    def samples(self) -> tp.Iterator[str]:
+        yield f"{self.name} {_format_value(self.__read())}"
+
+
+class ReadCounter(Metric):
+    """A counter other objects keep, read when scraped; read returns the
+    value per label values."""
+
+    kind = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        read: tp.Callable[[], tp.Dict[Labels, float]],
+        labels: Labels = (),
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.__read = read
+
+    def samples(self) -> tp.Iterator[str]:
+        for key, value in sorted(self.__read().items()):
+            labels = _format_labels(self.labels, key)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Labels = (),
+        buckets: tp.Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: count per bucket (the last one is +Inf) and the sum
+        self.__values: tp.Dict[Labels, tp.Tuple[tp.List[int], tp.List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        if key not in self.__values:
+            self.__values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = self.__values[key]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> tp.Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        values = self.__values.get(self._key(labels))
+        return sum(values[0]) if values else 0
+
+    def samples(self) -> tp.Iterator[str]:
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for key, (counts, total) in sorted(self.__values.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = _format_labels(self.labels, key, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, key)
+            yield f"{self.name}_sum{labels} {_format_value(total[0])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.__metrics: tp.Dict[str, Metric] = {}
+
+    def add(self, metric: Metric) -> Metric:
+        if metric.name in self.__metrics:
+            raise Exception(f"Metric {metric.name} is already registered")
+        self.__metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        # Prometheus text exposition format 0.0.4
+        return "\n".join(metric.render() for metric in self.__metrics.values()) + "\n"
+
+
+class ServiceMetrics(Registry):
+    """What the handlers, the planner and the storage layer record."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.requests = self.add(
+            Histogram(
+                "pds_request_duration_seconds",
+                "Time spent in a handler.",
+                labels=("handler", "status"),
+            )
+        )
+        self.stages = self.add(
+            Histogram(
+                "pds_stage_duration_seconds",
+                "Time spent in one stage of serving a plan.",
+                labels=("stage",),
+            )
+        )
+        self.plans = self.add(
+            Counter(
+                "pds_plans_total",
+                "Plans served, by algorithm and where they came from.",
+                labels=("algorithm", "source"),
+            )
+        )
+        self.expanded = self.add(
+            Counter(
+                "pds_search_nodes_expanded_total",
+                "Nodes taken off the open list by the searches.",
+                labels=("algorithm",),
+            )
+        )
+        self.pushed = self.add(
+            Counter(
+                "pds_search_heap_pushes_total",
+                "Nodes pushed onto the open list by the searches.",
+                labels=("algorithm",),
+            )
+        )
+        self.sight_cells = self.add(
+            Counter(
+                "pds_line_of_sight_cells_total",
+                "Grid cells tested by line-of-sight checks.",
+                labels=("algorithm",),
+            )
+        )
+
+    def record_plan(self, algorithm: str, measured: tp.Dict[str, tp.Any]) -> None:
+        """Stage timings and search effort a planning call reported."""
+        for stage, seconds in measured["stages"].items():
+            self.stages.observe(seconds, stage=stage)
+        effort = measured["effort"]
+        self.expanded.inc(effort["expanded"], algorithm=algorithm)
+        self.pushed.inc(effort["pushed"], algorithm=algorithm)
+        self.sight_cells.inc(effort["sight_cells"], algorithm=algorithm)
@@ -1,11 +1,14 @@
 from __future__ import annotations
 import dataclasses
+import math
 import typing as tp
 import numpy as np
 
 GridLocation = tp.Tuple[int, int]
 Location = int
 
+DIAGONAL_STEP = math.sqrt(2)
+
 
 @dataclasses.dataclass
 class Maze:
@@ -96,6 +99,23 @@ class Maze:
                         [1, 1, 1, 1, 1, 1, 1, 1, 1, 1], ])
 
 
+SECTOR_START: GridLocation = (4, 16)
+SECTOR_WAYPOINTS: tp.Dict[str, GridLocation] = {
+    "0": (4, 8),
+    "1": (0, 0),
+    "2": (3, 35),
+    "3": (4, 52),
+    "4": (21, 4),
+    "5": (23, 16),
+    "6": (0, 0),
+    "7": (22, 51),
+}
+
+
+class Unreachable(Exception):
+    """No path between the points: off the map, on a wall or cut off."""
+
+
 @dataclasses.dataclass
 class WayPoint:
     point_x: tp.Optional[int]
@@ -139,19 +159,28 @@ class SquareGrid:
     def __init__(self, width: int, height: int, maze):
         self.width = width
         self.height = height
-        self.walls: list[GridLocation] = []
 
-        for i in range(width):
-            for j in range(height):
-                if maze[i][j] == 1:
-                    self.walls.append((i, j))
+        # occupancy[x, y] is True for a wall; the set is the hashed index
+        # used by per-cell queries from the pure Python search loops
+        self.occupancy: np.ndarray = np.asarray(maze)[:width, :height] == 1
+        self.occupancy.setflags(write=False)
+        self.wall_index: tp.FrozenSet[GridLocation] = frozenset(
+            map(tuple, np.argwhere(self.occupancy).tolist())
+        )
+
+    @property
+    def walls(self) -> tp.FrozenSet[GridLocation]:
+        return self.wall_index
 
     def in_bounds(self, id: GridLocation) -> bool:
         (x, y) = id
         return 0 <= x < self.width and 0 <= y < self.height
 
+    def is_wall(self, id: GridLocation) -> bool:
+        return id in self.wall_index
+
     def passable(self, id: GridLocation) -> bool:
-        return id not in self.walls
+        return id not in self.wall_index
 
     def neighbors(self, id: GridLocation) -> tp.Iterator[GridLocation]:
         (x, y) = id
@@ -165,9 +194,21 @@ class SquareGrid:
 
 
 class GridWithWeights(SquareGrid):
-    def __init__(self, width: int, height: int, maze: np.array):
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        maze: np.array,
+        weights: tp.Optional[np.ndarray] = None,
+    ):
         super().__init__(width, height, maze)
-        self.weights: dict[GridLocation, float] = {}
+        # weights[x, y] is the cost of a step into the cell; a CostMap may
+        # keep changing it in place
+        if weights is None:
+            weights = np.ones((width, height), dtype=np.float32)
+        self.weights: np.ndarray = weights
 
     def cost(self, from_node: GridLocation, to_node: GridLocation) -> float:
-        return self.weights.get(to_node, 1)
+        if from_node[0] != to_node[0] and from_node[1] != to_node[1]:
+            return self.weights.item(to_node) * DIAGONAL_STEP
+        return self.weights.item(to_node)
@@ -0,0 +1,78 @@
+import json
+import struct
+import typing as tp
+import numpy as np
+
+Movements = tp.Dict[str, tp.List[tp.Dict[str, float]]]
+
+# magic, format version, number of steps, then one packed record per step;
+# version 2 appends the map version and the turn points the steps follow
+MAGIC = b"PDSP"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sBI")
+STEP = np.dtype([("op", "u1"), ("value", "<f8")])
+POINTS_HEADER = struct.Struct("<20sI")
+POINT = np.dtype("<i4")
+
+# rotate is in degrees, run in cells and wait in reservation slots
+OPCODES = {"rotate": 0, "run": 1, "wait": 2}
+OPNAMES = {code: name for name, code in OPCODES.items()}
+
+
+def encode(movements: Movements, map_version: tp.Optional[str] = None) -> bytes:
+    way = movements["way"]
+    steps = np.empty(len(way), dtype=STEP)
+    steps["op"] = [OPCODES[step["type"]] for step in way]
+    steps["value"] = [step["value"] for step in way]
+
+    points = np.asarray(movements.get("points", ()), dtype=POINT).reshape(-1, 2)
+    digest = bytes.fromhex(map_version) if map_version else bytes(20)
+    return b"".join(
+        (
+            HEADER.pack(MAGIC, FORMAT_VERSION, len(way)),
+            steps.tobytes(),
+            POINTS_HEADER.pack(digest, len(points)),
+            points.tobytes(),
+        )
+    )
+
+
+def _steps(raw: bytes) -> tp.Tuple[int, np.ndarray]:
+    magic, version, count = HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise Exception("Not an encoded plan")
+    if version not in (1, FORMAT_VERSION):
+        raise Exception(f"Unsupported plan format version {version}")
+    return version, np.frombuffer(raw, dtype=STEP, count=count, offset=HEADER.size)
+
+
+def decode(raw: bytes) -> Movements:
+    _, steps = _steps(raw)
+    return {
+        "way": [
+            {"type": OPNAMES[op], "value": value}
+            for op, value in zip(steps["op"].tolist(), steps["value"].tolist())
+        ]
+    }
+
+
+def decode_points(raw: bytes) -> tp.Tuple[tp.Optional[str], np.ndarray]:
+    """Map version and (n, 2) turn points of a plan, None and no points for
+    plans written without them."""
+    version, steps = _steps(raw)
+    offset = HEADER.size + steps.nbytes
+    if version < 2:
+        return None, np.empty((0, 2), dtype=POINT)
+
+    digest, count = POINTS_HEADER.unpack_from(raw, offset)
+    points = np.frombuffer(
+        raw, dtype=POINT, count=count * 2, offset=offset + POINTS_HEADER.size
+    ).reshape(-1, 2)
+    return (digest.hex() if any(digest) else None), points
+
+
+def to_json(movements: tp.Optional[Movements]) -> bytes:
+    # the same bytes web.json_response would send for what robots get
+    if movements is None:
+        return json.dumps(None).encode()
+    return json.dumps({"way": movements["way"]}).encode()
@@ -0,0 +1,299 @@
+import math
+import threading
+import time
+import typing as tp
+import numpy as np
+from app import maps
+from app import models
+from app import route_cache
+from app.utils import a_star_pathfinder
+from app.utils import d_star_lite
+from app.utils import direction_finder
+from app.utils import distance_field
+from app.utils import hierarchical
+from app.utils import jump_point_search
+from app.utils import search_stats
+from app.utils import space_time
+from app.utils import theta_star
+from app.utils import tour
+from app.utils import visibility_graph
+
+Movements = tp.Dict[str, tp.List[tp.Dict[str, float]]]
+# rotation angles, run distances and the turn points they follow
+Route = tp.Tuple[tp.List[float], tp.List[float], tp.List[models.GridLocation]]
+
+ALGORITHMS = (
+    "astar",
+    "jps",
+    "jps+",
+    "theta",
+    "lazy_theta",
+    "visibility",
+    "flow",
+    "hpa",
+)
+DEFAULT_ALGORITHM = "astar"
+
+# per-map structures some algorithms need, built once per map version
+DERIVED = {
+    "jps+": ("jump_table", jump_point_search.JumpTable.from_grid),
+    "visibility": ("visibility_graph", visibility_graph.VisibilityGraph.from_grid),
+    "hpa": ("hierarchy", hierarchical.Hierarchy.from_grid),
+}
+# structures that can follow a map change locally instead of a rebuild
+DERIVED_UPDATES = {
+    "hpa": hierarchical.Hierarchy.updated,
+}
+
+# reverse distance fields guiding timed searches, kept by every process
+# that runs them, since a field is too big to travel with each search
+TIMED_FIELDS = 16
+_timed_fields = route_cache.LRUCache(TIMED_FIELDS, math.inf)
+_timed_fields_lock = threading.Lock()
+
+
+def derived_for(entry: maps.MapEntry, algorithm: str) -> tp.Any:
+    key, factory = DERIVED[algorithm]
+    return entry.derived(key, factory, DERIVED_UPDATES.get(algorithm))
+
+
+def preload(entry: maps.MapEntry, algorithms: tp.Sequence[str] = ()) -> None:
+    for algorithm in algorithms:
+        if algorithm in DERIVED:
+            derived_for(entry, algorithm)
+
+
+def make_algorithm(entry: maps.MapEntry, algorithm: str) -> a_star_pathfinder.AStar:
+    if algorithm == "astar":
+        return a_star_pathfinder.AStar()
+    elif algorithm == "jps":
+        return jump_point_search.JumpPointSearch()
+    elif algorithm == "jps+":
+        return jump_point_search.JumpPointSearchPlus(derived_for(entry, algorithm))
+    elif algorithm == "theta":
+        return theta_star.ThetaStar()
+    elif algorithm == "lazy_theta":
+        return theta_star.LazyThetaStar()
+    elif algorithm == "visibility":
+        return visibility_graph.VisibilityGraphPlanner(derived_for(entry, algorithm))
+    elif algorithm == "flow":
+        return distance_field.FlowFieldPlanner()
+    elif algorithm == "hpa":
+        return hierarchical.HierarchicalPlanner(derived_for(entry, algorithm))
+
+    raise Exception(f"Unknown algorithm {algorithm}")
+
+
+def calculate(
+    entry: maps.MapEntry,
+    start: models.GridLocation,
+    target: models.GridLocation,
+    algorithm: str = DEFAULT_ALGORITHM,
+) -> Route:
+    return _calculate(make_algorithm(entry, algorithm), entry, start, target)
+
+
+def calculate_measured(
+    entry: maps.MapEntry,
+    start: models.GridLocation,
+    target: models.GridLocation,
+    algorithm: str = DEFAULT_ALGORITHM,
+) -> tp.Tuple[Route, tp.Dict[str, tp.Any]]:
+    """calculate() that also reports stage timings and search effort."""
+    measured: tp.Dict[str, tp.Any] = {}
+    route = _calculate(
+        make_algorithm(entry, algorithm), entry, start, target, measured
+    )
+    return route, measured
+
+
+def calculate_walked(
+    entry: maps.MapEntry,
+    walked: tp.List[models.GridLocation],
+) -> tp.Tuple[Route, tp.Dict[str, tp.Any]]:
+    """calculate_measured() for the cells walked off a flow field, start to
+    target; the field itself stays where it is cached."""
+    measured: tp.Dict[str, tp.Any] = {}
+    algorythm = distance_field.FlowFieldPlanner(walked=walked)
+    route = _calculate(algorythm, entry, walked[0], walked[-1], measured)
+    return route, measured
+
+
+def replan(
+    entry: maps.MapEntry,
+    state: d_star_lite.DStarLite,
+    measured: tp.Optional[tp.Dict[str, tp.Any]] = None,
+) -> Route:
+    # the state carries its own copy of the grid with the reported changes
+    algorythm = d_star_lite.DStarLitePlanner(state)
+    return _calculate(
+        algorythm, entry, state.start, state.goal, measured, grid=state.grid
+    )
+
+
+def calculate_timed(
+    entry: maps.MapEntry,
+    start: models.GridLocation,
+    target: models.GridLocation,
+    first_slot: int,
+    reserved: space_time.Reserved,
+    horizon: int,
+    park: int,
+) -> tp.Tuple[tp.List[models.GridLocation], Movements, tp.Dict[str, tp.Any]]:
+    """Space-time plan around reserved cells: the cell of every slot, the
+    movements, which wait where the path waits, and the stage timings and
+    search effort. Timed paths are not smoothed, a shortcut would move the
+    robot off its slots."""
+    stats = search_stats.SearchStats()
+    t0 = time.perf_counter()
+    # costs to the target without other robots guide the search
+    distance = timed_distance(entry, target)
+    path = space_time.search(
+        entry.grid, start, target, first_slot, reserved, horizon, park, distance, stats
+    )
+    t1 = time.perf_counter()
+    points, waits = space_time.to_segments(path)
+    angles, distances = direction_finder.get_geometry(
+        points, (entry.grid.width, entry.grid.height)
+    )
+    movements = to_movements(angles, distances, points)
+    way = movements["way"]
+    # every segment is a rotate and a run, waits go before the rotate
+    for i in reversed(range(len(angles))):
+        if waits[i]:
+            way.insert(2 * i, {"type": "wait", "value": float(waits[i])})
+    t2 = time.perf_counter()
+    measured = {
+        "stages": {"search": t1 - t0, "geometry": t2 - t1},
+        "effort": stats.as_dict(),
+    }
+
+    return path, movements, measured
+
+
+def timed_distance(entry: maps.MapEntry, target: models.GridLocation) -> np.ndarray:
+    key = (entry.version, entry.costs.version, (int(target[0]), int(target[1])))
+    with _timed_fields_lock:
+        distance = _timed_fields.get(key)
+    if distance is None:
+        distance = build_flow_field(entry, target).distance
+        with _timed_fields_lock:
+            _timed_fields.put(key, distance)
+    return distance
+
+
+def build_flow_field(
+    entry: maps.MapEntry, target: models.GridLocation
+) -> distance_field.DistanceField:
+    if not entry.grid.in_bounds(target) or entry.grid.is_wall(target):
+        raise models.Unreachable("End is unreachable")
+    field = distance_field.DistanceField.from_grid(entry.grid, target, reverse=True)
+    return field.compact()
+
+
+def _calculate(
+    algorythm: a_star_pathfinder.AStar,
+    entry: maps.MapEntry,
+    start: models.GridLocation,
+    target: models.GridLocation,
+    measured: tp.Optional[tp.Dict[str, tp.Any]] = None,
+    grid: tp.Optional[models.GridWithWeights] = None,
+) -> Route:
+    # measured, when given, gets the seconds per stage and the search effort
+    t0 = time.perf_counter()
+    algorythm.maze = grid if grid is not None else entry.grid
+    algorythm.points = (start, target)
+    algorythm.a_star_search()
+
+    path = algorythm.get_path()
+    if path is None:
+        raise models.Unreachable("End can not be reached from the start")
+    t1 = time.perf_counter()
+    smoothed = algorythm.smooth_path(path)
+    t2 = time.perf_counter()
+    angles, distances = algorythm.get_geometry(smoothed)
+    t3 = time.perf_counter()
+    if measured is not None:
+        measured["stages"] = {
+            "search": t1 - t0,
+            "smooth": t2 - t1,
+            "geometry": t3 - t2,
+        }
+        measured["effort"] = algorythm.stats.as_dict()
+
+    return angles, distances, smoothed
+
+
+def to_movements(
+    angles: tp.List[float],
+    distances: tp.List[float],
+    points: tp.Optional[tp.Sequence[models.GridLocation]] = None,
+) -> Movements:
+    row: Movements = {"way": []}
+    for i in range(len(angles)):
+        row["way"].append({"type": "rotate", "value": angles[i]})
+        row["way"].append({"type": "run", "value": distances[i]})
+
+    # kept for rendering the plan later, robots only get the way
+    if points is not None:
+        row["points"] = [[int(x), int(y)] for x, y in points]
+    return row
+
+
+def build_plan(
+    entry: maps.MapEntry,
+    start: models.GridLocation,
+    target: models.GridLocation,
+    algorithm: str = DEFAULT_ALGORITHM,
+) -> Movements:
+    return to_movements(*calculate(entry, start, target, algorithm))
+
+
+def tour_costs(
+    grid: models.GridWithWeights, points: tp.Sequence[models.GridLocation]
+) -> tp.Tuple[tp.List[distance_field.DistanceField], np.ndarray]:
+    """Distance field from every point and the matrix of path costs between
+    the points, costs[i][j] from points[i] to points[j]."""
+    for point in points:
+        if not grid.in_bounds(point) or grid.is_wall(point):
+            raise models.Unreachable(f"Point {tuple(point)} is unreachable")
+
+    fields = [
+        distance_field.DistanceField.from_grid(grid, point, points) for point in points
+    ]
+    costs = np.array([[field.cost_to(point) for point in points] for field in fields])
+    if np.isinf(costs).any():
+        raise models.Unreachable("Some stops can not be reached from each other")
+    return fields, costs
+
+
+def plan_tour(
+    entry: maps.MapEntry,
+    start: models.GridLocation,
+    stops: tp.Sequence[models.GridLocation],
+) -> tp.Tuple[tp.List[int], Movements]:
+    """Visit all stops from start in a short order and plan it as one route.
+
+    One bounded Dijkstra per point gives the whole cost matrix and the legs,
+    so no pair is searched twice. Returns the visiting order as indices into
+    stops together with the movements. The route passes every stop but, like
+    a plan from calculate(), ends one cell before the last one.
+    """
+    grid = entry.grid
+    points = [tuple(start)] + [tuple(stop) for stop in stops]
+    fields, costs = tour_costs(grid, points)
+    order = tour.two_opt(costs, tour.nearest_neighbour(costs))
+
+    # every leg is smoothed on its own so the route still passes each stop
+    algorythm = a_star_pathfinder.AStar()
+    algorythm.maze = grid
+    smoothed = [points[0]]
+    for current, following in zip(order, order[1:]):
+        leg = fields[current].path_to(points[following])
+        if following == order[-1] and len(leg) > 1:
+            leg = leg[:-1]
+        smoothed.extend(algorythm.smooth_path(leg)[1:])
+
+    angles, distances = algorythm.get_geometry(smoothed)
+    movements = to_movements(angles, distances, smoothed)
+    return [index - 1 for index in order[1:]], movements
@@ -0,0 +1,186 @@
+import asyncio
+import collections
+import time
+import typing as tp
+from app import executor
+from app import maps
+from app import models
+from app import planning
+from app.utils import d_star_lite
+
+CellChanges = tp.Dict[models.GridLocation, bool]
+
+
+class ReplanSession:
+    def __init__(
+        self, entry: maps.MapEntry, robot: str, state: d_star_lite.DStarLite
+    ) -> None:
+        self.entry = entry
+        self.robot = robot
+        self.state = state
+        self.lock = asyncio.Lock()
+        self.touched = time.monotonic()
+        self.points: tp.List[models.GridLocation] = []
+
+
+class Replanner:
+    """Incremental planners of the robots on a replannable task.
+
+    Every session keeps its D* Lite search between calls, so a reported
+    obstacle or a robot position only repairs the part of the search it
+    affects. The cell changes reported for a map are kept as well, and new
+    sessions start from them. The searches live here, so they run on the
+    planner's threads rather than in its workers.
+    """
+
+    def __init__(
+        self,
+        registry: maps.MapRegistry,
+        planner: executor.PlannerExecutor,
+        max_sessions: int,
+        ttl: float,
+    ) -> None:
+        self.__planner = planner
+        self.__max_sessions = max_sessions
+        self.__ttl = ttl
+        self.__sessions: tp.OrderedDict[str, ReplanSession] = (
+            collections.OrderedDict()
+        )
+        self.__changes: tp.Dict[str, CellChanges] = {}
+        registry.subscribe(self.__on_map_changed)
+
+    def __len__(self) -> int:
+        return len(self.__sessions)
+
+    def changes(self, entry: maps.MapEntry) -> CellChanges:
+        return dict(self.__changes.get(entry.name, {}))
+
+    async def start(
+        self,
+        entry: maps.MapEntry,
+        robot: str,
+        start: models.GridLocation,
+        target: models.GridLocation,
+    ) -> tp.Tuple[planning.Route, tp.Dict[str, tp.Any]]:
+        grid = d_star_lite.DynamicGrid(entry.grid)
+        for cell, blocked in self.__changes.get(entry.name, {}).items():
+            grid.set_blocked(cell, blocked)
+        for point in (start, target):
+            if not grid.in_bounds(point) or grid.is_wall(point):
+                raise models.Unreachable(f"Point {tuple(point)} is unreachable")
+
+        self.stop(robot)
+        session = ReplanSession(
+            entry, robot, d_star_lite.DStarLite(grid, start, target)
+        )
+        route, measured = await self.__replan(session)
+        session.points = route[2]
+        self.__sessions[robot] = session
+        self.__prune()
+        return route, measured
+
+    async def update(
+        self,
+        entry: maps.MapEntry,
+        cells: CellChanges,
+        positions: tp.Optional[tp.Dict[str, models.GridLocation]] = None,
+    ) -> tp.Dict[str, tp.Tuple[tp.Optional[planning.Route], tp.Dict[str, tp.Any]]]:
+        """Applies cell changes and robot positions, returns the new routes
+        of the robots whose plan changed (None when the goal is cut off)."""
+        for cell in cells:
+            if not entry.grid.in_bounds(cell):
+                raise ValueError(f"Cell {tuple(cell)} is outside of the map")
+        positions = positions or {}
+
+        changes = self.__changes.setdefault(entry.name, {})
+        for cell, blocked in cells.items():
+            # only differences from the map itself are worth keeping
+            if blocked == bool(entry.grid.occupancy[cell]):
+                changes.pop(cell, None)
+            else:
+                changes[cell] = blocked
+
+        self.__prune()
+        sessions = [
+            session
+            for session in self.__sessions.values()
+            if session.entry.version == entry.version
+        ]
+        updates = await asyncio.gather(
+            *(
+                self.__update(session, cells, positions.get(session.robot))
+                for session in sessions
+            )
+        )
+        return {
+            session.robot: update
+            for session, update in zip(sessions, updates)
+            if update is not None
+        }
+
+    def stop(self, robot: str) -> bool:
+        return self.__sessions.pop(robot, None) is not None
+
+    async def __update(
+        self,
+        session: ReplanSession,
+        cells: CellChanges,
+        position: tp.Optional[models.GridLocation],
+    ) -> tp.Optional[tp.Tuple[tp.Optional[planning.Route], tp.Dict[str, tp.Any]]]:
+        async with session.lock:
+            changed = session.state.update_cells(cells)
+            if position is not None:
+                session.state.move_to(position)
+            elif not changed:
+                return None
+
+            try:
+                route, measured = await self.__replan(session)
+            except models.Unreachable:
+                # the robot stands on a blocked cell or the goal is cut off
+                if not session.points:
+                    return None
+                session.points = []
+                return None, {}
+
+            points = route[2]
+            if points == session.points:
+                return None
+            session.points = points
+            return route, measured
+
+    async def __replan(
+        self, session: ReplanSession
+    ) -> tp.Tuple[planning.Route, tp.Dict[str, tp.Any]]:
+        session.touched = time.monotonic()
+        measured: tp.Dict[str, tp.Any] = {}
+        try:
+            route = await self.__planner.run_here(
+                planning.replan, session.entry, session.state, measured
+            )
+        except executor.PlannerTimeout:
+            # the search goes on in its thread, the session can not be
+            # trusted with another update until it has finished
+            if self.__sessions.get(session.robot) is session:
+                del self.__sessions[session.robot]
+            raise
+        return route, measured
+
+    def __prune(self) -> None:
+        expired = time.monotonic() - self.__ttl
+        for robot in [r for r, s in self.__sessions.items() if s.touched < expired]:
+            del self.__sessions[robot]
+        while len(self.__sessions) > self.__max_sessions:
+            self.__sessions.popitem(last=False)
+
+    def __on_map_changed(
+        self, old: tp.Optional[maps.MapEntry], new: maps.MapEntry
+    ) -> None:
+        if old is None:
+            return
+        # the reported changes were relative to the old map
+        self.__changes.pop(new.name, None)
+        for robot in [
+            r for r, s in self.__sessions.items() if s.entry.name == new.name
+        ]:
+            del self.__sessions[robot]
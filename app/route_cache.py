@@ -0,0 +1,184 @@
+import asyncio
+import collections
+import json
+import logging
+import time
+import typing as tp
+from redis import asyncio as aioredis
+from app import maps
+from app import models
+
+# map version, cost version, start, target, options
+CacheKey = tp.Tuple[str, str, models.GridLocation, models.GridLocation, tp.Tuple]
+
+
+class LRUCache:
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        clock: tp.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.__clock = clock
+        self.__items: tp.OrderedDict[tp.Hashable, tp.Tuple[float, tp.Any]] = (
+            collections.OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def get(self, key: tp.Hashable) -> tp.Optional[tp.Any]:
+        item = self.__items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = item
+        if expires_at <= self.__clock():
+            del self.__items[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self.__items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: tp.Hashable, value: tp.Any) -> None:
+        self.__items[key] = (self.__clock() + self.ttl, value)
+        self.__items.move_to_end(key)
+        while len(self.__items) > self.maxsize:
+            self.__items.popitem(last=False)
+            self.evictions += 1
+
+    def drop(self, predicate: tp.Callable[[tp.Hashable], bool]) -> int:
+        keys = [key for key in self.__items if predicate(key)]
+        for key in keys:
+            del self.__items[key]
+        return len(keys)
+
+
+class RouteCache:
+    """In-process LRU in front of a Redis tier shared between workers."""
+
+    def __init__(
+        self,
+        db: tp.Optional[aioredis.Redis],
+        registry: maps.MapRegistry,
+        maxsize: int,
+        ttl: float,
+        redis_ttl: int,
+    ) -> None:
+        self.__db = db
+        self.__local = LRUCache(maxsize, ttl)
+        self.__redis_ttl = redis_ttl
+        self.redis_hits = 0
+        self.invalidations = 0
+        # Redis cleanups started by map changes
+        self.__cleanups: tp.Set[asyncio.Task] = set()
+        registry.subscribe(self.__on_map_changed)
+
+    @staticmethod
+    def key(
+        entry: maps.MapEntry,
+        start: models.GridLocation,
+        target: models.GridLocation,
+        options: tp.Optional[tp.Mapping[str, tp.Any]] = None,
+    ) -> CacheKey:
+        return (
+            entry.version,
+            entry.costs.version,
+            (int(start[0]), int(start[1])),
+            (int(target[0]), int(target[1])),
+            tuple(sorted((options or {}).items())),
+        )
+
+    @staticmethod
+    def redis_key(key: CacheKey) -> str:
+        version, costs, start, target, options = key
+        options_part = ",".join(f"{k}={v}" for k, v in options)
+        return (
+            f"route:{version}:{costs}:{start[0]},{start[1]}:{target[0]},{target[1]}"
+            f":{options_part}"
+        )
+
+    async def get(self, key: CacheKey) -> tp.Optional[tp.Any]:
+        value = self.__local.get(key)
+        if value is not None or self.__db is None:
+            return value
+
+        raw = await self.__db.get(self.redis_key(key))
+        if raw is None:
+            return None
+
+        self.redis_hits += 1
+        value = json.loads(raw)
+        self.__local.put(key, value)
+        return value
+
+    async def put(self, key: CacheKey, value: tp.Any) -> None:
+        self.__local.put(key, value)
+        if self.__db is not None:
+            await self.__db.set(
+                self.redis_key(key), json.dumps(value), ex=self.__redis_ttl
+            )
+
+    async def invalidate(self, version: str) -> None:
+        self.invalidations += 1
+        dropped = self.__drop_local(version)
+        if self.__db is not None:
+            pattern = f"route:{version}:*"
+            keys = [key async for key in self.__db.scan_iter(match=pattern)]
+            if keys:
+                await self.__db.delete(*keys)
+            dropped += len(keys)
+
+        logging.info(f"Route cache for map version {version[:12]} dropped: {dropped}")
+
+    def __drop_local(self, version: str) -> int:
+        return self.__local.drop(lambda key: key[0] == version)
+
+    @property
+    def stats(self) -> tp.Dict[str, int]:
+        return {
+            "size": len(self.__local),
+            "local_hits": self.__local.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.__local.misses - self.redis_hits,
+            "evictions": self.__local.evictions,
+            "expirations": self.__local.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    def __on_map_changed(
+        self, old: tp.Optional[maps.MapEntry], new: maps.MapEntry
+    ) -> None:
+        if old is None:
+            return
+
+        # local entries go right away, the shared tier is cleaned in the background
+        self.__drop_local(old.version)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.invalidations += 1
+            return
+        task = loop.create_task(self.invalidate(old.version))
+        self.__cleanups.add(task)
+        task.add_done_callback(self.__cleaned)
+
+    def __cleaned(self, task: asyncio.Task) -> None:
+        self.__cleanups.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Route cache cleanup failed: {task.exception()!r}")
+
+    def stop(self) -> None:
+        for task in self.__cleanups:
+            task.cancel()
+        self.__cleanups.clear()
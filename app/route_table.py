@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import types
+import typing as tp
+from app import executor
+from app import maps
+from app import models
+from app import planning
+
+RouteKey = tp.Tuple[models.GridLocation, str]
+
+
+class RouteTable:
+    """Motion plans for every (start, sector) pair of the registered maps."""
+
+    def __init__(
+        self,
+        registry: maps.MapRegistry,
+        planner: executor.PlannerExecutor,
+        algorithm: str = planning.DEFAULT_ALGORITHM,
+    ) -> None:
+        self.__registry = registry
+        self.__planner = planner
+        self.algorithm = algorithm
+        # map name to (map version, cost version, routes)
+        self.__tables: tp.Mapping[str, tp.Tuple[str, str, tp.Mapping]] = (
+            types.MappingProxyType({})
+        )
+        # rebuilds started by map changes, by map name
+        self.__rebuilds: tp.Dict[str, asyncio.Task] = {}
+        registry.subscribe(self.__on_map_changed)
+
+    async def build(self) -> None:
+        for entry in self.__registry:
+            await self.rebuild(entry)
+
+    async def rebuild(self, entry: maps.MapEntry) -> None:
+        costs = entry.costs.version
+        table: tp.Dict[RouteKey, planning.Movements] = {}
+        for start in entry.starts:
+            for sector, target in entry.sectors.items():
+                try:
+                    table[(start, sector)] = await self.__planner.run(
+                        planning.build_plan, entry, start, target, self.algorithm
+                    )
+                except Exception as e:
+                    logging.warning(
+                        f"Sector {sector} of map {entry.name} skipped: {e}"
+                    )
+
+        if self.__registry.get(entry.name).version != entry.version:
+            return
+
+        tables = dict(self.__tables)
+        tables[entry.name] = (entry.version, costs, types.MappingProxyType(table))
+        self.__tables = types.MappingProxyType(tables)
+        logging.info(f"Route table for map {entry.name} built: {len(table)} routes")
+
+    def lookup(
+        self, entry: maps.MapEntry, start: models.GridLocation, sector: str
+    ) -> tp.Optional[planning.Movements]:
+        # routes planned with other costs are left to the search
+        version, costs, table = self.__tables.get(entry.name, (None, None, {}))
+        if version != entry.version or costs != entry.costs.version:
+            return None
+        return table.get((start, sector))
+
+    def __on_map_changed(
+        self, old: tp.Optional[maps.MapEntry], new: maps.MapEntry
+    ) -> None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.refresh(new)
+
+    def refresh(self, entry: maps.MapEntry) -> None:
+        """Rebuilds the map's routes in the background, replacing a
+        rebuild of it still running, whose result would be stale."""
+        running = self.__rebuilds.pop(entry.name, None)
+        if running is not None:
+            running.cancel()
+        task = asyncio.get_running_loop().create_task(self.rebuild(entry))
+        self.__rebuilds[entry.name] = task
+        task.add_done_callback(lambda done: self.__rebuilt(entry.name, done))
+
+    def __rebuilt(self, name: str, task: asyncio.Task) -> None:
+        if self.__rebuilds.get(name) is task:
+            del self.__rebuilds[name]
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            logging.error(f"Route table for map {name} not rebuilt: {error!r}")
+
+    def stop(self) -> None:
+        for task in self.__rebuilds.values():
+            task.cancel()
+        self.__rebuilds.clear()
@@ -1,11 +1,26 @@
+import time
 from aiohttp import web
 from app.api import handlers
 from app import context
 
 
 def wrap_handler(handler, ctx: context.AppContext):
+    name = type(handler).__name__
+
     async def wrapper(request):
-        return await handler(request, ctx)
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request, ctx)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            ctx.metrics.requests.observe(
+                time.perf_counter() - started, handler=name, status=str(status)
+            )
 
     return wrapper
 
@@ -15,6 +30,41 @@ def setup_routes(app: web.Application, ctx: context.AppContext) -> None:
         "/set_geodata", wrap_handler(handlers.CorsOptionsHandler(), ctx)
     )
     app.router.add_post("/set_geodata", wrap_handler(handlers.SetGeodataHandler(), ctx))
+    app.router.add_options(
+        "/set_geodata_batch", wrap_handler(handlers.CorsOptionsHandler(), ctx)
+    )
+    app.router.add_post(
+        "/set_geodata_batch", wrap_handler(handlers.SetGeodataBatchHandler(), ctx)
+    )
+    app.router.add_post(
+        "/set_geodata_cooperative",
+        wrap_handler(handlers.CooperativePlanHandler(), ctx),
+    )
+    app.router.add_delete(
+        "/set_geodata_cooperative",
+        wrap_handler(handlers.CooperativePlanHandler(), ctx),
+    )
+    app.router.add_post(
+        "/flow_fields/warm", wrap_handler(handlers.WarmFlowFieldsHandler(), ctx)
+    )
+    app.router.add_post("/replan", wrap_handler(handlers.ReplanStartHandler(), ctx))
+    app.router.add_delete(
+        "/replan", wrap_handler(handlers.ReplanStopHandler(), ctx)
+    )
+    app.router.add_post("/cells", wrap_handler(handlers.CellUpdatesHandler(), ctx))
+    app.router.add_get("/costs", wrap_handler(handlers.CostsHandler(), ctx))
+    app.router.add_post("/costs", wrap_handler(handlers.CostsHandler(), ctx))
     app.router.add_get(
         "/get_geodata", wrap_handler(handlers.GetWaypointsHandler(), ctx)
     )
+    app.router.add_get(
+        "/get_geodata/wait", wrap_handler(handlers.WaitWaypointsHandler(), ctx)
+    )
+    app.router.add_get("/ws", wrap_handler(handlers.WaypointsSocketHandler(), ctx))
+    app.router.add_post(
+        "/get_geodata_batch", wrap_handler(handlers.GetWaypointsBatchHandler(), ctx)
+    )
+    app.router.add_get(
+        "/debug/render", wrap_handler(handlers.RenderPlanHandler(), ctx)
+    )
+    app.router.add_get("/metrics", wrap_handler(handlers.MetricsHandler(), ctx))
@@ -0,0 +1,47 @@
+import asyncio
+import typing as tp
+
+T = tp.TypeVar("T")
+
+
+class SingleFlight:
+    """One computation per key at a time: callers arriving while it runs
+    wait for its result, or its exception, instead of starting their own.
+
+    The computation is shielded, so it goes on for the others when the
+    caller that started it is cancelled.
+    """
+
+    def __init__(self) -> None:
+        self.__flights: tp.Dict[tp.Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self.__flights)
+
+    async def run(
+        self, key: tp.Hashable, compute: tp.Callable[[], tp.Awaitable[T]]
+    ) -> tp.Tuple[T, bool]:
+        """The result and whether it came from a computation already running."""
+        flight = self.__flights.get(key)
+        shared = flight is not None
+        if shared:
+            self.shared += 1
+        else:
+            self.started += 1
+            flight = asyncio.ensure_future(compute())
+            self.__flights[key] = flight
+            flight.add_done_callback(lambda done: self.__land(key, done))
+        return await asyncio.shield(flight), shared
+
+    def __land(self, key: tp.Hashable, flight: asyncio.Future) -> None:
+        if self.__flights.get(key) is flight:
+            del self.__flights[key]
+        # when every waiter was cancelled nobody else reads the exception
+        if not flight.cancelled():
+            flight.exception()
+
+    @property
+    def stats(self) -> tp.Dict[str, int]:
+        return {"in_flight": len(self), "started": self.started, "shared": self.shared}
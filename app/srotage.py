@@ -1,20 +1,39 @@
+import gzip
 import logging
 from app.context import AppContext
+from app import config
+from app import plan_codec
+from app import task_queue
 import typing as tp
-from app import models
-import pickle
 
 
-def get_waypoints(ctx: AppContext):
-    if ctx.db.get("id"):
-        result = pickle.loads(ctx.db.get("id"))
-        logging.info("Waypoints was got from database")
-        return result
+async def get_waypoints_tagged(
+    ctx: AppContext, robot: str, compressed: bool = False
+) -> tp.Optional[task_queue.Tagged]:
+    # the body is the stored JSON, or its stored gzip when compressed
+    body = task_queue.GZIP if compressed else task_queue.JSON
+    fetched = await ctx.tasks.fetch_tagged(robot, body)
+    if fetched:
+        logging.info(f"Waypoints for robot {robot} was got from database")
     else:
-        logging.info("There is no tasks in db")
-        return None
+        logging.info(f"There is no tasks for robot {robot} in db")
+    return fetched
 
 
-def task_push(ctx: AppContext, waypoints: bytes):
-    ctx.db.set("id", waypoints)
-    logging.info("Databse record added")
+async def get_waypoints_json_many(
+    ctx: AppContext, robots: tp.List[str]
+) -> tp.List[bytes]:
+    raws = await ctx.tasks.fetch_many(robots)
+    return [raw or plan_codec.to_json(None) for raw in raws]
+
+
+async def task_push(
+    ctx: AppContext, robot: str, waypoints: bytes, rendered: bytes
+) -> int:
+    # the plan is kept encoded and as the JSON the robot polls for, plain
+    # and compressed once here instead of on every poll
+    compressed = gzip.compress(rendered, compresslevel=config.GZIP_LEVEL, mtime=0)
+    task_id = await ctx.tasks.push(robot, waypoints, rendered, compressed)
+    logging.info(f"Databse record added: task {task_id} for robot {robot}")
+    await ctx.broadcaster.publish(robot)
+    return task_id
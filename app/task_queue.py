@@ -0,0 +1,207 @@
+import asyncio
+import functools
+import typing as tp
+from redis import asyncio as aioredis
+from app import memory_redis
+
+Db = tp.Union[aioredis.Redis, memory_redis.MemoryRedis]
+# robot id, encoded plan, rendered JSON, the JSON gzip-compressed
+TaskItem = tp.Tuple[str, bytes, bytes, bytes]
+# suffixes of the task key the JSON bodies are kept under
+JSON = ":json"
+GZIP = ":json.gz"
+# task id and body of a fetched plan
+Tagged = tp.Tuple[int, bytes]
+
+T = tp.TypeVar("T")
+R = tp.TypeVar("R")
+
+
+def queue_key(robot: str) -> str:
+    return f"robot:{robot}:queue"
+
+
+def current_key(robot: str) -> str:
+    return f"robot:{robot}:current"
+
+
+def task_key(task_id: tp.Union[int, bytes, str]) -> str:
+    if isinstance(task_id, bytes):
+        task_id = task_id.decode()
+    return f"task:{task_id}"
+
+
+async def push_many(db: Db, items: tp.List[TaskItem], ttl: int) -> tp.List[int]:
+    """Append plans to the robots' queues in two round trips."""
+    if not items:
+        return []
+
+    last = await db.incr("task:seq", len(items))
+    task_ids = list(range(last - len(items) + 1, last + 1))
+    async with db.pipeline(transaction=False) as pipe:
+        for task_id, (robot, plan, rendered, compressed) in zip(task_ids, items):
+            pipe.set(task_key(task_id), plan, ex=ttl)
+            pipe.set(task_key(task_id) + JSON, rendered, ex=ttl)
+            pipe.set(task_key(task_id) + GZIP, compressed, ex=ttl)
+            pipe.rpush(queue_key(robot), task_id)
+            pipe.expire(queue_key(robot), ttl)
+        await pipe.execute()
+
+    return task_ids
+
+
+async def fetch_many(
+    db: Db, robots: tp.List[str], ttl: int
+) -> tp.List[tp.Optional[bytes]]:
+    """Pop the next plan of every robot, as JSON, None for an empty queue."""
+    fetched = await fetch_many_tagged(db, robots, ttl)
+    return [item and item[1] for item in fetched]
+
+
+async def fetch_many_tagged(
+    db: Db, robots: tp.List[str], ttl: int, body: str = JSON
+) -> tp.List[tp.Optional[Tagged]]:
+    """Pop the next plan of every robot as its task id and the body under
+    the given suffix, None for an empty queue.
+
+    A robot listed twice gets its next two plans. Each round pops once per
+    robot still waiting, so ids whose task expired cost one more round.
+    """
+    results: tp.List[tp.Optional[Tagged]] = [None] * len(robots)
+    waiting = list(range(len(robots)))
+    while waiting:
+        async with db.pipeline(transaction=False) as pipe:
+            for slot in waiting:
+                pipe.lpop(queue_key(robots[slot]))
+            popped = await pipe.execute()
+
+        found = [(slot, task_id) for slot, task_id in zip(waiting, popped) if task_id]
+        if not found:
+            break
+
+        async with db.pipeline(transaction=False) as pipe:
+            for slot, task_id in found:
+                pipe.get(task_key(task_id) + body)
+                pipe.set(current_key(robots[slot]), task_id, ex=ttl)
+            replies = await pipe.execute()
+
+        waiting = []
+        for (slot, task_id), rendered in zip(found, replies[::2]):
+            if rendered is None:
+                waiting.append(slot)
+            else:
+                results[slot] = (int(task_id), rendered)
+
+    return results
+
+
+async def current_many(db: Db, robots: tp.List[str]) -> tp.List[tp.Optional[bytes]]:
+    """Encoded plan each robot fetched last, if it has not expired."""
+    task_ids = await db.mget(*[current_key(robot) for robot in robots])
+    keys = [task_key(task_id) for task_id in task_ids if task_id]
+    plans = iter(await db.mget(*keys) if keys else [])
+    return [next(plans) if task_id else None for task_id in task_ids]
+
+
+class _Batcher(tp.Generic[T, R]):
+    """Collects calls made in the same loop iteration into one flush."""
+
+    def __init__(
+        self, flush: tp.Callable[[tp.List[T]], tp.Awaitable[tp.List[R]]]
+    ) -> None:
+        self.__flush = flush
+        self.__pending: tp.List[tp.Tuple[T, asyncio.Future]] = []
+        # flushes running, referenced so they are not collected mid-run
+        self.__running: tp.Set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.__pending.append((item, future))
+        if len(self.__pending) == 1:
+            # the task starts on the next iteration, after this one's calls
+            task = loop.create_task(self.__run())
+            self.__running.add(task)
+            task.add_done_callback(self.__running.discard)
+        return await future
+
+    async def __run(self) -> None:
+        pending, self.__pending = self.__pending, []
+        try:
+            results = await self.__flush([item for item, _ in pending])
+        except BaseException as e:
+            # the callers get the error, the task ends quietly unless cancelled
+            for _, future in pending:
+                if not future.done():
+                    if isinstance(e, asyncio.CancelledError):
+                        future.cancel()
+                    else:
+                        future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class TaskQueue:
+    """Per-robot FIFO of plans in Redis.
+
+    Concurrent pushes and polls are coalesced, so hundreds of robots cost
+    a few pipelined round trips per loop iteration instead of one each.
+    """
+
+    def __init__(self, db: Db, ttl: int) -> None:
+        self.__db = db
+        self.__ttl = ttl
+        self.__pushes: _Batcher[TaskItem, int] = _Batcher(
+            lambda items: push_many(self.__db, items, self.__ttl)
+        )
+        self.__fetches: tp.Dict[str, _Batcher[str, tp.Optional[Tagged]]] = {
+            body: _Batcher(
+                functools.partial(fetch_many_tagged, self.__db, ttl=ttl, body=body)
+            )
+            for body in (JSON, GZIP)
+        }
+
+    async def push(
+        self, robot: str, plan: bytes, rendered: bytes, compressed: bytes
+    ) -> int:
+        return await self.__pushes.submit((robot, plan, rendered, compressed))
+
+    async def fetch(self, robot: str) -> tp.Optional[bytes]:
+        fetched = await self.fetch_tagged(robot)
+        return fetched and fetched[1]
+
+    async def fetch_tagged(
+        self, robot: str, body: str = JSON
+    ) -> tp.Optional[Tagged]:
+        """Next plan of the robot as (task id, body), see fetch_many_tagged."""
+        return await self.__fetches[body].submit(robot)
+
+    async def requeue(self, robot: str, task_id: int) -> None:
+        """Puts a fetched plan back at the head of the robot's queue."""
+        async with self.__db.pipeline(transaction=False) as pipe:
+            pipe.lpush(queue_key(robot), task_id)
+            pipe.expire(queue_key(robot), self.__ttl)
+            await pipe.execute()
+
+    async def state(self, robot: str) -> tp.Tuple[tp.Optional[int], int]:
+        """Id of the plan the robot fetched last and how many are queued,
+        read in one round trip without popping anything."""
+        async with self.__db.pipeline(transaction=False) as pipe:
+            pipe.get(current_key(robot))
+            pipe.llen(queue_key(robot))
+            task_id, queued = await pipe.execute()
+        return (int(task_id) if task_id else None), queued
+
+    async def fetch_many(self, robots: tp.List[str]) -> tp.List[tp.Optional[bytes]]:
+        return await fetch_many(self.__db, robots, self.__ttl)
+
+    async def get(self, task_id: int) -> tp.Optional[bytes]:
+        return await self.__db.get(task_key(task_id))
+
+    async def current(self, robot: str) -> tp.Optional[bytes]:
+        return (await current_many(self.__db, [robot]))[0]
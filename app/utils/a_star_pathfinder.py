@@ -1,13 +1,14 @@
 from __future__ import annotations
 
-import copy
 import heapq
 import math
 import typing as tp
 import numpy as np
 from app import models
-from . import path_smoother
 from . import direction_finder
+from . import line_of_sight
+from . import render
+from . import search_stats
 
 
 class PriorityQueue:
@@ -30,13 +31,19 @@ class AStar:
         self.__start: tp.Optional[models.GridLocation] = None
         self.__target: tp.Optional[models.GridLocation] = None
         self.__result_path: tp.Optional[tp.List[models.GridLocation]] = None
+        # effort of this planner's search and smoothing
+        self.stats = search_stats.SearchStats()
 
     @property
     def maze(self) -> np.array:
         return self.__maze
 
     @maze.setter
-    def maze(self, maze: np.array) -> None:
+    def maze(self, maze: tp.Union[np.array, models.GridWithWeights]) -> None:
+        if isinstance(maze, models.GridWithWeights):
+            self.__maze = maze
+            return
+
         width = maze.shape[0]
         heigth = maze.shape[1]
         self.__maze = models.GridWithWeights(width, heigth, maze)
@@ -62,15 +69,15 @@ class AStar:
         self, points: (models.GridLocation, models.GridLocation)
     ) -> None:
         (start, target) = points
-        if (start[0] > self.__maze.width) or (start[1] > self.__maze.height):
-            raise Exception("Start is out of range")
-        elif (target[0] > self.__maze.width) or (target[1] > self.__maze.height):
-            raise Exception("End is out of range")
+        if not self.__maze.in_bounds(start):
+            raise models.Unreachable("Start is out of range")
+        elif not self.__maze.in_bounds(target):
+            raise models.Unreachable("End is out of range")
 
-        if start in self.__maze.walls:
-            raise Exception("Start is unreachable")
-        elif target in self.__maze.walls:
-            raise Exception("End is unreachable")
+        if self.__maze.is_wall(start):
+            raise models.Unreachable("Start is unreachable")
+        elif self.__maze.is_wall(target):
+            raise models.Unreachable("End is unreachable")
 
     def __points_set_check(self) -> None:
         if self.__start is None or self.__target is None:
@@ -88,70 +95,58 @@ class AStar:
     def get_path(self) -> tp.Optional[tp.List[models.GridLocation]]:
         return self.__result_path
 
-    async def smooth_path(
+    def _store_path(self, path: tp.List[models.GridLocation]) -> None:
+        self.__result_path = path
+
+    def smooth_path(
         self, path: tp.List[models.GridLocation]
     ) -> tp.List[models.GridLocation]:
         smoothed_path = [path[0]]
+        points = np.asarray(path, dtype=np.int64)
+        obstacles = self.__smoothing_obstacles(points)
 
-        l, r = 0, len(path) - 1
+        # from every anchor jump to the farthest path cell it can see, all
+        # candidates of one anchor are tested in a single batched call
+        l = 0
         while l < len(path) - 1:
-            if (
-                await path_smoother.is_line_possible(path[l], path[r], self.__maze)
-                is not None
-            ):
-                smoothed_path.append(path[r])
-                l = copy.copy(r)
-                r = len(path) - 1
-            else:
-                r -= 1
-
-        return smoothed_path
-
-    async def get_angles(self, points: tp.List[models.GridLocation]):
-        start_vector_start = (0, points[0][1])
-
-        path = [start_vector_start]
-        path.extend(points)
-        angles_path: tp.List[float] = []
-
-        for i in range(1, len(path) - 1):
-            start = direction_finder.to_cartesian_coordinates(
-                (path[i - 1]), (self.__maze.width, self.__maze.height)
-            )
-            waypoint = direction_finder.to_cartesian_coordinates(
-                path[i], (self.__maze.width, self.__maze.height)
-            )
-            end = direction_finder.to_cartesian_coordinates(
-                path[i + 1], (self.__maze.width, self.__maze.height)
+            candidates = points[l + 1 :]
+            visible = line_of_sight.visible_many(
+                obstacles,
+                np.broadcast_to(points[l], candidates.shape),
+                candidates,
+                self.stats,
             )
+            seen = np.flatnonzero(visible)
+            l += 1 + (int(seen[-1]) if len(seen) else 0)
+            smoothed_path.append(path[l])
 
-            angle = await direction_finder.get_rotation_angle(start, waypoint, end)
-            angles_path.append(angle)
-
-        return angles_path
+        return smoothed_path
 
-    async def visualise(
+    def __smoothing_obstacles(self, points: np.ndarray) -> np.ndarray:
+        # shortcuts must not cut through cells dearer than any the search
+        # chose to enter, or smoothing would undo the weighted search
+        weights = self.__maze.weights
+        limit = weights[points[:, 0], points[:, 1]].max()
+        if weights.max() <= limit:
+            return self.__maze.occupancy
+        return self.__maze.occupancy | (weights > limit)
+
+    def get_angles(self, points: tp.List[models.GridLocation]):
+        return self.get_geometry(points)[0]
+
+    def get_geometry(
+        self, points: tp.List[models.GridLocation]
+    ) -> tp.Tuple[tp.List[float], tp.List[float]]:
+        """Rotation angles and run distances of the whole path at once."""
+        return direction_finder.get_geometry(
+            points, (self.__maze.width, self.__maze.height)
+        )
+
+    def visualise(
         self, path: tp.List[models.GridLocation], maze: np.array
     ) -> None:
-        ind = 0
-        path_maze = []
-        print("\n")
-        print(" ", [str(_) for _ in range(self.__maze.height)])
-        for i in range(self.__maze.width):
-            a = []
-            for j in range(self.__maze.height):
-                if (i, j) in path:
-                    # a.append(f'{ind}')
-                    a.append("0")
-                    ind += 1
-                elif maze[i][j] == 0:
-                    a.append(".")
-                elif maze[i][j] == 1:
-                    a.append("#")
-            path_maze.append(a)
-
-        for i in range(len(path_maze)):
-            print(i, path_maze[i])
+        # debugging aid only, see the /debug/render endpoint
+        print(render.to_ascii(maze, path))
 
     @staticmethod
     def __heuristic(a: models.GridLocation, b: models.GridLocation) -> float:
@@ -170,9 +165,11 @@ class AStar:
         cost_so_far = {}
         came_from[start] = None
         cost_so_far[start] = 0
+        stats = self.stats
 
         while not frontier.empty():
             current = frontier.get()
+            stats.expanded += 1
 
             if current == goal:
                 self.__return_path(current, came_from)
@@ -184,4 +181,5 @@ class AStar:
                     cost_so_far[next] = new_cost
                     priority = new_cost + self.__heuristic(next, goal)
                     frontier.put(next, priority)
+                    stats.pushed += 1
                     came_from[next] = current
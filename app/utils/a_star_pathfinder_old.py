@@ -103,7 +103,7 @@ class AStar:
 
         l, r = 0, len(path) - 1
         while l < len(path) - 1:
-            if await path_smoother.is_line_possible(path[l], path[r], self.__maze) is not None:
+            if path_smoother.is_line_possible(path[l], path[r], self.__maze) is not None:
                 smoothed_path.append(path[r])
                 l = copy.copy(r)
                 r = len(path) - 1
@@ -137,7 +137,7 @@ class AStar:
             waypoint = direction_finder.to_cartesian_coordinates(path[i], self.__maze.shape)
             end = direction_finder.to_cartesian_coordinates(path[i + 1], self.__maze.shape)
 
-            angle = await direction_finder.get_rotation_angle(start, waypoint, end)
+            angle = direction_finder.get_rotation_angle(start, waypoint, end)
             angles_path.append(angle)
 
         return angles_path
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import math
+import typing as tp
+import numpy as np
+from app import models
+from . import a_star_pathfinder
+from . import jump_point_search
+from . import search_stats
+
+Key = tp.Tuple[float, float]
+
+# queued vertices whose key ties with the start's are processed as well:
+# the path is read off greedily and may pass through any of them
+TIE_TOLERANCE = 1e-9
+
+
+class DynamicGrid(models.GridWithWeights):
+    """GridWithWeights whose cells can be blocked and cleared in place.
+
+    Starts as a copy of a map's grid; the copy is private to one planner,
+    so the shared map never changes. The weights are copied too: the
+    search state is only repaired for cell changes, so it must not see the
+    costs of the map change under it.
+    """
+
+    def __init__(self, base: models.GridWithWeights) -> None:
+        self.width = base.width
+        self.height = base.height
+        self.occupancy = base.occupancy.copy()
+        self.wall_index = set(base.wall_index)
+        self.weights = np.array(base.weights)
+
+    def set_blocked(self, cell: models.GridLocation, blocked: bool) -> bool:
+        """Returns whether the cell changed."""
+        if self.occupancy[cell] == blocked:
+            return False
+        self.occupancy[cell] = blocked
+        if blocked:
+            self.wall_index.add(cell)
+        else:
+            self.wall_index.discard(cell)
+        return True
+
+    def around(self, cell: models.GridLocation) -> tp.Iterator[models.GridLocation]:
+        # all eight neighbours in bounds, walls included
+        (x, y) = cell
+        for dx, dy in jump_point_search.DIRECTIONS:
+            if 0 <= x + dx < self.width and 0 <= y + dy < self.height:
+                yield (x + dx, y + dy)
+
+
+class DStarLite:
+    """D* Lite (Koenig and Likhachev), optimised version.
+
+    Searches backwards from the goal, so g is the cost to reach the goal.
+    When cells change or the robot moves only the vertices whose costs are
+    affected are brought back to consistency; everything else of the
+    previous search is reused.
+    """
+
+    def __init__(
+        self,
+        grid: DynamicGrid,
+        start: models.GridLocation,
+        goal: models.GridLocation,
+    ) -> None:
+        self.grid = grid
+        self.start = (start[0], start[1])
+        self.goal = (goal[0], goal[1])
+        self.__last = self.start
+        self.__km = 0.0
+        self.__g: tp.Dict[models.GridLocation, float] = {}
+        self.__rhs: tp.Dict[models.GridLocation, float] = {self.goal: 0.0}
+        self.__open: tp.Dict[models.GridLocation, Key] = {}
+        self.__heap: tp.List[tp.Tuple[float, float, int, models.GridLocation]] = []
+        self.__counter = itertools.count()
+        # work since a planner last took it, cell updates included
+        self.stats = search_stats.SearchStats()
+        self.__push(self.goal, self.__key(self.goal))
+
+    def __cost(self, a: models.GridLocation, b: models.GridLocation) -> float:
+        if a in self.grid.wall_index or b in self.grid.wall_index:
+            return math.inf
+        return self.grid.cost(a, b)
+
+    def __key(self, cell: models.GridLocation) -> Key:
+        best = min(self.__g.get(cell, math.inf), self.__rhs.get(cell, math.inf))
+        return (best + jump_point_search.octile(self.start, cell) + self.__km, best)
+
+    def __push(self, cell: models.GridLocation, key: Key) -> None:
+        self.__open[cell] = key
+        heapq.heappush(self.__heap, (key[0], key[1], next(self.__counter), cell))
+        self.stats.pushed += 1
+
+    def __top(self) -> tp.Optional[tp.Tuple[Key, models.GridLocation]]:
+        # entries are dropped lazily: stale ones are skipped here
+        while self.__heap:
+            k1, k2, _, cell = self.__heap[0]
+            if self.__open.get(cell) == (k1, k2):
+                return (k1, k2), cell
+            heapq.heappop(self.__heap)
+        return None
+
+    def __update_vertex(self, cell: models.GridLocation) -> None:
+        if cell != self.goal:
+            self.__rhs[cell] = min(
+                (
+                    self.__cost(cell, successor) + self.__g.get(successor, math.inf)
+                    for successor in self.grid.around(cell)
+                ),
+                default=math.inf,
+            )
+        self.__open.pop(cell, None)
+        if self.__g.get(cell, math.inf) != self.__rhs.get(cell, math.inf):
+            self.__push(cell, self.__key(cell))
+
+    def compute(self) -> None:
+        stats = self.stats
+        while True:
+            top = self.__top()
+            if top is None:
+                return
+            start_key = self.__key(self.start)
+            if (
+                top[0][0] > start_key[0] + TIE_TOLERANCE
+                and self.__rhs.get(self.start, math.inf)
+                == self.__g.get(self.start, math.inf)
+            ):
+                return
+
+            old_key, cell = top
+            new_key = self.__key(cell)
+            stats.expanded += 1
+            if old_key < new_key:
+                self.__push(cell, new_key)
+                continue
+
+            del self.__open[cell]
+            g, rhs = self.__g.get(cell, math.inf), self.__rhs.get(cell, math.inf)
+            if g > rhs:
+                self.__g[cell] = rhs
+                for predecessor in self.grid.around(cell):
+                    self.__update_vertex(predecessor)
+            else:
+                self.__g[cell] = math.inf
+                self.__update_vertex(cell)
+                for predecessor in self.grid.around(cell):
+                    self.__update_vertex(predecessor)
+
+    def update_cells(self, changes: tp.Mapping[models.GridLocation, bool]) -> int:
+        """Block (True) or clear (False) cells; returns how many changed."""
+        changed = [
+            cell for cell, blocked in changes.items()
+            if self.grid.set_blocked((cell[0], cell[1]), blocked)
+        ]
+        if changed:
+            for cell in changed:
+                cell = (cell[0], cell[1])
+                self.__update_vertex(cell)
+                for neighbour in self.grid.around(cell):
+                    self.__update_vertex(neighbour)
+        return len(changed)
+
+    def move_to(self, cell: models.GridLocation) -> None:
+        # queued keys stay lower bounds for the new start by raising km
+        self.start = (cell[0], cell[1])
+        self.__km += jump_point_search.octile(self.__last, self.start)
+        self.__last = self.start
+
+    def cost(self) -> float:
+        return self.__g.get(self.start, math.inf)
+
+    def path(self) -> tp.Optional[tp.List[models.GridLocation]]:
+        """Cells from start to goal inclusive, None when the goal is cut off."""
+        self.compute()
+        if math.isinf(self.cost()):
+            return None
+
+        path = [self.start]
+        while path[-1] != self.goal:
+            if len(path) > self.grid.width * self.grid.height:
+                raise Exception("Replanning did not converge")
+            current = path[-1]
+            path.append(
+                min(
+                    self.grid.around(current),
+                    key=lambda successor: self.__cost(current, successor)
+                    + self.__g.get(successor, math.inf),
+                )
+            )
+        return path
+
+
+class DStarLitePlanner(a_star_pathfinder.AStar):
+    """Reads the path off a DStarLite kept between calls, which is repaired
+    instead of searched again. Like AStar, get_path() leaves out the goal."""
+
+    def __init__(self, state: DStarLite) -> None:
+        super().__init__()
+        self.state = state
+
+    def a_star_search(self) -> None:
+        start, _ = self.points
+        self.state.move_to(start)
+        path = self.state.path()
+        # the repair counts from the cell updates that made it necessary
+        self.stats, self.state.stats = self.state.stats, search_stats.SearchStats()
+        if path is None:
+            raise models.Unreachable("End is unreachable")
+        self._store_path(path[:-1])
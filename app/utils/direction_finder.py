@@ -1,5 +1,5 @@
-import asyncio
 import math
+import typing as tp
 from app import models
 import numpy as np
 
@@ -12,7 +12,7 @@ def to_cartesian_coords_tuple(point: tuple, shape):
     return point[1], shape[1] - point[0]
 
 
-async def get_distance(start: models.GridLocation, end: models.GridLocation):
+def get_distance(start: models.GridLocation, end: models.GridLocation):
     (start_x, start_y) = start
     (end_x, end_y) = end
 
@@ -21,7 +21,7 @@ async def get_distance(start: models.GridLocation, end: models.GridLocation):
     )
 
 
-async def get_rotation_angle(
+def get_rotation_angle(
     line_start: models.GridLocation,
     waypoint: models.GridLocation,
     line_end: models.GridLocation,
@@ -54,3 +54,44 @@ async def get_rotation_angle(
         angle = -angle  # left
 
     return round(angle, 4)
+
+
+def get_geometry(
+    points: tp.Sequence[models.GridLocation], shape
+) -> tp.Tuple[tp.List[float], tp.List[float]]:
+    """Rotation angles at every turn point and run distances of every
+    segment at once, the same values as get_rotation_angle and
+    get_distance give point by point.
+
+    As in AStar.get_angles the robot starts facing from (0, y) of the
+    first point, so there is one angle per segment.
+    """
+    grid = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    if len(grid) < 2:
+        return [], []
+
+    path = np.concatenate([[[0, grid[0, 1]]], grid])
+    cartesian = np.stack([path[:, 1], shape[1] - path[:, 0]], axis=1)
+    start, waypoint, end = cartesian[:-2], cartesian[1:-1], cartesian[2:]
+
+    vector_start = (start - waypoint).astype(float)
+    vector_end = (end - waypoint).astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unit_start = vector_start / np.sqrt((vector_start ** 2).sum(axis=1))[:, None]
+        unit_end = vector_end / np.sqrt((vector_end ** 2).sum(axis=1))[:, None]
+        cosine = unit_start[:, 0] * unit_end[:, 0] + unit_start[:, 1] * unit_end[:, 1]
+        angles = 180 - np.abs(np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0))))
+
+    turn = (end[:, 0] - start[:, 0]) * (waypoint[:, 1] - start[:, 1]) - (
+        end[:, 1] - start[:, 1]
+    ) * (waypoint[:, 0] - start[:, 0])
+    angles = np.where(turn < 0, -angles, angles)
+
+    delta = grid[1:] - grid[:-1] + 1
+    distances = np.sqrt((delta ** 2).sum(axis=1))
+
+    # Python's round, as np.round can differ from it in the last digit
+    return (
+        [round(angle, 4) for angle in angles.tolist()],
+        [round(distance, 4) for distance in distances.tolist()],
+    )
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import heapq
+import math
+import typing as tp
+import numpy as np
+from app import models
+from . import a_star_pathfinder
+from . import search_stats
+
+
+class DistanceField:
+    """Single-source Dijkstra over the grid with the moves and costs of
+    GridWithWeights, kept as flat arrays.
+
+    distance[x, y] is the cost from the source (inf when not reached) and
+    parent holds the flat index of the previous cell, -1 for none. A reverse
+    field holds costs towards the source and parents point at it, so it is
+    a flow field every start can follow to the source.
+    """
+
+    def __init__(
+        self,
+        source: models.GridLocation,
+        distance: np.ndarray,
+        parent: np.ndarray,
+    ) -> None:
+        self.source = source
+        self.distance = distance
+        self.parent = parent
+
+    @classmethod
+    def from_grid(
+        cls,
+        grid: models.GridWithWeights,
+        source: models.GridLocation,
+        targets: tp.Iterable[models.GridLocation] = (),
+        reverse: bool = False,
+        stats: tp.Optional[search_stats.SearchStats] = None,
+    ) -> DistanceField:
+        # with targets the search stops as soon as all of them are settled
+        width, height = grid.width, grid.height
+        distance = np.full(width * height, math.inf)
+        parent = np.full(width * height, -1, dtype=np.int64)
+        settled = np.zeros(width * height, dtype=bool)
+        remaining = {x * height + y for x, y in targets}
+        bounded = bool(remaining)
+
+        source = (source[0], source[1])
+        distance[source[0] * height + source[1]] = 0.0
+        frontier = [(0.0, source)]
+        if stats is None:
+            stats = search_stats.SearchStats()
+        while frontier:
+            cost, current = heapq.heappop(frontier)
+            index = current[0] * height + current[1]
+            if settled[index]:
+                continue
+            settled[index] = True
+            stats.expanded += 1
+            remaining.discard(index)
+            if bounded and not remaining:
+                break
+
+            for neighbor in grid.neighbors(current):
+                neighbor_index = neighbor[0] * height + neighbor[1]
+                if reverse:
+                    new_cost = cost + grid.cost(neighbor, current)
+                else:
+                    new_cost = cost + grid.cost(current, neighbor)
+                if new_cost < distance[neighbor_index]:
+                    distance[neighbor_index] = new_cost
+                    parent[neighbor_index] = index
+                    heapq.heappush(frontier, (new_cost, neighbor))
+                    stats.pushed += 1
+
+        return cls(
+            source, distance.reshape(width, height), parent.reshape(width, height)
+        )
+
+    def cost_to(self, cell: models.GridLocation) -> float:
+        return float(self.distance[cell[0], cell[1]])
+
+    def path_to(
+        self, cell: models.GridLocation
+    ) -> tp.Optional[tp.List[models.GridLocation]]:
+        """Cells from the source to cell, both inclusive."""
+        if math.isinf(self.cost_to(cell)):
+            return None
+
+        height = self.parent.shape[1]
+        parent = self.parent.ravel()
+        index = cell[0] * height + cell[1]
+        path = []
+        while index != -1:
+            path.append(divmod(index, height))
+            index = int(parent[index])
+        return path[::-1]
+
+    def path_from(
+        self, cell: models.GridLocation
+    ) -> tp.Optional[tp.List[models.GridLocation]]:
+        """Cells from cell to the source of a reverse field, both inclusive."""
+        path = self.path_to(cell)
+        return None if path is None else path[::-1]
+
+    def compact(self) -> DistanceField:
+        # float32/int32 halve the size of fields kept in caches or pickled
+        return DistanceField(
+            self.source,
+            self.distance.astype(np.float32),
+            self.parent.astype(np.int32),
+        )
+
+
+class FlowFieldPlanner(a_star_pathfinder.AStar):
+    """Reads the path off a reverse field of the target, built here unless
+    one is given, or takes the cells walked off one before. Like AStar,
+    get_path() leaves out the target cell."""
+
+    def __init__(
+        self,
+        field: tp.Optional[DistanceField] = None,
+        walked: tp.Optional[tp.List[models.GridLocation]] = None,
+    ) -> None:
+        super().__init__()
+        self.field = field
+        self.walked = walked
+
+    def a_star_search(self) -> None:
+        start, target = self.points
+        start, target = (start[0], start[1]), (target[0], target[1])
+        path = self.walked
+        if path is None or path[0] != start or path[-1] != target:
+            if self.field is None or self.field.source != target:
+                self.field = DistanceField.from_grid(
+                    self.maze, target, reverse=True, stats=self.stats
+                )
+            path = self.field.path_from(start)
+        if path is not None:
+            self._store_path(path[:-1])
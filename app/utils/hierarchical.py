@@ -0,0 +1,458 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import math
+import typing as tp
+import numpy as np
+from app import models
+from . import a_star_pathfinder
+from . import jump_point_search
+from . import search_stats
+
+Cluster = tp.Tuple[int, int]
+Transition = tp.Tuple[models.GridLocation, models.GridLocation]
+
+CLUSTER_SIZE = 16
+# clusters are relaxed in batches of at most this many distance cells
+MAX_CELLS_PER_BATCH = 1 << 22
+# entrances at least this wide get a transition at both ends
+WIDE_ENTRANCE = 6
+
+# neighbour clusters a border is stored for; the other four are the same
+# borders seen from the opposite side
+BORDER_DIRECTIONS: tp.Tuple[Cluster, ...] = ((1, 0), (0, 1), (1, 1), (1, -1))
+
+
+def _local_search(
+    grid: models.GridWithWeights,
+    bounds: tp.Tuple[int, int, int, int],
+    source: models.GridLocation,
+    targets: tp.Collection[models.GridLocation],
+    reverse: bool = False,
+    stats: tp.Optional[search_stats.SearchStats] = None,
+) -> tp.Tuple[
+    tp.Dict[models.GridLocation, float],
+    tp.Dict[models.GridLocation, models.GridLocation],
+]:
+    """Dijkstra that never leaves bounds (x0, x1, y0, y1), stopping once all
+    targets are settled. A reverse search costs the moves towards source."""
+    x0, x1, y0, y1 = bounds
+    remaining = set(targets)
+    cost_so_far = {source: 0.0}
+    came_from = {source: source}
+    settled = set()
+    frontier = [(0.0, source)]
+    if stats is None:
+        stats = search_stats.SearchStats()
+    while frontier and remaining:
+        cost, current = heapq.heappop(frontier)
+        if current in settled:
+            continue
+        settled.add(current)
+        stats.expanded += 1
+        remaining.discard(current)
+
+        for neighbor in grid.neighbors(current):
+            if not (x0 <= neighbor[0] < x1 and y0 <= neighbor[1] < y1):
+                continue
+            if reverse:
+                new_cost = cost + grid.cost(neighbor, current)
+            else:
+                new_cost = cost + grid.cost(current, neighbor)
+            if new_cost < cost_so_far.get(neighbor, math.inf):
+                cost_so_far[neighbor] = new_cost
+                came_from[neighbor] = current
+                heapq.heappush(frontier, (new_cost, neighbor))
+                stats.pushed += 1
+
+    found = {target: cost_so_far[target] for target in targets if target in settled}
+    return found, came_from
+
+
+def _cluster_costs(
+    grid: models.GridWithWeights,
+    cluster_size: int,
+    origins: tp.List[models.GridLocation],
+    nodes: tp.List[tp.List[models.GridLocation]],
+) -> tp.List[np.ndarray]:
+    """In-cluster costs between all nodes of many clusters at once.
+
+    origins are the top left cells of the clusters. All sources of a batch
+    are relaxed together over the eight moves until nothing improves, which
+    gives the Dijkstra costs of GridWithWeights restricted to the cluster.
+    Returns a (nodes, nodes) matrix per cluster, inf where unreachable.
+    """
+    size = cluster_size
+    padded_shape = (grid.width + size, grid.height + size)
+    free = np.zeros(padded_shape, dtype=bool)
+    free[: grid.width, : grid.height] = ~grid.occupancy
+    weights = np.ones(padded_shape)
+    weights[: grid.width, : grid.height] = grid.weights
+
+    results: tp.List[np.ndarray] = []
+    first = 0
+    while first < len(origins):
+        last = first + 1
+        count = max(len(nodes[first]), 1)
+        while last < len(origins):
+            count = max(count, len(nodes[last]))
+            if (last + 1 - first) * count * size * size > MAX_CELLS_PER_BATCH:
+                break
+            last += 1
+
+        batch = range(first, last)
+        count = max([len(nodes[i]) for i in batch] + [1])
+        cells = [
+            (slice(ox, ox + size), slice(oy, oy + size))
+            for ox, oy in (origins[i] for i in batch)
+        ]
+        walk = np.stack([free[cell] for cell in cells])[:, None]
+        step_weights = np.stack([weights[cell] for cell in cells])[:, None]
+
+        distance = np.full((len(batch), count, size, size), math.inf)
+        for b, i in enumerate(batch):
+            for j, (x, y) in enumerate(nodes[i]):
+                distance[b, j, x - origins[i][0], y - origins[i][1]] = 0.0
+
+        moves = []
+        for dx, dy in jump_point_search.DIRECTIONS:
+            step = models.DIAGONAL_STEP if dx and dy else 1
+            target = (slice(max(dx, 0), size + min(dx, 0)),
+                      slice(max(dy, 0), size + min(dy, 0)))
+            source = (slice(max(-dx, 0), size + min(-dx, 0)),
+                      slice(max(-dy, 0), size + min(-dy, 0)))
+            moves.append((target, source, step_weights[(..., *target)] * step))
+
+        while True:
+            relaxed = distance.copy()
+            for target, source, cost in moves:
+                view = relaxed[(..., *target)]
+                np.minimum(view, distance[(..., *source)] + cost, out=view)
+            relaxed = np.where(walk, relaxed, math.inf)
+            if np.array_equal(relaxed, distance):
+                break
+            distance = relaxed
+
+        for b, i in enumerate(batch):
+            xs = [x - origins[i][0] for x, _ in nodes[i]]
+            ys = [y - origins[i][1] for _, y in nodes[i]]
+            results.append(distance[b, : len(nodes[i])][:, xs, ys])
+        first = last
+
+    return results
+
+
+def _walk_back(
+    came_from: tp.Dict[models.GridLocation, models.GridLocation],
+    cell: models.GridLocation,
+) -> tp.List[models.GridLocation]:
+    path = [cell]
+    while came_from[path[-1]] != path[-1]:
+        path.append(came_from[path[-1]])
+    return path[::-1]
+
+
+def _line_transitions(
+    free: np.ndarray, side_a: np.ndarray, side_b: np.ndarray
+) -> tp.List[Transition]:
+    """Transitions across a straight border; side_a[i] and side_b[i] are
+    facing cells. Runs of facing free pairs are entrances, and a diagonal
+    step is only kept where no straight crossing touches it."""
+    a = free[side_a[:, 0], side_a[:, 1]]
+    b = free[side_b[:, 0], side_b[:, 1]]
+    straight = a & b
+
+    transitions: tp.List[Transition] = []
+    runs = np.flatnonzero(np.diff(np.concatenate(([0], straight.astype(np.int8), [0]))))
+    for first, end in zip(runs[::2].tolist(), runs[1::2].tolist()):
+        if end - first >= WIDE_ENTRANCE:
+            picks = (first, end - 1)
+        else:
+            picks = ((first + end - 1) // 2,)
+        for i in picks:
+            transitions.append((tuple(side_a[i].tolist()), tuple(side_b[i].tolist())))
+
+    crossing = ~straight[:-1] & ~straight[1:]
+    for i in np.flatnonzero(crossing & a[:-1] & b[1:]).tolist():
+        transitions.append((tuple(side_a[i].tolist()), tuple(side_b[i + 1].tolist())))
+    for i in np.flatnonzero(crossing & a[1:] & b[:-1]).tolist():
+        transitions.append((tuple(side_a[i + 1].tolist()), tuple(side_b[i].tolist())))
+
+    return transitions
+
+
+class Hierarchy:
+    """Abstract graph for HPA*.
+
+    The grid is cut into square clusters. Entrances on the borders between
+    neighbouring clusters give the abstract nodes; nodes of one cluster are
+    joined by their shortest in-cluster cost and facing nodes by the single
+    step between them. Only costs are stored, paths are refined on demand.
+    """
+
+    def __init__(
+        self,
+        grid: models.GridWithWeights,
+        cluster_size: int,
+        borders: tp.Dict[tp.Tuple[Cluster, Cluster], tp.List[Transition]],
+        edges: tp.Dict[models.GridLocation, tp.Dict[models.GridLocation, float]],
+    ) -> None:
+        self.grid = grid
+        self.cluster_size = cluster_size
+        self.borders = borders
+        self.edges = edges
+
+    @classmethod
+    def from_grid(
+        cls, grid: models.GridWithWeights, cluster_size: int = CLUSTER_SIZE
+    ) -> Hierarchy:
+        hierarchy = cls(grid, cluster_size, {}, {})
+        clusters = list(hierarchy.clusters())
+        for cluster in clusters:
+            hierarchy.__build_borders(cluster)
+        hierarchy.__build_clusters(clusters)
+        return hierarchy
+
+    def updated(
+        self,
+        grid: models.GridWithWeights,
+        cells: tp.Iterable[models.GridLocation],
+    ) -> Hierarchy:
+        """Hierarchy for grid, which differs from this one's in cells.
+
+        Only the borders of the clusters holding those cells and the edges
+        inside them and their neighbours are recomputed.
+        """
+        changed = {self.cluster_of(cell) for cell in cells}
+        hierarchy = Hierarchy(
+            grid,
+            self.cluster_size,
+            dict(self.borders),
+            {node: dict(edges) for node, edges in self.edges.items()},
+        )
+
+        touched = set()
+        for cluster in changed:
+            touched.add(cluster)
+            touched.update(hierarchy.__neighbours(cluster))
+        for cluster in touched:
+            hierarchy.__drop_cluster(cluster)
+        for cluster in changed:
+            hierarchy.__build_borders(cluster, both_sides=True)
+        hierarchy.__build_clusters(sorted(touched))
+        return hierarchy
+
+    def clusters(self) -> tp.Iterator[Cluster]:
+        size = self.cluster_size
+        return itertools.product(
+            range(math.ceil(self.grid.width / size)),
+            range(math.ceil(self.grid.height / size)),
+        )
+
+    def cluster_of(self, cell: models.GridLocation) -> Cluster:
+        return cell[0] // self.cluster_size, cell[1] // self.cluster_size
+
+    def bounds(self, cluster: Cluster) -> tp.Tuple[int, int, int, int]:
+        size = self.cluster_size
+        return (
+            cluster[0] * size,
+            min((cluster[0] + 1) * size, self.grid.width),
+            cluster[1] * size,
+            min((cluster[1] + 1) * size, self.grid.height),
+        )
+
+    def nodes(self, cluster: Cluster) -> tp.Set[models.GridLocation]:
+        nodes = set()
+        for neighbour in self.__neighbours(cluster):
+            pair = tuple(sorted((cluster, neighbour)))
+            for a, b in self.borders.get(pair, ()):
+                nodes.add(a if self.cluster_of(a) == cluster else b)
+        return nodes
+
+    def __neighbours(self, cluster: Cluster) -> tp.Iterator[Cluster]:
+        columns = math.ceil(self.grid.width / self.cluster_size)
+        rows = math.ceil(self.grid.height / self.cluster_size)
+        for dx, dy in jump_point_search.DIRECTIONS:
+            x, y = cluster[0] + dx, cluster[1] + dy
+            if 0 <= x < columns and 0 <= y < rows:
+                yield x, y
+
+    def __build_borders(self, cluster: Cluster, both_sides: bool = False) -> None:
+        directions = list(BORDER_DIRECTIONS)
+        if both_sides:
+            directions += [(-dx, -dy) for dx, dy in BORDER_DIRECTIONS]
+
+        neighbours = set(self.__neighbours(cluster))
+        for dx, dy in directions:
+            neighbour = (cluster[0] + dx, cluster[1] + dy)
+            if neighbour not in neighbours:
+                continue
+            low, high = sorted((cluster, neighbour))
+            self.borders[(low, high)] = self.__transitions(low, high)
+
+    def __transitions(self, low: Cluster, high: Cluster) -> tp.List[Transition]:
+        free = ~self.grid.occupancy
+        lx0, lx1, ly0, ly1 = self.bounds(low)
+        hx0, hx1, hy0, hy1 = self.bounds(high)
+
+        direction = (high[0] - low[0], high[1] - low[1])
+        if direction == (1, 0):
+            ys = np.arange(ly0, ly1)
+            side_a = np.stack([np.full_like(ys, lx1 - 1), ys], axis=1)
+            side_b = np.stack([np.full_like(ys, hx0), ys], axis=1)
+            return _line_transitions(free, side_a, side_b)
+        if direction == (0, 1):
+            xs = np.arange(lx0, lx1)
+            side_a = np.stack([xs, np.full_like(xs, ly1 - 1)], axis=1)
+            side_b = np.stack([xs, np.full_like(xs, hy0)], axis=1)
+            return _line_transitions(free, side_a, side_b)
+
+        # clusters meeting at a corner share one diagonal step
+        if direction == (1, 1):
+            a, b = (lx1 - 1, ly1 - 1), (hx0, hy0)
+        else:
+            a, b = (lx1 - 1, ly0), (hx0, hy1 - 1)
+        if free[a] and free[b]:
+            return [(a, b)]
+        return []
+
+    def __drop_cluster(self, cluster: Cluster) -> None:
+        for node in self.nodes(cluster):
+            for other in self.edges.pop(node, {}):
+                self.edges.get(other, {}).pop(node, None)
+
+    def __build_clusters(self, clusters: tp.List[Cluster]) -> None:
+        nodes = [sorted(self.nodes(cluster)) for cluster in clusters]
+        origins = [self.bounds(cluster)[::2] for cluster in clusters]
+        costs = _cluster_costs(self.grid, self.cluster_size, origins, nodes)
+        for cluster_nodes, matrix in zip(nodes, costs):
+            for node, row in zip(cluster_nodes, matrix.tolist()):
+                edges = self.edges.setdefault(node, {})
+                for other, cost in zip(cluster_nodes, row):
+                    if other != node and cost != math.inf:
+                        edges[other] = cost
+
+        # steps over the borders; both ends may have been dropped before
+        for cluster in clusters:
+            for neighbour in self.__neighbours(cluster):
+                pair = tuple(sorted((cluster, neighbour)))
+                for a, b in self.borders.get(pair, ()):
+                    self.edges.setdefault(a, {})[b] = self.grid.cost(a, b)
+                    self.edges.setdefault(b, {})[a] = self.grid.cost(b, a)
+
+    def query(
+        self,
+        start: models.GridLocation,
+        target: models.GridLocation,
+        stats: tp.Optional[search_stats.SearchStats] = None,
+    ) -> tp.Optional[tp.List[models.GridLocation]]:
+        """Grid path from start to target, both inclusive."""
+        if stats is None:
+            stats = search_stats.SearchStats()
+        start_cluster = self.cluster_of(start)
+        target_cluster = self.cluster_of(target)
+        start_nodes = self.nodes(start_cluster)
+        target_nodes = self.nodes(target_cluster)
+
+        # close pairs are also searched directly, entrances alone would
+        # send short trips on a detour through the border transitions
+        direct_cost, direct_path = math.inf, None
+        if (
+            abs(start_cluster[0] - target_cluster[0]) <= 1
+            and abs(start_cluster[1] - target_cluster[1]) <= 1
+        ):
+            (sx0, sx1, sy0, sy1) = self.bounds(start_cluster)
+            (tx0, tx1, ty0, ty1) = self.bounds(target_cluster)
+            bounds = (min(sx0, tx0), max(sx1, tx1), min(sy0, ty0), max(sy1, ty1))
+            found, came_from = _local_search(
+                self.grid, bounds, start, {target}, stats=stats
+            )
+            if target in found:
+                direct_cost, direct_path = found[target], _walk_back(came_from, target)
+
+        # start and target join the abstract graph through their clusters
+        from_start, _ = _local_search(
+            self.grid, self.bounds(start_cluster), start, start_nodes, stats=stats
+        )
+        to_target, _ = _local_search(
+            self.grid,
+            self.bounds(target_cluster),
+            target,
+            target_nodes,
+            reverse=True,
+            stats=stats,
+        )
+
+        def edges(node: models.GridLocation) -> tp.Iterator[tp.Tuple[tp.Any, float]]:
+            if node == start:
+                yield from from_start.items()
+            yield from self.edges.get(node, {}).items()
+            if node in to_target:
+                yield target, to_target[node]
+
+        counter = itertools.count()
+        frontier = [(0.0, next(counter), start)]
+        came_from = {start: start}
+        cost_so_far = {start: 0.0}
+        closed = set()
+        while frontier:
+            current = heapq.heappop(frontier)[2]
+            if current == target:
+                break
+            if current in closed:
+                continue
+            closed.add(current)
+            stats.expanded += 1
+
+            for neighbor, cost in edges(current):
+                new_cost = cost_so_far[current] + cost
+                if new_cost < cost_so_far.get(neighbor, math.inf):
+                    cost_so_far[neighbor] = new_cost
+                    came_from[neighbor] = current
+                    priority = new_cost + jump_point_search.octile(neighbor, target)
+                    heapq.heappush(frontier, (priority, next(counter), neighbor))
+                    stats.pushed += 1
+        else:
+            return direct_path
+
+        if direct_cost <= cost_so_far[target]:
+            return direct_path
+        return self.refine(_walk_back(came_from, target), stats)
+
+    def refine(
+        self,
+        nodes: tp.List[models.GridLocation],
+        stats: tp.Optional[search_stats.SearchStats] = None,
+    ) -> tp.List[models.GridLocation]:
+        path = [nodes[0]]
+        for a, b in zip(nodes, nodes[1:]):
+            cluster = self.cluster_of(a)
+            if cluster != self.cluster_of(b):
+                path.append(b)
+                continue
+            _, came_from = _local_search(
+                self.grid, self.bounds(cluster), a, {b}, stats=stats
+            )
+            path.extend(_walk_back(came_from, b)[1:])
+        return path
+
+
+class HierarchicalPlanner(a_star_pathfinder.AStar):
+    """HPA*: plans on a precomputed Hierarchy and refines only the abstract
+    edges of the result. Like AStar, get_path() leaves out the target."""
+
+    def __init__(self, hierarchy: tp.Optional[Hierarchy] = None) -> None:
+        super().__init__()
+        self.hierarchy = hierarchy
+
+    def a_star_search(self) -> None:
+        if self.hierarchy is None:
+            self.hierarchy = Hierarchy.from_grid(self.maze)
+
+        start, target = self.points
+        path = self.hierarchy.query(
+            (start[0], start[1]), (target[0], target[1]), self.stats
+        )
+        if path is not None:
+            self._store_path(path[:-1])
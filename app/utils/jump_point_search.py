@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import typing as tp
+import numpy as np
+from app import models
+from . import a_star_pathfinder
+
+Direction = tp.Tuple[int, int]
+
+DIRECTIONS: tp.Tuple[Direction, ...] = (
+    (1, 0),
+    (-1, 0),
+    (0, 1),
+    (0, -1),
+    (1, 1),
+    (1, -1),
+    (-1, 1),
+    (-1, -1),
+)
+DIRECTION_INDEX = {d: i for i, d in enumerate(DIRECTIONS)}
+
+
+def octile(a: models.GridLocation, b: models.GridLocation) -> float:
+    dx = abs(a[0] - b[0])
+    dy = abs(a[1] - b[1])
+    return max(dx, dy) + (models.DIAGONAL_STEP - 1) * min(dx, dy)
+
+
+def _sign(value: int) -> int:
+    return (value > 0) - (value < 0)
+
+
+def expand(jump_points: tp.List[models.GridLocation]) -> tp.List[models.GridLocation]:
+    # consecutive jump points always lie on a straight or 45 degree line
+    path = [jump_points[0]]
+    for (x1, y1), (x2, y2) in zip(jump_points, jump_points[1:]):
+        dx, dy = _sign(x2 - x1), _sign(y2 - y1)
+        for step in range(1, max(abs(x2 - x1), abs(y2 - y1)) + 1):
+            path.append((x1 + dx * step, y1 + dy * step))
+    return path
+
+
+class JumpPointSearch(a_star_pathfinder.AStar):
+    """Jump Point Search for uniform-cost 8-connected grids.
+
+    Diagonal moves may cut corners, as in SquareGrid.neighbors, and step
+    costs are octile, so the result is an optimal path for GridWithWeights
+    without weights.
+    """
+
+    def a_star_search(self) -> None:
+        grid = self.maze
+        start, goal = self.points
+        start, goal = (start[0], start[1]), (goal[0], goal[1])
+
+        counter = itertools.count()
+        frontier = [(0.0, next(counter), start)]
+        came_from: tp.Dict[models.GridLocation, tp.Optional[models.GridLocation]] = {
+            start: None
+        }
+        cost_so_far = {start: 0.0}
+        closed = set()
+        stats = self.stats
+
+        while frontier:
+            current = heapq.heappop(frontier)[2]
+            if current in closed:
+                continue
+            closed.add(current)
+            stats.expanded += 1
+
+            if current == goal:
+                self._store_jump_points(current, came_from)
+                break
+
+            for jump_point in self._successors(grid, current, came_from[current], goal):
+                new_cost = cost_so_far[current] + octile(current, jump_point)
+                if new_cost < cost_so_far.get(jump_point, float("inf")):
+                    cost_so_far[jump_point] = new_cost
+                    came_from[jump_point] = current
+                    priority = new_cost + octile(jump_point, goal)
+                    heapq.heappush(frontier, (priority, next(counter), jump_point))
+                    stats.pushed += 1
+
+    def _store_jump_points(self, goal, came_from) -> None:
+        jump_points = []
+        current = goal
+        while current is not None:
+            jump_points.append(current)
+            current = came_from[current]
+
+        # same shape as AStar.get_path(): the goal cell itself is not included
+        self._store_path(expand(jump_points[::-1])[:-1])
+
+    @staticmethod
+    def _directions(
+        grid: models.SquareGrid,
+        node: models.GridLocation,
+        parent: tp.Optional[models.GridLocation],
+    ) -> tp.List[Direction]:
+        if parent is None:
+            return list(DIRECTIONS)
+
+        walls = grid.wall_index
+        in_bounds = grid.in_bounds
+
+        def blocked(x: int, y: int) -> bool:
+            return (x, y) in walls or not in_bounds((x, y))
+
+        (x, y) = node
+        dx, dy = _sign(x - parent[0]), _sign(y - parent[1])
+        directions = []
+        if dx and dy:
+            directions.extend([(0, dy), (dx, 0), (dx, dy)])
+            if blocked(x - dx, y):
+                directions.append((-dx, dy))
+            if blocked(x, y - dy):
+                directions.append((dx, -dy))
+        elif dx:
+            directions.append((dx, 0))
+            if blocked(x, y + 1):
+                directions.append((dx, 1))
+            if blocked(x, y - 1):
+                directions.append((dx, -1))
+        else:
+            directions.append((0, dy))
+            if blocked(x + 1, y):
+                directions.append((1, dy))
+            if blocked(x - 1, y):
+                directions.append((-1, dy))
+
+        return directions
+
+    def _successors(
+        self,
+        grid: models.SquareGrid,
+        node: models.GridLocation,
+        parent: tp.Optional[models.GridLocation],
+        goal: models.GridLocation,
+    ) -> tp.Iterator[models.GridLocation]:
+        for dx, dy in self._directions(grid, node, parent):
+            jump_point = self._jump(grid, node, dx, dy, goal)
+            if jump_point is not None:
+                yield jump_point
+
+    @staticmethod
+    def _jump(
+        grid: models.SquareGrid,
+        node: models.GridLocation,
+        dx: int,
+        dy: int,
+        goal: models.GridLocation,
+    ) -> tp.Optional[models.GridLocation]:
+        walls = grid.wall_index
+        width, height = grid.width, grid.height
+
+        def free(x: int, y: int) -> bool:
+            return 0 <= x < width and 0 <= y < height and (x, y) not in walls
+
+        def jump_straight(x: int, y: int, sx: int, sy: int):
+            while True:
+                x += sx
+                y += sy
+                if not free(x, y):
+                    return None
+                if (x, y) == goal:
+                    return x, y
+                if sx:
+                    if (free(x + sx, y + 1) and not free(x, y + 1)) or (
+                        free(x + sx, y - 1) and not free(x, y - 1)
+                    ):
+                        return x, y
+                elif (free(x + 1, y + sy) and not free(x + 1, y)) or (
+                    free(x - 1, y + sy) and not free(x - 1, y)
+                ):
+                    return x, y
+
+        (x, y) = node
+        if not (dx and dy):
+            return jump_straight(x, y, dx, dy)
+
+        while True:
+            x += dx
+            y += dy
+            if not free(x, y):
+                return None
+            if (x, y) == goal:
+                return x, y
+            if (free(x - dx, y + dy) and not free(x - dx, y)) or (
+                free(x + dx, y - dy) and not free(x, y - dy)
+            ):
+                return x, y
+            if jump_straight(x, y, dx, 0) or jump_straight(x, y, 0, dy):
+                return x, y
+
+
+def _shifted(row: np.ndarray, dy: int, fill) -> np.ndarray:
+    # result[y] = row[y + dy], cells beyond the border get the fill value
+    if dy == 0:
+        return row
+    out = np.full_like(row, fill)
+    if dy > 0:
+        out[:-dy] = row[dy:]
+    else:
+        out[-dy:] = row[:dy]
+    return out
+
+
+def _sweep(walk: np.ndarray, jump: np.ndarray, dx: int, dy: int) -> np.ndarray:
+    if dx == 0:
+        return _sweep(walk.T, jump.T, dy, 0).T
+
+    width = walk.shape[0]
+    distances = np.zeros(walk.shape, dtype=np.int32)
+    rows = range(width - 1, -1, -1) if dx > 0 else range(width)
+    for x in rows:
+        if not 0 <= x + dx < width:
+            continue
+        next_walk = _shifted(walk[x + dx], dy, False)
+        next_jump = _shifted(jump[x + dx], dy, False)
+        next_distance = _shifted(distances[x + dx], dy, 0)
+        distances[x] = np.where(
+            ~next_walk,
+            0,
+            np.where(
+                next_jump,
+                1,
+                np.where(next_distance > 0, next_distance + 1, next_distance - 1),
+            ),
+        )
+    return distances
+
+
+class JumpTable:
+    """Per-map JPS+ jump distances, one (width, height) plane per direction.
+
+    A positive value is the number of steps to the next jump point, zero or
+    a negative value is minus the number of free steps before a wall.
+    """
+
+    def __init__(self, distances: np.ndarray) -> None:
+        self.distances = distances
+
+    @classmethod
+    def from_grid(cls, grid: models.SquareGrid) -> JumpTable:
+        walk = ~grid.occupancy
+        width, height = walk.shape
+        padded = np.pad(walk, 1, constant_values=False)
+
+        def at(ax: int, ay: int) -> np.ndarray:
+            return padded[1 + ax : 1 + ax + width, 1 + ay : 1 + ay + height]
+
+        distances = np.zeros((len(DIRECTIONS), width, height), dtype=np.int32)
+        for dx, dy in DIRECTIONS[:4]:
+            if dx:
+                forced = (at(dx, 1) & ~at(0, 1)) | (at(dx, -1) & ~at(0, -1))
+            else:
+                forced = (at(1, dy) & ~at(1, 0)) | (at(-1, dy) & ~at(-1, 0))
+            distances[DIRECTION_INDEX[(dx, dy)]] = _sweep(walk, forced, dx, dy)
+
+        for dx, dy in DIRECTIONS[4:]:
+            forced = (at(-dx, dy) & ~at(-dx, 0)) | (at(dx, -dy) & ~at(0, -dy))
+            forced |= distances[DIRECTION_INDEX[(dx, 0)]] > 0
+            forced |= distances[DIRECTION_INDEX[(0, dy)]] > 0
+            distances[DIRECTION_INDEX[(dx, dy)]] = _sweep(walk, forced, dx, dy)
+
+        distances.setflags(write=False)
+        return cls(distances)
+
+    def get(self, direction: Direction, node: models.GridLocation) -> int:
+        return int(self.distances[DIRECTION_INDEX[direction], node[0], node[1]])
+
+
+class JumpPointSearchPlus(JumpPointSearch):
+    """JPS+: the same search as JumpPointSearch with jumps read from a table."""
+
+    def __init__(self, table: tp.Optional[JumpTable] = None) -> None:
+        super().__init__()
+        self.table = table
+
+    def _successors(
+        self,
+        grid: models.SquareGrid,
+        node: models.GridLocation,
+        parent: tp.Optional[models.GridLocation],
+        goal: models.GridLocation,
+    ) -> tp.Iterator[models.GridLocation]:
+        if self.table is None:
+            self.table = JumpTable.from_grid(grid)
+
+        for direction in self._directions(grid, node, parent):
+            jump_point = self._table_jump(node, direction, goal)
+            if jump_point is not None:
+                yield jump_point
+
+    def _straight_reaches(
+        self, node: models.GridLocation, direction: Direction, steps: int
+    ) -> bool:
+        return steps <= abs(self.table.get(direction, node))
+
+    def _table_jump(
+        self, node: models.GridLocation, direction: Direction, goal: models.GridLocation
+    ) -> tp.Optional[models.GridLocation]:
+        (x, y), (dx, dy) = node, direction
+        distance = self.table.get(direction, node)
+        to_goal_x, to_goal_y = goal[0] - x, goal[1] - y
+
+        if not (dx and dy):
+            on_ray = (to_goal_y == 0 and to_goal_x * dx > 0) or (
+                to_goal_x == 0 and to_goal_y * dy > 0
+            )
+            if on_ray and abs(to_goal_x + to_goal_y) <= abs(distance):
+                return goal
+        elif to_goal_x * dx > 0 and to_goal_y * dy > 0:
+            steps = min(abs(to_goal_x), abs(to_goal_y))
+            if steps <= abs(distance):
+                crossing = (x + dx * steps, y + dy * steps)
+                if crossing == goal:
+                    return goal
+                if crossing[0] == goal[0]:
+                    rest = ((0, dy), abs(goal[1] - crossing[1]))
+                else:
+                    rest = ((dx, 0), abs(goal[0] - crossing[0]))
+                if self._straight_reaches(crossing, *rest):
+                    return crossing
+
+        if distance > 0:
+            return x + dx * distance, y + dy * distance
+        return None
@@ -0,0 +1,148 @@
+import typing as tp
+import numpy as np
+from app import models
+from . import search_stats
+
+# pairs are split into chunks so one call never materialises more cells
+MAX_CELLS_PER_CHUNK = 1 << 22
+# below this many cells a plain loop beats the NumPy call overhead
+SHORT_SEGMENT = 64
+
+
+def _traverse(
+    starts: np.ndarray, ends: np.ndarray
+) -> tp.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Cells visited by the Bresenham walk of path_smoother for every pair.
+
+    The walk advances the major axis every step and the minor axis whenever
+    the accumulated error exceeds one half; after i steps the minor offset is
+    ceil((2 * i * minor - major) / (2 * major)), computed here in integers.
+    Returns the x and y of all cells and the offset of each pair's first cell.
+    """
+    delta = ends - starts
+    sign = np.where(delta >= 0, 1, -1)
+    length = np.abs(delta)
+    x_major = length[:, 1] <= length[:, 0]
+    major = np.where(x_major, length[:, 0], length[:, 1])
+    minor = np.where(x_major, length[:, 1], length[:, 0])
+
+    counts = major + 1
+    offsets = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=offsets[1:])
+    pair = np.repeat(np.arange(len(counts)), counts)
+    step = np.arange(int(counts.sum()), dtype=np.int64) - offsets[pair]
+
+    major_p, minor_p = major[pair], minor[pair]
+    minor_step = -((major_p - 2 * step * minor_p) // np.maximum(2 * major_p, 1))
+    x_major_p = x_major[pair]
+
+    xs = starts[pair, 0] + sign[pair, 0] * np.where(x_major_p, step, minor_step)
+    ys = starts[pair, 1] + sign[pair, 1] * np.where(x_major_p, minor_step, step)
+    return xs, ys, offsets
+
+
+def _blocked(
+    occupancy: np.ndarray,
+    xs: np.ndarray,
+    ys: np.ndarray,
+    stats: tp.Optional[search_stats.SearchStats],
+) -> np.ndarray:
+    if stats is not None:
+        stats.sight_cells += len(xs)
+    width, height = occupancy.shape
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    blocked = ~inside
+    blocked[inside] = occupancy[xs[inside], ys[inside]]
+    return blocked
+
+
+def cells(
+    start: models.GridLocation, end: models.GridLocation
+) -> tp.Tuple[np.ndarray, np.ndarray]:
+    xs, ys, _ = _traverse(
+        np.array([start], dtype=np.int64), np.array([end], dtype=np.int64)
+    )
+    return xs, ys
+
+
+def cells_many(
+    starts: tp.Union[np.ndarray, tp.Sequence[models.GridLocation]],
+    ends: tp.Union[np.ndarray, tp.Sequence[models.GridLocation]],
+) -> tp.Tuple[np.ndarray, np.ndarray]:
+    xs, ys, _ = _traverse(
+        np.asarray(starts, dtype=np.int64).reshape(-1, 2),
+        np.asarray(ends, dtype=np.int64).reshape(-1, 2),
+    )
+    return xs, ys
+
+
+def is_visible(
+    occupancy: np.ndarray,
+    start: models.GridLocation,
+    end: models.GridLocation,
+    stats: tp.Optional[search_stats.SearchStats] = None,
+) -> bool:
+    xs, ys = cells(start, end)
+    return not _blocked(occupancy, xs, ys, stats).any()
+
+
+def is_visible_on(
+    grid: models.SquareGrid,
+    start: models.GridLocation,
+    end: models.GridLocation,
+    stats: tp.Optional[search_stats.SearchStats] = None,
+) -> bool:
+    """is_visible for the searches that test one pair at a time: short
+    segments are walked cell by cell against the grid's wall index."""
+    (x0, y0), (x1, y1) = start, end
+    dx, dy = abs(x1 - x0), abs(y1 - y0)
+    if max(dx, dy) >= SHORT_SEGMENT:
+        return is_visible(grid.occupancy, start, end, stats)
+
+    sx = 1 if x1 >= x0 else -1
+    sy = 1 if y1 >= y0 else -1
+    x_major = dy <= dx
+    major, minor = (dx, dy) if x_major else (dy, dx)
+    span = max(2 * major, 1)
+    walls = grid.wall_index
+    width, height = grid.width, grid.height
+    if stats is not None:
+        stats.sight_cells += major + 1
+    # the same cells as _traverse
+    for step in range(major + 1):
+        minor_step = -((major - 2 * step * minor) // span)
+        if x_major:
+            cell = (x0 + sx * step, y0 + sy * minor_step)
+        else:
+            cell = (x0 + sx * minor_step, y0 + sy * step)
+        if not (0 <= cell[0] < width and 0 <= cell[1] < height) or cell in walls:
+            return False
+    return True
+
+
+def visible_many(
+    occupancy: np.ndarray,
+    starts: tp.Union[np.ndarray, tp.Sequence[models.GridLocation]],
+    ends: tp.Union[np.ndarray, tp.Sequence[models.GridLocation]],
+    stats: tp.Optional[search_stats.SearchStats] = None,
+) -> np.ndarray:
+    starts = np.asarray(starts, dtype=np.int64).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=np.int64).reshape(-1, 2)
+    result = np.empty(len(starts), dtype=bool)
+    if not len(starts):
+        return result
+
+    counts = np.abs(ends - starts).max(axis=1) + 1
+    chunk_ends = np.cumsum(counts)
+    first = 0
+    while first < len(starts):
+        done = chunk_ends[first - 1] if first else 0
+        last = int(np.searchsorted(chunk_ends, done + MAX_CELLS_PER_CHUNK, "right"))
+        last = max(last, first + 1)
+
+        xs, ys, offsets = _traverse(starts[first:last], ends[first:last])
+        blocked = np.logical_or.reduceat(_blocked(occupancy, xs, ys, stats), offsets)
+        result[first:last] = ~blocked
+        first = last
+
+    return result
@@ -0,0 +1,36 @@
+import typing as tp
+import numpy as np
+from app import models
+from . import line_of_sight
+
+FREE, WALL, PATH, TURN = range(4)
+CHARS = np.array([".", "#", "+", "0"])
+# grey levels of the PGM raster
+SHADES = np.array([255, 0, 160, 80], dtype=np.uint8)
+
+
+def layer(
+    maze: np.ndarray, points: tp.Sequence[models.GridLocation]
+) -> np.ndarray:
+    """Cell codes of the maze with the polyline through points drawn in,
+    along the same cell walk the smoothing checks."""
+    codes = np.where(np.asarray(maze) == 1, WALL, FREE).astype(np.uint8)
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    if len(points) > 1:
+        xs, ys = line_of_sight.cells_many(points[:-1], points[1:])
+        codes[xs, ys] = PATH
+    if len(points):
+        codes[points[:, 0], points[:, 1]] = TURN
+    return codes
+
+
+def to_ascii(maze: np.ndarray, points: tp.Sequence[models.GridLocation]) -> str:
+    chars = CHARS[layer(maze, points)]
+    return "\n".join("".join(row) for row in chars.tolist()) + "\n"
+
+
+def to_pgm(maze: np.ndarray, points: tp.Sequence[models.GridLocation]) -> bytes:
+    # binary greymap: one byte per cell, rows are the maze's x
+    shades = SHADES[layer(maze, points)]
+    width, height = shades.shape
+    return f"P5 {height} {width} 255\n".encode() + shades.tobytes()
@@ -0,0 +1,16 @@
+import typing as tp
+
+
+class SearchStats:
+    """Work done by one planning call. Every call counts into its own, so
+    searches running side by side in threads don't mix their numbers."""
+
+    __slots__ = ("expanded", "pushed", "sight_cells")
+
+    def __init__(self) -> None:
+        self.expanded = 0
+        self.pushed = 0
+        self.sight_cells = 0
+
+    def as_dict(self) -> tp.Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import math
+import typing as tp
+import numpy as np
+from app import models
+from . import jump_point_search
+from . import search_stats
+
+# one cell per slot on a path; waiting a slot costs as much as a straight step
+WAIT_COST = 1.0
+# owner of reserved (slot, cell) keys as the search sees them
+Reserved = tp.Mapping[int, int]
+State = tp.Tuple[models.GridLocation, int]
+
+
+class Blocked(Exception):
+    """Other robots' reservations leave no way within the horizon."""
+
+
+class ReservationTable:
+    """(cell, time slot) pairs robots hold with their committed plans.
+
+    A plan is kept as the int64 keys slot * cells + flat cell index of the
+    cells it occupies, one array per robot, so replacing or expiring one
+    robot's plan leaves the others alone.
+    """
+
+    def __init__(self, shape: tp.Tuple[int, int]) -> None:
+        self.shape = shape
+        self.cells = shape[0] * shape[1]
+        self.__plans: tp.Dict[str, np.ndarray] = {}
+        self.__owners: tp.Dict[str, int] = {}
+        self.__ids = itertools.count(1)
+        # grows with every change, for optimistic commits
+        self.version = 0
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys in self.__plans.values())
+
+    @property
+    def robots(self) -> int:
+        return len(self.__plans)
+
+    def keys(self, path: tp.Sequence[models.GridLocation], first_slot: int) -> np.ndarray:
+        cells = np.asarray(path, dtype=np.int64).reshape(-1, 2)
+        slots = first_slot + np.arange(len(cells), dtype=np.int64)
+        return slots * self.cells + cells[:, 0] * self.shape[1] + cells[:, 1]
+
+    def reserved(self, robot: tp.Optional[str] = None) -> tp.Dict[int, int]:
+        """Keys held by every robot but the given one, with their owners."""
+        others = [(r, keys) for r, keys in self.__plans.items() if r != robot]
+        if not others:
+            return {}
+        keys = np.concatenate([keys for _, keys in others])
+        owners = np.repeat([self.__owners[r] for r, _ in others], [len(k) for _, k in others])
+        return dict(zip(keys.tolist(), owners.tolist()))
+
+    def commit(self, robot: str, keys: np.ndarray) -> None:
+        self.__plans[robot] = np.sort(keys)
+        self.__owners.setdefault(robot, next(self.__ids))
+        self.version += 1
+
+    def release(self, robot: str) -> bool:
+        self.__owners.pop(robot, None)
+        if self.__plans.pop(robot, None) is None:
+            return False
+        self.version += 1
+        return True
+
+    def expire(self, slot: int) -> int:
+        """Drops the keys of slots before slot, returns how many."""
+        first = slot * self.cells
+        dropped = 0
+        for robot, keys in list(self.__plans.items()):
+            # keys are sorted, so the past is a prefix
+            cut = int(np.searchsorted(keys, first))
+            if not cut:
+                continue
+            dropped += cut
+            if cut == len(keys):
+                self.release(robot)
+            else:
+                self.__plans[robot] = keys[cut:]
+        return dropped
+
+
+def search(
+    grid: models.GridWithWeights,
+    start: models.GridLocation,
+    goal: models.GridLocation,
+    first_slot: int,
+    reserved: Reserved,
+    horizon: int,
+    park: int,
+    distance: tp.Optional[np.ndarray] = None,
+    stats: tp.Optional[search_stats.SearchStats] = None,
+) -> tp.List[models.GridLocation]:
+    """Space-time A*: the cell of every slot from first_slot until the goal
+    is reached, waits included.
+
+    A step may not enter a reserved (cell, slot), nor swap cells with the
+    robot holding them, and the goal must stay free for park slots after
+    the arrival. distance, the costs to the goal ignoring other robots
+    (a reverse distance field), is the heuristic when given; the octile
+    distance otherwise. Raises Blocked when no such path starts within
+    horizon slots.
+    """
+    start = (start[0], start[1])
+    goal = (goal[0], goal[1])
+    height = grid.height
+    cells = grid.width * height
+
+    def key(cell: models.GridLocation, slot: int) -> int:
+        return slot * cells + cell[0] * height + cell[1]
+
+    def heuristic(cell: models.GridLocation) -> float:
+        if distance is None:
+            return jump_point_search.octile(cell, goal)
+        return distance.item(cell)
+
+    def parked(slot: int) -> bool:
+        return all(key(goal, s) not in reserved for s in range(slot, slot + park + 1))
+
+    if math.isinf(heuristic(start)):
+        raise models.Unreachable("End is unreachable")
+    if key(start, first_slot) in reserved:
+        # a plan committed before ran through where this robot stands
+        raise Blocked("Start is on another robot's reserved way")
+
+    last_slot = first_slot + horizon
+    counter = itertools.count()
+    came_from: tp.Dict[State, State] = {}
+    cost_so_far = {(start, first_slot): 0.0}
+    frontier = [(heuristic(start), next(counter), 0.0, start, first_slot)]
+    if stats is None:
+        stats = search_stats.SearchStats()
+    while frontier:
+        _, _, cost, current, slot = heapq.heappop(frontier)
+        if cost > cost_so_far[(current, slot)]:
+            continue
+        stats.expanded += 1
+        if current == goal and parked(slot):
+            path = [current]
+            state = (current, slot)
+            while state in came_from:
+                state = came_from[state]
+                path.append(state[0])
+            return path[::-1]
+        if slot >= last_slot:
+            continue
+
+        for following in itertools.chain((current,), grid.neighbors(current)):
+            if key(following, slot + 1) in reserved:
+                continue
+            # robots swapping cells would pass through each other
+            owner = reserved.get(key(following, slot))
+            if (
+                owner is not None
+                and following != current
+                and reserved.get(key(current, slot + 1)) == owner
+            ):
+                continue
+
+            step = WAIT_COST if following == current else grid.cost(current, following)
+            state = (following, slot + 1)
+            new_cost = cost + step
+            if new_cost < cost_so_far.get(state, math.inf):
+                cost_so_far[state] = new_cost
+                came_from[state] = (current, slot)
+                priority = new_cost + heuristic(following)
+                heapq.heappush(
+                    frontier, (priority, next(counter), new_cost, following, slot + 1)
+                )
+                stats.pushed += 1
+
+    raise Blocked(f"No conflict-free path within {horizon} slots")
+
+
+def valid(
+    path: tp.Sequence[models.GridLocation],
+    first_slot: int,
+    reserved: Reserved,
+    shape: tp.Tuple[int, int],
+    park: int,
+) -> bool:
+    """Whether a timed path keeps the rules search plans by."""
+    path = list(path) + [path[-1]] * park
+    cells = np.asarray(path, dtype=np.int64).reshape(-1, 2)
+    flat = cells[:, 0] * shape[1] + cells[:, 1]
+    slots = first_slot + np.arange(len(flat), dtype=np.int64)
+    area = shape[0] * shape[1]
+    if any(key in reserved for key in (slots * area + flat).tolist()):
+        return False
+
+    # the owner of the next cell now must not take this cell next
+    here = (slots[1:] * area + flat[:-1]).tolist()
+    there = (slots[:-1] * area + flat[1:]).tolist()
+    moved = (flat[1:] != flat[:-1]).tolist()
+    return not any(
+        step and reserved.get(b) is not None and reserved.get(b) == reserved.get(a)
+        for a, b, step in zip(here, there, moved)
+    )
+
+
+def to_segments(
+    path: tp.Sequence[models.GridLocation],
+) -> tp.Tuple[tp.List[models.GridLocation], tp.List[int]]:
+    """Turn points of a timed path and the slots waited at each of them.
+
+    Straight runs collapse into one segment; a wait always ends a segment,
+    so the robot only ever waits at a turn point.
+    """
+    points = [path[0]]
+    waits = [0]
+    heading: tp.Optional[tp.Tuple[int, int]] = None
+    for previous, current in zip(path, path[1:]):
+        if current == previous:
+            if points[-1] != previous:
+                points.append(previous)
+                waits.append(0)
+            waits[-1] += 1
+            heading = None
+            continue
+        direction = (current[0] - previous[0], current[1] - previous[1])
+        if heading is not None and direction != heading and points[-1] != previous:
+            points.append(previous)
+            waits.append(0)
+        heading = direction
+    if points[-1] != path[-1]:
+        points.append(path[-1])
+        waits.append(0)
+    return points, waits
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import math
+import typing as tp
+from app import models
+from . import a_star_pathfinder
+from . import line_of_sight
+
+
+def _euclidean(a: models.GridLocation, b: models.GridLocation) -> float:
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+class ThetaStar(a_star_pathfinder.AStar):
+    """Any-angle A*: a node may take its grandparent as parent when the two
+    see each other, so the result is already a list of turn points.
+
+    Like AStar, get_path() ends before the target: it returns the turn
+    points from start up to the last one before it, and smooth_path()
+    leaves them untouched.
+    """
+
+    def _line_of_sight(
+        self, start: models.GridLocation, target: models.GridLocation
+    ) -> bool:
+        return line_of_sight.is_visible_on(self.maze, start, target, self.stats)
+
+    def smooth_path(
+        self, path: tp.List[models.GridLocation]
+    ) -> tp.List[models.GridLocation]:
+        return list(path)
+
+    def _return_turn_points(
+        self,
+        goal: models.GridLocation,
+        came_from: tp.Dict[models.GridLocation, models.GridLocation],
+    ) -> None:
+        path = []
+        current = goal
+        while came_from[current] != current:
+            current = came_from[current]
+            path.append(current)
+        self._store_path(path[::-1])
+
+    def a_star_search(self) -> None:
+        graph = self.maze
+        start, goal = self.points
+        start, goal = (start[0], start[1]), (goal[0], goal[1])
+
+        counter = itertools.count()
+        frontier = [(0.0, next(counter), start)]
+        came_from = {start: start}
+        cost_so_far = {start: 0.0}
+        closed = set()
+        stats = self.stats
+
+        while frontier:
+            current = heapq.heappop(frontier)[2]
+            if current in closed:
+                continue
+            if current == goal:
+                self._return_turn_points(current, came_from)
+                break
+            closed.add(current)
+            stats.expanded += 1
+
+            parent = came_from[current]
+            for neighbor in graph.neighbors(current):
+                if neighbor in closed:
+                    continue
+
+                if self._line_of_sight(parent, neighbor):
+                    via = parent
+                    new_cost = cost_so_far[parent] + _euclidean(parent, neighbor)
+                else:
+                    via = current
+                    new_cost = cost_so_far[current] + graph.cost(current, neighbor)
+
+                if new_cost < cost_so_far.get(neighbor, math.inf):
+                    cost_so_far[neighbor] = new_cost
+                    came_from[neighbor] = via
+                    priority = new_cost + _euclidean(neighbor, goal)
+                    heapq.heappush(frontier, (priority, next(counter), neighbor))
+                    stats.pushed += 1
+
+
+class LazyThetaStar(ThetaStar):
+    """Theta* that assumes line of sight when a node is generated and only
+    checks it once, when the node is expanded."""
+
+    def a_star_search(self) -> None:
+        graph = self.maze
+        start, goal = self.points
+        start, goal = (start[0], start[1]), (goal[0], goal[1])
+
+        counter = itertools.count()
+        frontier = [(0.0, next(counter), start)]
+        came_from = {start: start}
+        cost_so_far = {start: 0.0}
+        closed = set()
+        stats = self.stats
+
+        while frontier:
+            current = heapq.heappop(frontier)[2]
+            if current in closed:
+                continue
+
+            parent = came_from[current]
+            if parent != current and not self._line_of_sight(parent, current):
+                # no sight after all: fall back to the best expanded neighbour
+                cost_so_far[current], came_from[current] = min(
+                    (cost_so_far[n] + graph.cost(n, current), n)
+                    for n in graph.neighbors(current)
+                    if n in closed
+                )
+
+            if current == goal:
+                self._return_turn_points(current, came_from)
+                break
+            closed.add(current)
+            stats.expanded += 1
+
+            parent = came_from[current]
+            for neighbor in graph.neighbors(current):
+                if neighbor in closed:
+                    continue
+
+                new_cost = cost_so_far[parent] + _euclidean(parent, neighbor)
+                if new_cost < cost_so_far.get(neighbor, math.inf):
+                    cost_so_far[neighbor] = new_cost
+                    came_from[neighbor] = parent
+                    priority = new_cost + _euclidean(neighbor, goal)
+                    heapq.heappush(frontier, (priority, next(counter), neighbor))
+                    stats.pushed += 1
@@ -0,0 +1,43 @@
+import typing as tp
+import numpy as np
+
+
+def tour_cost(costs: np.ndarray, order: tp.Sequence[int]) -> float:
+    order = np.asarray(order)
+    return float(costs[order[:-1], order[1:]].sum())
+
+
+def nearest_neighbour(costs: np.ndarray, first: int = 0) -> tp.List[int]:
+    """Open tour from first that always moves to the cheapest unvisited stop."""
+    order = [first]
+    unvisited = np.ones(len(costs), dtype=bool)
+    unvisited[first] = False
+    while unvisited.any():
+        row = np.where(unvisited, costs[order[-1]], np.inf)
+        order.append(int(np.argmin(row)))
+        unvisited[order[-1]] = False
+    return order
+
+
+def two_opt(
+    costs: np.ndarray, order: tp.Sequence[int], max_rounds: int = 50
+) -> tp.List[int]:
+    """Reverse segments of an open tour while that makes it cheaper.
+
+    The first stop stays in place; every candidate is priced in full, so the
+    result is also correct for asymmetric costs.
+    """
+    best = list(order)
+    best_cost = tour_cost(costs, best)
+    for _ in range(max_rounds):
+        improved = False
+        for i in range(1, len(best) - 1):
+            for j in range(i + 1, len(best)):
+                candidate = best[:i] + best[i : j + 1][::-1] + best[j + 1 :]
+                candidate_cost = tour_cost(costs, candidate)
+                if candidate_cost < best_cost - 1e-9:
+                    best, best_cost = candidate, candidate_cost
+                    improved = True
+        if not improved:
+            break
+    return best
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import heapq
+import math
+import typing as tp
+import numpy as np
+from app import models
+from . import a_star_pathfinder
+from . import line_of_sight
+from . import search_stats
+
+
+def corner_cells(occupancy: np.ndarray) -> np.ndarray:
+    """Free cells a shortest polyline may turn at.
+
+    These are convex obstacle corners (a diagonal neighbour is a wall while
+    the two cells next to both are free) and the ends of diagonal squeezes
+    (the diagonal neighbour is free but a cell next to both is a wall), which
+    is how paths bend inside one cell wide corridors.
+    """
+    walk = ~occupancy
+    width, height = walk.shape
+    padded = np.pad(walk, 1, constant_values=False)
+
+    def at(ax: int, ay: int) -> np.ndarray:
+        return padded[1 + ax : 1 + ax + width, 1 + ay : 1 + ay + height]
+
+    corners = np.zeros_like(walk)
+    for dx, dy in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+        corners |= ~at(dx, dy) & at(dx, 0) & at(0, dy)
+        corners |= at(dx, dy) & ~(at(dx, 0) & at(0, dy))
+    return np.argwhere(walk & corners)
+
+
+def _mutually_visible(
+    occupancy: np.ndarray,
+    point: np.ndarray,
+    others: np.ndarray,
+    stats: tp.Optional[search_stats.SearchStats] = None,
+) -> np.ndarray:
+    # robots drive segments both ways, so an edge needs sight in both directions
+    here = np.broadcast_to(point, others.shape)
+    return line_of_sight.visible_many(
+        occupancy, here, others, stats
+    ) & line_of_sight.visible_many(occupancy, others, here, stats)
+
+
+class VisibilityGraph:
+    def __init__(
+        self,
+        occupancy: np.ndarray,
+        corners: np.ndarray,
+        adjacency: tp.List[tp.List[tp.Tuple[int, float]]],
+    ) -> None:
+        self.occupancy = occupancy
+        self.corners = corners
+        self.adjacency = adjacency
+
+    def __len__(self) -> int:
+        return len(self.corners)
+
+    @classmethod
+    def from_grid(cls, grid: models.SquareGrid) -> VisibilityGraph:
+        corners = corner_cells(grid.occupancy)
+        adjacency: tp.List[tp.List[tp.Tuple[int, float]]] = [[] for _ in corners]
+        for i in range(len(corners) - 1):
+            others = corners[i + 1 :]
+            visible = np.flatnonzero(
+                _mutually_visible(grid.occupancy, corners[i], others)
+            )
+            lengths = np.hypot(*(others[visible] - corners[i]).T)
+            for j, length in zip((visible + i + 1).tolist(), lengths.tolist()):
+                adjacency[i].append((j, length))
+                adjacency[j].append((i, length))
+
+        return cls(grid.occupancy, corners, adjacency)
+
+    def query(
+        self,
+        start: models.GridLocation,
+        target: models.GridLocation,
+        stats: tp.Optional[search_stats.SearchStats] = None,
+    ) -> tp.Optional[tp.List[models.GridLocation]]:
+        if stats is None:
+            stats = search_stats.SearchStats()
+        start_point = np.array(start, dtype=np.int64)
+        target_point = np.array(target, dtype=np.int64)
+        if _mutually_visible(
+            self.occupancy, start_point, target_point[None], stats
+        )[0]:
+            return [start, target]
+        if not len(self.corners):
+            return None
+
+        # start and target are temporary nodes len(corners) and len(corners) + 1
+        source, sink = len(self.corners), len(self.corners) + 1
+        from_start = np.flatnonzero(
+            _mutually_visible(self.occupancy, start_point, self.corners, stats)
+        )
+        to_target = np.flatnonzero(
+            _mutually_visible(self.occupancy, target_point, self.corners, stats)
+        )
+        to_target_lengths = dict(
+            zip(
+                to_target.tolist(),
+                np.hypot(*(self.corners[to_target] - target_point).T).tolist(),
+            )
+        )
+
+        def edges(node: int) -> tp.Iterator[tp.Tuple[int, float]]:
+            if node == source:
+                lengths = np.hypot(*(self.corners[from_start] - start_point).T)
+                yield from zip(from_start.tolist(), lengths.tolist())
+                return
+            yield from self.adjacency[node]
+            if node in to_target_lengths:
+                yield sink, to_target_lengths[node]
+
+        distances = {source: 0.0}
+        came_from: tp.Dict[int, int] = {}
+        frontier = [(0.0, source)]
+        while frontier:
+            distance, node = heapq.heappop(frontier)
+            if node == sink:
+                break
+            if distance > distances[node]:
+                continue
+            stats.expanded += 1
+            for neighbor, length in edges(node):
+                new_distance = distance + length
+                if new_distance < distances.get(neighbor, math.inf):
+                    distances[neighbor] = new_distance
+                    came_from[neighbor] = node
+                    heapq.heappush(frontier, (new_distance, neighbor))
+                    stats.pushed += 1
+        else:
+            return None
+
+        path = [target]
+        node = came_from[sink]
+        while node != source:
+            path.append(tuple(self.corners[node].tolist()))
+            node = came_from[node]
+        path.append(start)
+        return path[::-1]
+
+
+class VisibilityGraphPlanner(a_star_pathfinder.AStar):
+    """Shortest polyline through obstacle corners on a precomputed graph.
+
+    Like ThetaStar, get_path() holds the turn points from start up to the
+    last one before the target, and smooth_path() leaves them untouched.
+    """
+
+    def __init__(self, graph: tp.Optional[VisibilityGraph] = None) -> None:
+        super().__init__()
+        self.graph = graph
+
+    def smooth_path(
+        self, path: tp.List[models.GridLocation]
+    ) -> tp.List[models.GridLocation]:
+        return list(path)
+
+    def a_star_search(self) -> None:
+        if self.graph is None:
+            self.graph = VisibilityGraph.from_grid(self.maze)
+
+        start, target = self.points
+        path = self.graph.query(tuple(start), tuple(target), self.stats)
+        if path is not None:
+            # same shape as AStar.get_path(): the target itself is left out
+            self._store_path(path[:-1])
@@ -0,0 +1,428 @@
+"""Benchmark the planning pipeline stage by stage and the HTTP handlers.
+
+    python -m scripts.benchmark run [--quick] [--output results.json]
+    python -m scripts.benchmark compare baseline.json results.json
+
+Stage timings run in this process on the built-in mazes and on seeded
+synthetic maps of increasing size and obstacle density. The end-to-end
+part drives the aiohttp app through a test client with the in-memory
+Redis stand-in. Results are JSON keyed so that two runs, e.g. from two
+commits, can be compared metric by metric.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import typing as tp
+import numpy as np
+from app import maps
+from app import models
+from app import plan_codec
+from app import planning
+from app.utils import distance_field
+from app.utils import line_of_sight
+from app.utils import path_smoother
+
+RESULTS_VERSION = 1
+STAGES = ("search", "smooth", "geometry", "encode", "render")
+
+SIZES = (64, 128, 256)
+DENSITIES = (0.1, 0.25)
+QUICK_SIZES = (64,)
+QUICK_DENSITIES = (0.1,)
+
+
+def synthetic_maze(size: int, density: float, seed: int) -> np.ndarray:
+    """Walled square map with rectangular obstacles covering about density
+    of the cells, the same for the same arguments."""
+    rng = np.random.default_rng(seed)
+    maze = np.zeros((size, size), dtype=np.uint8)
+    maze[[0, -1], :] = 1
+    maze[:, [0, -1]] = 1
+
+    longest = max(2, size // 16)
+    while maze[1:-1, 1:-1].mean() < density:
+        x, y = rng.integers(1, size - 1, size=2)
+        width, height = rng.integers(1, longest + 1, size=2)
+        maze[x : x + width, y : y + height] = 1
+        maze[[0, -1], :] = 1
+        maze[:, [0, -1]] = 1
+    return maze
+
+
+def benchmark_maps(
+    sizes: tp.Sequence[int], densities: tp.Sequence[float], seed: int
+) -> tp.List[maps.MapEntry]:
+    entries = list(maps.default_registry())
+    for size in sizes:
+        for density in densities:
+            name = f"synthetic_{size}_{int(density * 100)}"
+            entries.append(maps.MapEntry(name, synthetic_maze(size, density, seed)))
+    return entries
+
+
+def sample_queries(
+    entry: maps.MapEntry, count: int, rng: np.random.Generator
+) -> tp.List[tp.Tuple[models.GridLocation, models.GridLocation]]:
+    """Start and target pairs that are connected, drawn from the component
+    of a random free cell that holds at least a quarter of the free cells."""
+    free = np.argwhere(np.asarray(entry.maze) == 0)
+    for _ in range(20):
+        source = tuple(free[rng.integers(len(free))].tolist())
+        field = distance_field.DistanceField.from_grid(entry.grid, source)
+        reached = np.argwhere(np.isfinite(field.distance))
+        if len(reached) * 4 >= len(free):
+            break
+
+    picks = rng.integers(len(reached), size=(count, 2))
+    return [
+        (tuple(reached[a].tolist()), tuple(reached[b].tolist()))
+        for a, b in picks
+        if a != b
+    ]
+
+
+def summarise(samples: tp.List[float]) -> tp.Dict[str, float]:
+    # seconds in, milliseconds out
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, math.ceil(len(ordered) * 0.95) - 1)]
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1e3,
+        "median_ms": statistics.median(ordered) * 1e3,
+        "p95_ms": p95 * 1e3,
+        "min_ms": ordered[0] * 1e3,
+    }
+
+
+def time_stages(
+    entry: maps.MapEntry,
+    algorithm: str,
+    queries: tp.List[tp.Tuple[models.GridLocation, models.GridLocation]],
+) -> tp.Dict[str, tp.Any]:
+    """What planning._calculate does, with a clock around every step."""
+    clock = time.perf_counter
+    started = clock()
+    if algorithm in planning.DERIVED:
+        planning.derived_for(entry, algorithm)
+    prepare = clock() - started
+
+    samples: tp.Dict[str, tp.List[float]] = {stage: [] for stage in STAGES}
+    total, lengths = [], []
+    for start, target in queries:
+        algorythm = planning.make_algorithm(entry, algorithm)
+        algorythm.maze = entry.grid
+        algorythm.points = (start, target)
+
+        t0 = clock()
+        algorythm.a_star_search()
+        path = algorythm.get_path()
+        t1 = clock()
+        smoothed = algorythm.smooth_path(path)
+        t2 = clock()
+        angles, distances = algorythm.get_geometry(smoothed)
+        movements = planning.to_movements(angles, distances)
+        t3 = clock()
+        encoded = plan_codec.encode(movements)
+        t4 = clock()
+        plan_codec.to_json(plan_codec.decode(encoded))
+        t5 = clock()
+
+        marks = (t0, t1, t2, t3, t4, t5)
+        for stage, begin, end in zip(STAGES, marks, marks[1:]):
+            samples[stage].append(end - begin)
+        total.append(t5 - t0)
+        lengths.append(len(path))
+
+    return {
+        "prepare_ms": prepare * 1e3,
+        "stages": {stage: summarise(values) for stage, values in samples.items()},
+        "total": summarise(total),
+        "mean_path_cells": statistics.fmean(lengths),
+    }
+
+
+def time_line_of_sight(
+    entry: maps.MapEntry,
+    queries: tp.List[tp.Tuple[models.GridLocation, models.GridLocation]],
+) -> tp.Dict[str, tp.Any]:
+    clock = time.perf_counter
+    samples: tp.Dict[str, tp.List[float]] = {
+        "is_visible": [],
+        "is_line_possible": [],
+    }
+    for start, target in queries:
+        t0 = clock()
+        line_of_sight.is_visible(entry.grid.occupancy, start, target)
+        t1 = clock()
+        path_smoother.is_line_possible(start, target, entry.grid)
+        t2 = clock()
+        samples["is_visible"].append(t1 - t0)
+        samples["is_line_possible"].append(t2 - t1)
+
+    starts, ends = zip(*queries)
+    t0 = clock()
+    line_of_sight.visible_many(entry.grid.occupancy, starts, ends)
+    batched = clock() - t0
+
+    result = {name: summarise(values) for name, values in samples.items()}
+    result["visible_many_per_line"] = summarise([batched / len(queries)])
+    return result
+
+
+def run_pipeline(
+    entries: tp.List[maps.MapEntry],
+    algorithms: tp.Sequence[str],
+    queries: int,
+    seed: int,
+) -> tp.Dict[str, tp.Any]:
+    results: tp.Dict[str, tp.Any] = {}
+    for entry in entries:
+        rng = np.random.default_rng(seed)
+        pairs = sample_queries(entry, queries, rng)
+        result: tp.Dict[str, tp.Any] = {
+            "shape": list(entry.maze.shape),
+            "density": float(np.asarray(entry.maze).mean()),
+            "queries": len(pairs),
+            "line_of_sight": time_line_of_sight(entry, pairs),
+            "algorithms": {},
+        }
+        for algorithm in algorithms:
+            result["algorithms"][algorithm] = time_stages(entry, algorithm, pairs)
+            total = result["algorithms"][algorithm]["total"]
+            print(
+                f"{entry.name:>20} {algorithm:>10}: "
+                f"median {total['median_ms']:8.2f} ms, p95 {total['p95_ms']:8.2f} ms",
+                file=sys.stderr,
+            )
+        results[entry.name] = result
+    return results
+
+
+async def run_http(
+    requests: int, concurrency: int, seed: int
+) -> tp.Dict[str, tp.Any]:
+    # the server settings are read at import, so they are set up first
+    for name in ("DBHOST", "USER", "PASSWORD", "DBNAME", "DB_PORT", "SERVER_PORT"):
+        os.environ.setdefault(name, "0")
+    os.environ["REDIS_BACKEND"] = "memory"
+    os.environ.setdefault("BROADCAST_BACKEND", "local")
+    from aiohttp.test_utils import TestClient, TestServer
+    import main
+
+    entry = maps.default_registry().get()
+    pairs = sample_queries(entry, requests, np.random.default_rng(seed))
+    reach = distance_field.DistanceField.from_grid(entry.grid, models.SECTOR_START)
+    sectors = sorted(
+        name
+        for name, cell in models.SECTOR_WAYPOINTS.items()
+        if np.isfinite(reach.cost_to(cell))
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(call: tp.Callable[[], tp.Awaitable[tp.Any]], samples: tp.List[float]):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await call()
+            await response.read()
+            samples.append(time.perf_counter() - started)
+            if response.status != 200:
+                raise Exception(f"{response.url} answered {response.status}")
+
+    async def scenario(calls: tp.List[tp.Callable[[], tp.Awaitable[tp.Any]]]):
+        samples: tp.List[float] = []
+        started = time.perf_counter()
+        await asyncio.gather(*(timed(call, samples) for call in calls))
+        elapsed = time.perf_counter() - started
+        return {**summarise(samples), "requests_per_s": len(calls) / elapsed}
+
+    app = await main.create_app({})
+    results: tp.Dict[str, tp.Any] = {}
+    async with TestClient(TestServer(app)) as client:
+
+        def plan(start, target, robot):
+            body = {
+                "point_start_x": str(start[0]),
+                "point_start_y": str(start[1]),
+                "point_target_x": str(target[0]),
+                "point_target_y": str(target[1]),
+                "robot_id": robot,
+            }
+            return lambda: client.post("/set_geodata", json=body)
+
+        def sector(name, robot):
+            body = {"sector_target": name, "robot_id": robot}
+            return lambda: client.post("/set_geodata", json=body)
+
+        def fetch(robot):
+            return lambda: client.get("/get_geodata", params={"robot_id": robot})
+
+        # fresh pairs miss the route cache, the same pairs again hit it
+        results["set_geodata_planned"] = await scenario(
+            [plan(s, t, f"bench{i}") for i, (s, t) in enumerate(pairs)]
+        )
+        results["set_geodata_cached"] = await scenario(
+            [plan(s, t, f"bench{i}") for i, (s, t) in enumerate(pairs)]
+        )
+        results["set_geodata_sector"] = await scenario(
+            [sector(sectors[i % len(sectors)], f"bench{i}") for i in range(len(pairs))]
+        )
+        results["get_geodata"] = await scenario(
+            [fetch(f"bench{i}") for i in range(len(pairs))] * 3
+        )
+        results["get_geodata_empty"] = await scenario(
+            [fetch(f"idle{i}") for i in range(len(pairs))]
+        )
+
+    for name, result in results.items():
+        print(
+            f"{name:>24}: median {result['median_ms']:8.2f} ms, "
+            f"{result['requests_per_s']:8.1f} req/s",
+            file=sys.stderr,
+        )
+    return results
+
+
+def environment() -> tp.Dict[str, tp.Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+def flatten(results: tp.Dict[str, tp.Any]) -> tp.Dict[str, float]:
+    """Median timings keyed by path, the values compare reads."""
+    flat = {}
+
+    def walk(prefix: str, node: tp.Any) -> None:
+        if isinstance(node, dict):
+            if "median_ms" in node:
+                flat[prefix] = node["median_ms"]
+                return
+            for key, value in node.items():
+                walk(f"{prefix}/{key}" if prefix else key, value)
+
+    walk("", {"pipeline": results.get("pipeline", {}), "http": results.get("http", {})})
+    return flat
+
+
+def compare(
+    baseline: tp.Dict[str, tp.Any],
+    current: tp.Dict[str, tp.Any],
+    threshold: float,
+    file: tp.TextIO = sys.stdout,
+) -> int:
+    old, new = flatten(baseline), flatten(current)
+    regressions = 0
+    for key in sorted(old.keys() & new.keys()):
+        ratio = new[key] / old[key] if old[key] else math.inf
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = "slower"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            mark = "faster"
+        print(
+            f"{key:<70} {old[key]:10.3f} {new[key]:10.3f} {ratio:6.2f}x {mark}",
+            file=file,
+        )
+
+    for key in sorted(old.keys() ^ new.keys()):
+        print(
+            f"{key:<70} only in {'baseline' if key in old else 'current'}", file=file
+        )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run")
+    run.add_argument("--output", default="-")
+    run.add_argument("--baseline")
+    run.add_argument("--threshold", type=float, default=0.1)
+    run.add_argument("--quick", action="store_true")
+    run.add_argument("--seed", type=int, default=7)
+    run.add_argument("--queries", type=int, default=30)
+    run.add_argument(
+        "--algorithms",
+        nargs="+",
+        choices=planning.ALGORITHMS,
+        default=list(planning.ALGORITHMS),
+    )
+    run.add_argument("--requests", type=int, default=60)
+    run.add_argument("--concurrency", type=int, default=8)
+    run.add_argument("--skip-http", action="store_true")
+
+    diff = commands.add_parser("compare")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        with open(args.current) as file:
+            current = json.load(file)
+        sys.exit(1 if compare(baseline, current, args.threshold) else 0)
+
+    sizes = QUICK_SIZES if args.quick else SIZES
+    densities = QUICK_DENSITIES if args.quick else DENSITIES
+    queries = max(2, args.queries // 3) if args.quick else args.queries
+    entries = benchmark_maps(sizes, densities, args.seed)
+
+    results: tp.Dict[str, tp.Any] = {
+        "version": RESULTS_VERSION,
+        "environment": environment(),
+        "parameters": {
+            "seed": args.seed,
+            "queries": queries,
+            "sizes": list(sizes),
+            "densities": list(densities),
+            "algorithms": args.algorithms,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "pipeline": run_pipeline(entries, args.algorithms, queries, args.seed),
+    }
+    if not args.skip_http:
+        results["http"] = asyncio.run(
+            run_http(args.requests, args.concurrency, args.seed)
+        )
+
+    rendered = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(rendered)
+    else:
+        with open(args.output, "w") as file:
+            file.write(rendered)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        # the results already went to stdout, the comparison must not mix in
+        file = sys.stderr if args.output == "-" else sys.stdout
+        sys.exit(1 if compare(baseline, results, args.threshold, file) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""Write the built-in mazes as map files for MAPS_DIR.
+
+    python -m scripts.export_maps maps/ [--format bits|npy]
+"""
+import argparse
+import pathlib
+from app import map_files
+from app import maps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory")
+    parser.add_argument("--format", choices=("bits", "npy"), default="bits")
+    args = parser.parse_args()
+
+    directory = pathlib.Path(args.directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for entry in maps.default_registry():
+        path = directory / f"{entry.name}.{args.format}"
+        map_files.save(path, entry.maze)
+        if entry.starts or entry.sectors:
+            map_files.save_meta(path, entry.starts, entry.sectors)
+        print(f"{entry.name}: {path} ({entry.version[:12]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import unittest
+from unittest import mock
+import numpy as np
+from app import cooperative
+from app import executor
+from app import maps
+from app import models
+from app import planning
+from app.utils import space_time
+
+SLOT = 0.5
+
+
+class FakeClock:
+    """Time that only moves when told to, or by step on every reading."""
+
+    def __init__(self, now: float = 1000.0, step: float = 0.0) -> None:
+        self.now = now
+        self.step = step
+
+    def __call__(self) -> float:
+        now = self.now
+        self.now += self.step
+        return now
+
+
+class CooperativePlannerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.registry = maps.MapRegistry()
+        self.entry = self.registry.register("open", np.zeros((8, 6), dtype=np.uint8))
+        self.planner = executor.PlannerExecutor(
+            self.registry, workers=0, max_pending=16, timeout=30
+        )
+        self.planner.start()
+        self.clock = FakeClock()
+        self.cooperative = cooperative.CooperativePlanner(
+            self.registry, self.planner, SLOT, horizon=64, park=2, clock=self.clock
+        )
+
+    async def asyncTearDown(self) -> None:
+        self.planner.shutdown()
+
+    def committed(self, robot: str) -> list:
+        table = self.cooperative.table(self.entry)
+        others = set(table.reserved(robot))
+        return sorted(set(table.reserved()) - others)
+
+    def assert_committed(self, robot: str, first_slot: int) -> None:
+        # the robot holds its start in the slot the plan starts at
+        table = self.cooperative.table(self.entry)
+        keys = self.committed(robot)
+        self.assertTrue(keys)
+        self.assertEqual(keys[0] // table.cells, first_slot)
+
+    async def test_crossing_robots_do_not_meet(self) -> None:
+        plans = {}
+        for robot, start, target in (
+            ("a", (0, 2), (7, 2)),
+            ("b", (7, 2), (0, 2)),
+            ("c", (3, 0), (3, 5)),
+        ):
+            first_slot, _ = await self.cooperative.plan(
+                self.entry, robot, start, target
+            )
+            self.assert_committed(robot, first_slot)
+            plans[robot] = set(self.committed(robot))
+        self.assertFalse(plans["a"] & plans["b"])
+        self.assertFalse(plans["a"] & plans["c"])
+        self.assertFalse(plans["b"] & plans["c"])
+
+    async def test_plans_start_after_the_expected_search_time(self) -> None:
+        now_slot = self.cooperative.slot()
+        self.cooperative.search_seconds = 2.2 * SLOT
+        first_slot, _ = await self.cooperative.plan(self.entry, "a", (0, 0), (5, 5))
+        self.assertEqual(first_slot, now_slot + 3)
+        self.assert_committed("a", first_slot)
+
+    async def test_a_late_plan_is_moved_not_dropped(self) -> None:
+        # every reading of the clock is a slot later than the one before, so
+        # the search always ends after the slot it planned for
+        planned_at = self.cooperative.slot()
+        self.clock.step = SLOT
+        first_slot, _ = await self.cooperative.plan(self.entry, "a", (0, 0), (5, 5))
+        self.assertGreater(first_slot, planned_at + 2)
+        self.assert_committed("a", first_slot)
+        self.assertGreater(self.cooperative.search_seconds, 0)
+
+    async def test_replans_when_a_commit_got_in_between(self) -> None:
+        table = self.cooperative.table(self.entry)
+        calls = []
+        calculate_timed = planning.calculate_timed
+
+        def racing(entry, start, target, first_slot, *args):
+            timed = calculate_timed(entry, start, target, first_slot, *args)
+            if not calls:
+                # another robot takes the cells of this plan meanwhile
+                table.commit("other", table.keys(timed[0][1:], first_slot + 1))
+            calls.append(first_slot)
+            return timed
+
+        with mock.patch.object(planning, "calculate_timed", racing):
+            first_slot, _ = await self.cooperative.plan(self.entry, "a", (0, 0), (7, 0))
+
+        self.assertEqual(len(calls), 2)
+        keys = self.committed("a")
+        self.assertFalse(set(keys) & set(table.reserved("a")))
+        self.assert_committed("a", first_slot)
+
+    async def test_a_lost_race_keeps_the_other_plan(self) -> None:
+        table = self.cooperative.table(self.entry)
+
+        def losing(entry, start, target, first_slot, *args):
+            # plans as if nobody else moved, and someone takes the way
+            path = space_time.search(entry.grid, start, target, first_slot, {}, 64, 0)
+            table.commit("other", table.keys(path, first_slot))
+            return path, planning.to_movements([], []), {}
+
+        with mock.patch.object(planning, "calculate_timed", losing):
+            with self.assertRaises(cooperative.ReservationsChanged):
+                await self.cooperative.plan(self.entry, "a", (0, 0), (7, 0))
+        self.assertEqual(self.committed("a"), [])
+        self.assertTrue(self.committed("other"))
+
+    async def test_release_and_map_change_drop_reservations(self) -> None:
+        await self.cooperative.plan(self.entry, "a", (0, 0), (5, 5))
+        self.assertTrue(self.cooperative.release(self.entry, "a"))
+        self.assertFalse(self.cooperative.release(self.entry, "a"))
+
+        await self.cooperative.plan(self.entry, "a", (0, 0), (5, 5))
+        maze = np.zeros((8, 6), dtype=np.uint8)
+        maze[4, 4] = 1
+        self.entry = self.registry.register("open", maze)
+        self.assertEqual(self.cooperative.reserved, 0)
+
+    async def test_searches_wait_in_the_planner_queue(self) -> None:
+        busy = executor.PlannerExecutor(
+            self.registry, workers=0, max_pending=0, timeout=30
+        )
+        planner = cooperative.CooperativePlanner(
+            self.registry, busy, SLOT, horizon=64, park=2, clock=self.clock
+        )
+        with self.assertRaises(executor.PlannerBusy):
+            await planner.plan(self.entry, "a", (0, 0), (5, 5))
+        self.assertEqual(planner.reserved, 0)
+
+    async def test_unreachable_points_are_refused(self) -> None:
+        with self.assertRaisesRegex(models.Unreachable, "unreachable"):
+            await self.cooperative.plan(self.entry, "a", (0, 0), (8, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import math
+import random
+import unittest
+import numpy as np
+from app import models
+from app.utils import d_star_lite
+from app.utils import distance_field
+
+
+def free_cells(grid: models.GridWithWeights) -> list:
+    return [tuple(cell) for cell in np.argwhere(~grid.occupancy).tolist()]
+
+
+def path_cost(grid: models.GridWithWeights, path: list) -> float:
+    return sum(grid.cost(a, b) for a, b in zip(path, path[1:]))
+
+
+class DStarLiteTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.base = models.GridWithWeights(
+            *models.Maze.maze_main.shape, models.Maze.maze_main
+        )
+        self.random = random.Random(5)
+
+    def expected_cost(self, grid, start, goal) -> float:
+        field = distance_field.DistanceField.from_grid(grid, goal, reverse=True)
+        return field.cost_to(start)
+
+    def assert_optimal(self, state: d_star_lite.DStarLite) -> None:
+        expected = self.expected_cost(state.grid, state.start, state.goal)
+        path = state.path()
+        if math.isinf(expected):
+            self.assertIsNone(path)
+            return
+        self.assertEqual(path[0], state.start)
+        self.assertEqual(path[-1], state.goal)
+        self.assertTrue(all(state.grid.passable(cell) for cell in path))
+        self.assertAlmostEqual(state.cost(), expected, places=6)
+        self.assertAlmostEqual(path_cost(state.grid, path), expected, places=6)
+
+    def test_first_search_is_optimal(self) -> None:
+        cells = free_cells(self.base)
+        for _ in range(10):
+            start, goal = self.random.sample(cells, 2)
+            grid = d_star_lite.DynamicGrid(self.base)
+            self.assert_optimal(d_star_lite.DStarLite(grid, start, goal))
+
+    def test_repairs_match_a_fresh_search(self) -> None:
+        cells = free_cells(self.base)
+        for _ in range(5):
+            start, goal = self.random.sample(cells, 2)
+            grid = d_star_lite.DynamicGrid(self.base)
+            state = d_star_lite.DStarLite(grid, start, goal)
+            state.path()
+            for _ in range(10):
+                changes = {
+                    cell: self.random.random() < 0.7
+                    for cell in self.random.sample(cells, 8)
+                    if cell not in (state.start, goal)
+                }
+                state.update_cells(changes)
+                self.assert_optimal(state)
+
+    def test_moving_start_keeps_paths_optimal(self) -> None:
+        cells = free_cells(self.base)
+        start, goal = self.random.sample(cells, 2)
+        state = d_star_lite.DStarLite(d_star_lite.DynamicGrid(self.base), start, goal)
+        path = state.path()
+        while path is not None and len(path) > 2:
+            state.move_to(path[1])
+            blocked = self.random.choice(cells)
+            if blocked not in (state.start, goal):
+                state.update_cells({blocked: True})
+            self.assert_optimal(state)
+            path = state.path()
+
+    def test_cut_off_goal_and_reopening(self) -> None:
+        grid = d_star_lite.DynamicGrid(self.base)
+        start, goal = free_cells(self.base)[0], free_cells(self.base)[-1]
+        state = d_star_lite.DStarLite(grid, start, goal)
+        self.assertIsNotNone(state.path())
+
+        ring = [cell for cell in grid.around(goal) if grid.passable(cell)]
+        self.assertEqual(state.update_cells({cell: True for cell in ring}), len(ring))
+        self.assertIsNone(state.path())
+        self.assertTrue(math.isinf(state.cost()))
+
+        state.update_cells({cell: False for cell in ring})
+        self.assert_optimal(state)
+
+    def test_update_reports_only_real_changes(self) -> None:
+        cells = free_cells(self.base)
+        grid = d_star_lite.DynamicGrid(self.base)
+        wall = next(iter(self.base.wall_index))
+        state = d_star_lite.DStarLite(grid, cells[0], cells[-1])
+        self.assertEqual(state.update_cells({wall: True, cells[1]: False}), 0)
+
+    def test_the_map_grid_is_left_alone(self) -> None:
+        grid = d_star_lite.DynamicGrid(self.base)
+        cell = free_cells(self.base)[1]
+        grid.set_blocked(cell, True)
+        self.assertTrue(grid.is_wall(cell))
+        self.assertFalse(self.base.is_wall(cell))
+        self.assertFalse(self.base.occupancy[cell])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import math
+import random
+import unittest
+import numpy as np
+from app import models
+from app.utils import distance_field
+from app.utils import hierarchical
+
+
+def free_cells(grid: models.GridWithWeights) -> list:
+    return [tuple(cell) for cell in np.argwhere(~grid.occupancy).tolist()]
+
+
+def path_cost(grid: models.GridWithWeights, path: list) -> float:
+    return sum(grid.cost(a, b) for a, b in zip(path, path[1:]))
+
+
+def make_grid(maze: np.ndarray) -> models.GridWithWeights:
+    return models.GridWithWeights(*maze.shape, maze)
+
+
+class HierarchyTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.random = random.Random(3)
+        self.maze = (np.random.default_rng(3).random((50, 40)) < 0.25).astype(np.uint8)
+
+    def assert_same_hierarchy(self, got, expected) -> None:
+        self.assertEqual(
+            {key: sorted(value) for key, value in got.borders.items() if value},
+            {key: sorted(value) for key, value in expected.borders.items() if value},
+        )
+        got_edges = {node: edges for node, edges in got.edges.items() if edges}
+        expected_edges = {
+            node: edges for node, edges in expected.edges.items() if edges
+        }
+        self.assertEqual(got_edges.keys(), expected_edges.keys())
+        for node, edges in expected_edges.items():
+            self.assertEqual(got_edges[node].keys(), edges.keys())
+            for other, cost in edges.items():
+                self.assertAlmostEqual(got_edges[node][other], cost, places=6)
+
+    def test_update_equals_rebuild(self) -> None:
+        hierarchy = hierarchical.Hierarchy.from_grid(make_grid(self.maze), 8)
+        maze = self.maze
+        for _ in range(6):
+            maze = maze.copy()
+            width, height = maze.shape
+            cells = [
+                (self.random.randrange(width), self.random.randrange(height))
+                for _ in range(self.random.randint(1, 12))
+            ]
+            for cell in cells:
+                maze[cell] = 1 - maze[cell]
+            grid = make_grid(maze)
+            hierarchy = hierarchy.updated(grid, cells)
+            self.assert_same_hierarchy(
+                hierarchy, hierarchical.Hierarchy.from_grid(grid, 8)
+            )
+
+    def test_paths_are_walkable_and_near_optimal(self) -> None:
+        grid = make_grid(self.maze)
+        hierarchy = hierarchical.Hierarchy.from_grid(grid, 8)
+        cells = free_cells(grid)
+        for _ in range(60):
+            start, target = self.random.sample(cells, 2)
+            field = distance_field.DistanceField.from_grid(grid, start)
+            expected = field.cost_to(target)
+            path = hierarchy.query(start, target)
+            if math.isinf(expected):
+                self.assertIsNone(path)
+                continue
+            self.assertEqual((path[0], path[-1]), (start, target))
+            self.assertTrue(all(grid.passable(cell) for cell in path))
+            self.assertTrue(
+                all(
+                    max(abs(a[0] - b[0]), abs(a[1] - b[1])) == 1
+                    for a, b in zip(path, path[1:])
+                )
+            )
+            cost = path_cost(grid, path)
+            self.assertGreaterEqual(cost, expected - 1e-6)
+            self.assertLessEqual(cost, expected * 1.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import math
+import random
+import unittest
+import numpy as np
+from app import models
+from app.utils import a_star_pathfinder
+from app.utils import distance_field
+from app.utils import jump_point_search
+
+
+def free_cells(grid: models.GridWithWeights) -> list:
+    return [tuple(cell) for cell in np.argwhere(~grid.occupancy).tolist()]
+
+
+def path_cost(grid: models.GridWithWeights, path: list) -> float:
+    return sum(grid.cost(a, b) for a, b in zip(path, path[1:]))
+
+
+class JumpPointSearchTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.random = random.Random(11)
+        scattered = (np.random.default_rng(11).random((40, 30)) < 0.3).astype(np.uint8)
+        self.grids = [
+            models.GridWithWeights(*maze.shape, maze)
+            for maze in (models.Maze.maze_main, models.Maze.maze_thin, scattered)
+        ]
+
+    def search(self, algorythm, grid, start, goal) -> list:
+        algorythm.maze = grid
+        algorythm.points = (start, goal)
+        algorythm.a_star_search()
+        path = algorythm.get_path()
+        return None if path is None else path + [goal]
+
+    def assert_same_cost(self, make) -> None:
+        for grid in self.grids:
+            cells = free_cells(grid)
+            table = jump_point_search.JumpTable.from_grid(grid)
+            for _ in range(40):
+                start, goal = self.random.sample(cells, 2)
+                field = distance_field.DistanceField.from_grid(grid, start)
+                expected = field.cost_to(goal)
+                path = self.search(make(table), grid, start, goal)
+                if math.isinf(expected):
+                    self.assertIsNone(path)
+                    continue
+                reference = self.search(a_star_pathfinder.AStar(), grid, start, goal)
+                self.assertEqual(path[0], start)
+                self.assertTrue(all(grid.passable(cell) for cell in path))
+                self.assertTrue(
+                    all(
+                        max(abs(a[0] - b[0]), abs(a[1] - b[1])) == 1
+                        for a, b in zip(path, path[1:])
+                    )
+                )
+                self.assertAlmostEqual(path_cost(grid, path), expected, places=6)
+                self.assertAlmostEqual(
+                    path_cost(grid, path), path_cost(grid, reference), places=6
+                )
+
+    def test_jps_costs_as_much_as_a_star(self) -> None:
+        self.assert_same_cost(lambda table: jump_point_search.JumpPointSearch())
+
+    def test_jps_plus_costs_as_much_as_a_star(self) -> None:
+        self.assert_same_cost(jump_point_search.JumpPointSearchPlus)
+
+    def test_jump_table_stays_on_free_cells(self) -> None:
+        grid = self.grids[2]
+        table = jump_point_search.JumpTable.from_grid(grid)
+        for x, y in free_cells(grid):
+            for dx, dy in jump_point_search.DIRECTIONS:
+                free = 0
+                while grid.in_bounds((x + dx * (free + 1), y + dy * (free + 1))) and (
+                    grid.passable((x + dx * (free + 1), y + dy * (free + 1)))
+                ):
+                    free += 1
+                distance = table.get((dx, dy), (x, y))
+                if distance > 0:
+                    self.assertLessEqual(distance, free)
+                else:
+                    self.assertEqual(-distance, free)
+
+
+if __name__ == "__main__":
+    unittest.main()
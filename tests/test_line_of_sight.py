@@ -0,0 +1,103 @@
+import fractions
+import random
+import unittest
+from unittest import mock
+import numpy as np
+from app import models
+from app.utils import line_of_sight
+from app.utils import search_stats
+
+
+def bresenham(start, end) -> list:
+    """The cell walk path_smoother did before line_of_sight, one by one,
+    with the error kept exact instead of in floats."""
+    (x, y), (x1, y1) = start, end
+    sx = 1 if x1 >= x else -1
+    sy = 1 if y1 >= y else -1
+    dx, dy = abs(x1 - x), abs(y1 - y)
+    length = max(dx, dy)
+    path, c = [], fractions.Fraction(0)
+    for _ in range(length + 1):
+        path.append((x, y))
+        if dy <= dx:
+            x += sx
+            c += fractions.Fraction(dy, dx) if dx else 0
+            if c > 0.5:
+                c -= 1
+                y += sy
+        else:
+            y += sy
+            c += fractions.Fraction(dx, dy)
+            if c > 0.5:
+                c -= 1
+                x += sx
+    return path
+
+
+class LineOfSightTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.random = random.Random(7)
+        self.maze = (np.random.default_rng(7).random((150, 120)) < 0.02).astype(
+            np.uint8
+        )
+        self.grid = models.GridWithWeights(*self.maze.shape, self.maze)
+        width, height = self.maze.shape
+        self.pairs = [
+            (
+                (self.random.randrange(width), self.random.randrange(height)),
+                (self.random.randrange(width), self.random.randrange(height)),
+            )
+            for _ in range(300)
+        ]
+        # short ones too, is_visible_on walks those in Python
+        for (x, y), _ in self.pairs[:200]:
+            step = (self.random.randint(-9, 9), self.random.randint(-9, 9))
+            self.pairs.append(((x, y), (x + step[0], y + step[1])))
+
+    def test_cells_follow_the_bresenham_walk(self) -> None:
+        for start, end in self.pairs:
+            xs, ys = line_of_sight.cells(start, end)
+            walked = list(zip(xs.tolist(), ys.tolist()))
+            self.assertEqual(walked, bresenham(start, end))
+
+    def test_all_checks_agree(self) -> None:
+        expected = [
+            all(
+                self.grid.in_bounds(cell) and not self.maze[cell]
+                for cell in bresenham(start, end)
+            )
+            for start, end in self.pairs
+        ]
+        self.assertIn(True, expected)
+        self.assertIn(False, expected)
+
+        starts, ends = zip(*self.pairs)
+        # small chunks make one call split the pairs many times
+        with mock.patch.object(line_of_sight, "MAX_CELLS_PER_CHUNK", 100):
+            many = line_of_sight.visible_many(self.maze, starts, ends)
+        self.assertEqual(many.tolist(), expected)
+        for (start, end), visible in zip(self.pairs, expected):
+            self.assertEqual(line_of_sight.is_visible(self.maze, start, end), visible)
+            self.assertEqual(
+                line_of_sight.is_visible_on(self.grid, start, end), visible
+            )
+
+    def test_sight_cells_are_counted_alike(self) -> None:
+        counted = []
+        for check in (
+            lambda start, end, stats: line_of_sight.is_visible(
+                self.maze, start, end, stats
+            ),
+            lambda start, end, stats: line_of_sight.is_visible_on(
+                self.grid, start, end, stats
+            ),
+        ):
+            stats = search_stats.SearchStats()
+            for start, end in self.pairs:
+                check(start, end, stats)
+            counted.append(stats.sight_cells)
+        self.assertEqual(counted[0], counted[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import unittest
+import numpy as np
+from app import maps
+from app import models
+from app import plan_codec
+from app import planning
+
+
+class PlanCodecTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.entry = maps.default_registry().get("maze_thin")
+        self.plans = [
+            planning.build_plan(
+                self.entry, models.SECTOR_START, models.SECTOR_WAYPOINTS[sector]
+            )
+            for sector in ("2", "3", "7")
+        ]
+        self.plans.append(
+            {
+                "way": [
+                    {"type": "rotate", "value": -33.6901},
+                    {"type": "wait", "value": 3.0},
+                    {"type": "run", "value": 1.4142135623730951},
+                ],
+                "points": [[4, 16], [5, 17]],
+            }
+        )
+        self.plans.append({"way": []})
+
+    def test_round_trip(self) -> None:
+        for plan in self.plans:
+            raw = plan_codec.encode(plan, self.entry.version)
+            self.assertEqual(plan_codec.decode(raw), {"way": plan["way"]})
+            version, points = plan_codec.decode_points(raw)
+            self.assertEqual(version, self.entry.version)
+            self.assertEqual(points.tolist(), plan.get("points", []))
+
+    def test_json_is_what_robots_got(self) -> None:
+        for plan in self.plans:
+            raw = plan_codec.encode(plan)
+            decoded = json.loads(plan_codec.to_json(plan_codec.decode(raw)))
+            self.assertEqual(decoded, {"way": plan["way"]})
+        self.assertEqual(json.loads(plan_codec.to_json(None)), None)
+
+    def test_plans_without_map_version(self) -> None:
+        raw = plan_codec.encode(self.plans[0])
+        version, points = plan_codec.decode_points(raw)
+        self.assertIsNone(version)
+        self.assertEqual(points.tolist(), self.plans[0]["points"])
+
+    def test_first_format_version_is_read(self) -> None:
+        way = self.plans[0]["way"]
+        steps = np.empty(len(way), dtype=plan_codec.STEP)
+        steps["op"] = [plan_codec.OPCODES[step["type"]] for step in way]
+        steps["value"] = [step["value"] for step in way]
+        raw = plan_codec.HEADER.pack(plan_codec.MAGIC, 1, len(way)) + steps.tobytes()
+
+        self.assertEqual(plan_codec.decode(raw), {"way": way})
+        version, points = plan_codec.decode_points(raw)
+        self.assertIsNone(version)
+        self.assertEqual(points.shape, (0, 2))
+
+    def test_foreign_bytes_are_refused(self) -> None:
+        with self.assertRaisesRegex(Exception, "Not an encoded plan"):
+            plan_codec.decode(b"\x80\x04" + bytes(20))
+        raw = plan_codec.HEADER.pack(plan_codec.MAGIC, 99, 0)
+        with self.assertRaisesRegex(Exception, "Unsupported plan format version"):
+            plan_codec.decode(raw)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+from app import executor
+from app import maps
+from app import models
+from app import replanning
+
+
+class ReplannerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.registry = maps.MapRegistry()
+        grid = np.zeros((8, 6), dtype=np.uint8)
+        grid[4, 1:] = 1
+        self.entry = self.registry.register("wall", grid)
+        self.planner = executor.PlannerExecutor(
+            self.registry, workers=0, max_pending=16, timeout=30
+        )
+        self.planner.start()
+        self.replanner = replanning.Replanner(
+            self.registry, self.planner, max_sessions=8, ttl=60
+        )
+
+    async def asyncTearDown(self) -> None:
+        self.planner.shutdown()
+
+    async def test_closing_the_gap_cuts_the_robot_off(self) -> None:
+        route, _ = await self.replanner.start(self.entry, "a", (0, 5), (7, 5))
+        self.assertIn((4, 0), route[2])
+
+        updates = await self.replanner.update(self.entry, {(4, 0): True})
+        self.assertEqual(updates, {"a": (None, {})})
+
+        updates = await self.replanner.update(self.entry, {(4, 0): False})
+        route, _ = updates["a"]
+        self.assertIn((4, 0), route[2])
+
+    async def test_bad_points_and_cells_are_refused(self) -> None:
+        with self.assertRaises(models.Unreachable):
+            await self.replanner.start(self.entry, "a", (0, 5), (4, 3))
+        with self.assertRaises(ValueError):
+            await self.replanner.update(self.entry, {(8, 0): True})
+        self.assertEqual(len(self.replanner), 0)
+
+    async def test_searches_wait_in_the_planner_queue(self) -> None:
+        busy = executor.PlannerExecutor(
+            self.registry, workers=0, max_pending=0, timeout=30
+        )
+        replanner = replanning.Replanner(self.registry, busy, max_sessions=8, ttl=60)
+        with self.assertRaises(executor.PlannerBusy):
+            await replanner.start(self.entry, "a", (0, 5), (7, 5))
+        self.assertEqual(len(replanner), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+import numpy as np
+from app import maps
+from app import memory_redis
+from app import route_cache
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class LRUCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.cache = route_cache.LRUCache(3, ttl=10, clock=self.clock)
+
+    def test_least_recently_used_goes_first(self) -> None:
+        for key in "abc":
+            self.cache.put(key, key.upper())
+        self.assertEqual(self.cache.get("a"), "A")
+        self.cache.put("d", "D")
+
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual([self.cache.get(key) for key in "acd"], ["A", "C", "D"])
+        self.assertEqual(
+            (self.cache.hits, self.cache.misses, self.cache.evictions), (4, 1, 1)
+        )
+
+    def test_entries_expire(self) -> None:
+        self.cache.put("a", 1)
+        self.clock.now += 9
+        self.cache.put("b", 2)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.clock.now += 1
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("b"), 2)
+        self.assertEqual((len(self.cache), self.cache.expirations), (1, 1))
+
+    def test_drop(self) -> None:
+        for key in ((1, "a"), (2, "b"), (1, "c")):
+            self.cache.put(key, key)
+        self.assertEqual(self.cache.drop(lambda key: key[0] == 1), 2)
+        self.assertEqual(len(self.cache), 1)
+
+
+class RouteCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.db = memory_redis.MemoryRedis()
+        self.registry = maps.MapRegistry()
+        self.entry = self.registry.register("open", np.zeros((8, 6), dtype=np.uint8))
+        self.caches = [
+            route_cache.RouteCache(self.db, self.registry, 8, ttl=60, redis_ttl=60)
+            for _ in range(2)
+        ]
+
+    async def asyncTearDown(self) -> None:
+        for cache in self.caches:
+            cache.stop()
+
+    async def test_workers_share_routes_through_redis(self) -> None:
+        first, second = self.caches
+        key = first.key(self.entry, (0, 0), (5, 5), {"algorithm": "astar"})
+        self.assertIsNone(await first.get(key))
+        await first.put(key, {"way": [1, 2]})
+
+        self.assertEqual(await first.get(key), {"way": [1, 2]})
+        self.assertEqual(await second.get(key), {"way": [1, 2]})
+        self.assertEqual(await second.get(key), {"way": [1, 2]})
+        self.assertEqual((first.stats["local_hits"], first.stats["misses"]), (1, 1))
+        self.assertEqual(
+            (second.stats["local_hits"], second.stats["redis_hits"]), (1, 1)
+        )
+
+        other = first.key(self.entry, (0, 0), (5, 5), {"algorithm": "jps"})
+        self.assertIsNone(await second.get(other))
+
+    async def test_a_changed_map_drops_its_routes(self) -> None:
+        first, second = self.caches
+        key = first.key(self.entry, (0, 0), (5, 5))
+        await first.put(key, {"way": []})
+        await second.get(key)
+
+        grid = np.zeros((8, 6), dtype=np.uint8)
+        grid[3, 3] = 1
+        changed = self.registry.register("open", grid)
+        self.assertEqual((first.stats["size"], second.stats["size"]), (0, 0))
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        self.assertIsNone(await self.db.get(first.redis_key(key)))
+        self.assertIsNone(await first.get(key))
+        self.assertNotEqual(first.key(changed, (0, 0), (5, 5)), key)
+        self.assertEqual(first.stats["invalidations"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
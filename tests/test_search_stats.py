@@ -0,0 +1,32 @@
+import concurrent.futures
+import unittest
+from app import maps
+from app import models
+from app import planning
+
+
+class SearchEffortTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.entry = maps.default_registry().get("maze_thin")
+        self.trips = [
+            (models.SECTOR_START, models.SECTOR_WAYPOINTS[sector])
+            for sector in ("2", "3", "7")
+        ]
+
+    def effort(self, algorithm: str, trip) -> dict:
+        _, measured = planning.calculate_measured(self.entry, *trip, algorithm)
+        return measured["effort"]
+
+    def test_effort_is_the_same_for_concurrent_calls(self) -> None:
+        for algorithm in planning.ALGORITHMS:
+            alone = [self.effort(algorithm, trip) for trip in self.trips]
+            with concurrent.futures.ThreadPoolExecutor(len(self.trips)) as pool:
+                together = list(
+                    pool.map(lambda trip: self.effort(algorithm, trip), self.trips * 4)
+                )
+            self.assertEqual(together, alone * 4, algorithm)
+            self.assertTrue(all(effort["expanded"] > 0 for effort in alone))
+
+
+if __name__ == "__main__":
+    unittest.main()
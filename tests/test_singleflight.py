@@ -0,0 +1,68 @@
+import asyncio
+import unittest
+from app import singleflight
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.flights = singleflight.SingleFlight()
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def compute(self) -> int:
+        self.calls += 1
+        await self.release.wait()
+        return self.calls
+
+    async def test_callers_of_one_key_share_the_computation(self) -> None:
+        waiting = [
+            asyncio.ensure_future(self.flights.run("a", self.compute))
+            for _ in range(4)
+        ]
+        other = asyncio.ensure_future(self.flights.run("b", self.compute))
+        await asyncio.sleep(0)
+        self.assertEqual(len(self.flights), 2)
+        self.release.set()
+
+        results = await asyncio.gather(*waiting)
+        self.assertEqual([shared for _, shared in results], [False, True, True, True])
+        self.assertEqual(len({value for value, _ in results}), 1)
+        self.assertEqual((await other)[1], False)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(
+            self.flights.stats, {"in_flight": 0, "started": 2, "shared": 3}
+        )
+
+        # a landed flight is not reused
+        self.assertEqual(await self.flights.run("a", self.compute), (3, False))
+
+    async def test_errors_reach_every_caller(self) -> None:
+        async def fail() -> int:
+            await self.release.wait()
+            raise ValueError("no route")
+
+        waiting = [
+            asyncio.ensure_future(self.flights.run("a", fail)) for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        self.release.set()
+        results = await asyncio.gather(*waiting, return_exceptions=True)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(len(self.flights), 0)
+
+    async def test_a_cancelled_starter_leaves_the_others_their_result(self) -> None:
+        starter = asyncio.ensure_future(self.flights.run("a", self.compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(self.flights.run("a", self.compute))
+        await asyncio.sleep(0)
+
+        starter.cancel()
+        await asyncio.sleep(0)
+        self.release.set()
+        self.assertEqual(await follower, (1, True))
+        self.assertTrue(starter.cancelled())
+        self.assertEqual(self.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
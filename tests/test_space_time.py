@@ -0,0 +1,131 @@
+import unittest
+import numpy as np
+from app import models
+from app.utils import space_time
+
+
+def open_grid(width: int, height: int) -> models.GridWithWeights:
+    maze = np.zeros((width, height), dtype=np.uint8)
+    return models.GridWithWeights(width, height, maze)
+
+
+def reserve(
+    table: space_time.ReservationTable, robot: str, path: list, first_slot: int
+) -> None:
+    table.commit(robot, table.keys(path, first_slot))
+
+
+class ReservationTableTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.table = space_time.ReservationTable((4, 3))
+
+    def test_keys_are_slot_and_flat_cell(self) -> None:
+        keys = self.table.keys([(0, 0), (1, 2), (3, 1)], 5)
+        self.assertEqual(keys.tolist(), [5 * 12 + 0, 6 * 12 + 5, 7 * 12 + 10])
+
+    def test_reserved_leaves_out_the_asking_robot(self) -> None:
+        reserve(self.table, "a", [(0, 0), (1, 0)], 1)
+        reserve(self.table, "b", [(2, 2)], 1)
+        mine = self.table.keys([(0, 0), (1, 0)], 1).tolist()
+        others = self.table.reserved("a")
+        self.assertEqual(list(others), self.table.keys([(2, 2)], 1).tolist())
+        self.assertTrue(set(mine) <= set(self.table.reserved("b")))
+        self.assertEqual(len(set(self.table.reserved().values())), 2)
+        self.assertEqual(self.table.robots, 2)
+        self.assertEqual(len(self.table), 3)
+
+    def test_commit_replaces_a_robots_plan(self) -> None:
+        reserve(self.table, "a", [(0, 0), (1, 0)], 1)
+        owner = self.table.reserved()[self.table.keys([(0, 0)], 1).item()]
+        reserve(self.table, "a", [(3, 2)], 4)
+        keys = self.table.keys([(3, 2)], 4).tolist()
+        self.assertEqual(list(self.table.reserved()), keys)
+        # a robot keeps its owner id across its plans
+        self.assertEqual(set(self.table.reserved().values()), {owner})
+
+    def test_version_grows_with_every_change(self) -> None:
+        versions = [self.table.version]
+        reserve(self.table, "a", [(0, 0)], 1)
+        versions.append(self.table.version)
+        self.assertTrue(self.table.release("a"))
+        versions.append(self.table.version)
+        self.assertFalse(self.table.release("a"))
+        versions.append(self.table.version)
+        self.assertEqual(versions, sorted(versions))
+        self.assertEqual(len(set(versions)), 3)
+
+    def test_expire_drops_the_past_only(self) -> None:
+        reserve(self.table, "a", [(0, 0), (1, 0), (2, 0), (3, 0)], 1)
+        reserve(self.table, "b", [(0, 2), (1, 2)], 1)
+        self.assertEqual(self.table.expire(3), 2 + 2)
+        self.assertEqual(self.table.robots, 1)
+        self.assertEqual(
+            sorted(self.table.reserved()), self.table.keys([(2, 0), (3, 0)], 3).tolist()
+        )
+        self.assertEqual(self.table.expire(3), 0)
+
+
+class SearchTest(unittest.TestCase):
+    def test_free_grid_needs_no_waits(self) -> None:
+        path = space_time.search(open_grid(6, 3), (0, 1), (5, 1), 10, {}, 20, 0)
+        self.assertEqual(path, [(x, 1) for x in range(6)])
+
+    def test_waits_for_a_robot_in_a_corridor(self) -> None:
+        grid = open_grid(5, 1)
+        table = space_time.ReservationTable((5, 1))
+        # another robot stands on (2, 0) for a while, then leaves ahead
+        reserve(table, "other", [(2, 0)] * 4 + [(3, 0), (4, 0)], 0)
+        reserved = table.reserved()
+        path = space_time.search(grid, (0, 0), (4, 0), 0, reserved, 20, 0)
+        self.assertEqual(
+            path, [(0, 0), (1, 0), (1, 0), (1, 0), (2, 0), (3, 0), (4, 0)]
+        )
+        self.assertTrue(space_time.valid(path, 0, reserved, (5, 1), 0))
+
+    def test_never_swaps_cells(self) -> None:
+        grid = open_grid(3, 3)
+        table = space_time.ReservationTable((3, 3))
+        reserve(table, "other", [(1, 1), (0, 1), (0, 1)], 0)
+        reserved = table.reserved()
+        path = space_time.search(grid, (0, 1), (2, 1), 0, reserved, 20, 0)
+        self.assertNotEqual(path[1], (1, 1))
+        self.assertTrue(space_time.valid(path, 0, reserved, (3, 3), 0))
+        # the swap itself is what valid() rejects
+        self.assertFalse(space_time.valid([(0, 1), (1, 1)], 0, reserved, (3, 3), 0))
+
+    def test_parks_only_where_the_goal_stays_free(self) -> None:
+        grid = open_grid(5, 1)
+        table = space_time.ReservationTable((5, 1))
+        # the goal is taken two slots after the earliest arrival
+        reserve(table, "other", [(4, 0)], 6)
+        reserved = table.reserved()
+        path = space_time.search(grid, (0, 0), (4, 0), 0, reserved, 20, 3)
+        arrival = len(path) - 1
+        self.assertGreater(arrival, 6)
+        self.assertTrue(space_time.valid(path, 0, reserved, (5, 1), 3))
+
+    def test_refuses_a_reserved_start(self) -> None:
+        table = space_time.ReservationTable((5, 1))
+        reserve(table, "other", [(0, 0)], 3)
+        reserved = table.reserved()
+        with self.assertRaisesRegex(space_time.Blocked, "Start"):
+            space_time.search(open_grid(5, 1), (0, 0), (4, 0), 3, reserved, 20, 0)
+
+    def test_gives_up_after_the_horizon(self) -> None:
+        table = space_time.ReservationTable((5, 1))
+        reserve(table, "other", [(4, 0)] * 30, 0)
+        reserved = table.reserved()
+        with self.assertRaisesRegex(space_time.Blocked, "within 10 slots"):
+            space_time.search(open_grid(5, 1), (0, 0), (4, 0), 0, reserved, 10, 0)
+
+
+class SegmentsTest(unittest.TestCase):
+    def test_straight_runs_collapse_and_waits_end_segments(self) -> None:
+        path = [(0, 0), (1, 0), (2, 0), (2, 0), (2, 0), (2, 1), (2, 2)]
+        self.assertEqual(
+            space_time.to_segments(path), ([(0, 0), (2, 0), (2, 2)], [0, 2, 0])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
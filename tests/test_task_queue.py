@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+from app import memory_redis
+from app import task_queue
+
+
+def item(robot: str, number: int) -> task_queue.TaskItem:
+    return robot, b"plan%d" % number, b"json%d" % number, b"gzip%d" % number
+
+
+class TaskQueueTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.db = memory_redis.MemoryRedis()
+        self.tasks = task_queue.TaskQueue(self.db, ttl=60)
+
+    async def test_plans_come_out_in_order(self) -> None:
+        items = [item("a", 1), item("b", 2), item("a", 3), item("a", 4)]
+        ids = await asyncio.gather(*(self.tasks.push(*pushed) for pushed in items))
+        self.assertEqual(ids, sorted(set(ids)))
+
+        fetched = await asyncio.gather(
+            self.tasks.fetch("a"),
+            self.tasks.fetch("a"),
+            self.tasks.fetch("b"),
+            self.tasks.fetch("b"),
+            self.tasks.fetch("a"),
+        )
+        self.assertEqual(fetched, [b"json1", b"json3", b"json2", None, b"json4"])
+        self.assertIsNone(await self.tasks.fetch("a"))
+
+    async def test_fetch_tagged_sets_the_current_plan(self) -> None:
+        first, second = [await self.tasks.push(*item("a", n)) for n in (1, 2)]
+        self.assertEqual(await self.tasks.state("a"), (None, 2))
+
+        fetched = await self.tasks.fetch_tagged("a", task_queue.GZIP)
+        self.assertEqual(fetched, (first, b"gzip1"))
+        self.assertEqual(await self.tasks.state("a"), (first, 1))
+        self.assertEqual(await self.tasks.current("a"), b"plan1")
+        self.assertEqual(await self.tasks.get(second), b"plan2")
+
+        await self.tasks.requeue("a", first)
+        self.assertEqual(await self.tasks.state("a"), (first, 2))
+        self.assertEqual(await self.tasks.fetch_tagged("a"), (first, b"json1"))
+
+    async def test_expired_plans_are_skipped(self) -> None:
+        first, _ = [await self.tasks.push(*item("a", n)) for n in (1, 2)]
+        await self.db.delete(task_queue.task_key(first) + task_queue.JSON)
+        self.assertEqual(await self.tasks.fetch("a"), b"json2")
+
+    async def test_a_robot_listed_twice_gets_two_plans(self) -> None:
+        for n in (1, 2, 3):
+            await self.tasks.push(*item("a", n))
+        fetched = await task_queue.fetch_many(self.db, ["a", "b", "a"], ttl=60)
+        self.assertEqual(fetched, [b"json1", None, b"json2"])
+
+
+class BatcherTest(unittest.IsolatedAsyncioTestCase):
+    async def test_calls_of_one_iteration_share_a_flush(self) -> None:
+        flushed = []
+
+        async def flush(items):
+            flushed.append(items)
+            return [value * 2 for value in items]
+
+        batcher = task_queue._Batcher(flush)
+        self.assertEqual(
+            await asyncio.gather(*(batcher.submit(n) for n in range(5))),
+            [0, 2, 4, 6, 8],
+        )
+        self.assertEqual(await batcher.submit(7), 14)
+        self.assertEqual(flushed, [[0, 1, 2, 3, 4], [7]])
+
+    async def test_a_failed_flush_fails_every_call(self) -> None:
+        async def flush(items):
+            raise ConnectionError("Redis went away")
+
+        batcher = task_queue._Batcher(flush)
+        results = await asyncio.gather(
+            *(batcher.submit(n) for n in range(3)), return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(r, ConnectionError) for r in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import itertools
+import unittest
+import numpy as np
+from app import maps
+from app import models
+from app import planning
+from app.utils import a_star_pathfinder
+
+
+def path_cost(grid: models.GridWithWeights, path: list) -> float:
+    return sum(grid.cost(a, b) for a, b in zip(path, path[1:]))
+
+
+class TourTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.entry = maps.default_registry().get("maze_thin")
+        self.stops = [models.SECTOR_WAYPOINTS[sector] for sector in ("2", "3", "7")]
+
+    def a_star_cost(self, start, target) -> float:
+        algorythm = a_star_pathfinder.AStar()
+        algorythm.maze = self.entry.grid
+        algorythm.points = (start, target)
+        algorythm.a_star_search()
+        return path_cost(self.entry.grid, algorythm.get_path() + [target])
+
+    def test_costs_match_pairwise_a_star(self) -> None:
+        points = [models.SECTOR_START] + self.stops
+        _, costs = planning.tour_costs(self.entry.grid, points)
+        for i, j in itertools.product(range(len(points)), repeat=2):
+            expected = 0.0 if i == j else self.a_star_cost(points[i], points[j])
+            self.assertAlmostEqual(costs[i][j], expected, places=6)
+
+    def test_route_ends_like_a_single_plan(self) -> None:
+        for stop in self.stops:
+            _, movements = planning.plan_tour(self.entry, models.SECTOR_START, [stop])
+            _, _, points = planning.calculate(
+                self.entry, models.SECTOR_START, stop, "astar"
+            )
+            self.assertEqual(tuple(movements["points"][-1]), tuple(points[-1]))
+
+    def test_route_passes_every_stop_before_the_last(self) -> None:
+        order, movements = planning.plan_tour(
+            self.entry, models.SECTOR_START, self.stops
+        )
+        self.assertEqual(sorted(order), [0, 1, 2])
+        points = [tuple(point) for point in movements["points"]]
+        for index in order[:-1]:
+            self.assertIn(tuple(self.stops[index]), points)
+        self.assertNotIn(tuple(self.stops[order[-1]]), points)
+
+    def test_cut_off_stops_are_unreachable(self) -> None:
+        grid = np.zeros((12, 12), dtype=np.uint8)
+        grid[6, :] = 1
+        entry = maps.MapRegistry().register("split", grid)
+        with self.assertRaises(models.Unreachable):
+            planning.plan_tour(entry, (0, 0), [(2, 2), (10, 10)])
+        with self.assertRaises(models.Unreachable):
+            planning.plan_tour(entry, (0, 0), [(6, 6)])
+
+
+if __name__ == "__main__":
+    unittest.main()